@@ -1,5 +1,30 @@
 """FastAPI Chat Application"""
 
+import os
+
 __version__ = "0.1.0"
 
 
+def _startup_profile_requested() -> bool:
+    """
+    STARTUP_PROFILE from the environment, else from `.env` (as in app.core.config)
+
+    Read by hand: loading the settings here would import pydantic before the
+    import hook that should time it.
+    """
+    value = os.getenv("STARTUP_PROFILE")
+    if value is None:
+        try:
+            with open(".env", encoding="utf-8") as env_file:
+                for line in env_file:
+                    name, sep, raw = line.partition("=")
+                    if sep and name.strip().lower() in ("startup_profile", "export startup_profile"):
+                        value = raw.split(" #", 1)[0].strip().strip("'\"")
+        except OSError:
+            return False
+    return (value or "").lower() in ("1", "true", "yes", "on", "t", "y")
+
+
+if _startup_profile_requested():
+    from app.utils.startup import profiler as _startup_profiler
+    _startup_profiler.install()
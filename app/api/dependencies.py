@@ -1,7 +1,15 @@
 """API dependencies for dependency injection"""
 
-from typing import Optional
-from fastapi import Header, HTTPException
+import hmac
+from typing import AsyncIterator, Iterator, Optional
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.context import session_id_var, tenant_id_var
+from app.db import get_session_factory
+from app.services.chat_service import ChatService
+from app.services.tenants import Tenant, tenant_registry
 
 # Example dependency for API key validation
 async def get_api_key(x_api_key: Optional[str] = Header(None)) -> Optional[str]:
@@ -17,10 +25,52 @@ async def get_api_key(x_api_key: Optional[str] = Header(None)) -> Optional[str]:
     return x_api_key
 
 
-# Example dependency for database session
-# from app.db import get_db
-# def get_db_session():
-#     """Get database session"""
-#     return get_db()
+async def get_tenant_id(api_key: Optional[str] = Depends(get_api_key)) -> str:
+    """Resolve the request's tenant from its API key (401 for unknown keys)"""
+    tenant_id = tenant_registry.resolve(api_key)
+    if tenant_id is None:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    tenant_id_var.set(tenant_id)
+    return tenant_id
+
+
+async def get_tenant(tenant_id: str = Depends(get_tenant_id)) -> AsyncIterator[Tenant]:
+    """Admit the request against its tenant's rate and concurrency quotas"""
+    tenant = tenant_registry.get(tenant_id)
+    with tenant.admit():
+        yield tenant
+
+
+async def get_chat_service(tenant: Tenant = Depends(get_tenant)) -> ChatService:
+    """The tenant's chat storage"""
+    return tenant.service
+
 
+def get_tenant_db(tenant: Tenant = Depends(get_tenant)) -> Iterator[Session]:
+    """Database session on the tenant's shard"""
+    db = get_session_factory(tenant.shard)()
+    try:
+        yield db
+    finally:
+        db.close()
 
+
+async def bind_session_context(session_id: str) -> str:
+    """Expose the path's session ID to request-scoped logging"""
+    session_id_var.set(session_id)
+    return session_id
+
+
+async def require_admin(x_admin_key: Optional[str] = Header(None)) -> None:
+    """
+    Guard diagnostics endpoints
+
+    Open in debug mode; otherwise the X-Admin-Key header must match
+    `admin_api_key`. Without an admin key configured the endpoints do not exist.
+    """
+    if settings.debug:
+        return
+    if not settings.admin_api_key:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key.encode(), settings.admin_api_key.encode()):
+        raise HTTPException(status_code=401, detail="Admin key required")
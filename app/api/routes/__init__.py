@@ -1,7 +1,8 @@
 """API routes"""
 
-from fastapi import APIRouter
-from app.api.routes import chat, api_keys
+from fastapi import APIRouter, Depends
+from app.api.dependencies import require_admin
+from app.api.routes import chat, api_keys, debug
 
 # Create main API router
 api_router = APIRouter()
@@ -9,5 +10,8 @@ api_router = APIRouter()
 # Include route modules
 api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
 api_router.include_router(api_keys.router, prefix="/api-keys", tags=["api-keys"])
+api_router.include_router(
+    debug.router, prefix="/debug", tags=["debug"], dependencies=[Depends(require_admin)]
+)
 
 
@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 
-from app.db import get_db
+from app.api.dependencies import get_tenant_db, get_tenant_id
 from app.schemas.api_key import (
     APIKeyCreate,
     APIKeyResponse,
@@ -12,7 +12,7 @@ from app.schemas.api_key import (
     APIKeyUpdate
 )
 from app.services.api_key_service import api_key_service
-from app.utils.encryption import encryption_service
+from app.utils.encryption import get_encryption_service
 
 router = APIRouter()
 
@@ -20,7 +20,8 @@ router = APIRouter()
 @router.post("/", response_model=APIKeyResponse, status_code=201)
 async def create_or_update_api_key(
     key_data: APIKeyCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db),
+    tenant_id: str = Depends(get_tenant_id)
 ):
     """
     Create or update an API key
@@ -29,10 +30,10 @@ async def create_or_update_api_key(
     The key is encrypted before storage.
     """
     try:
-        db_key = api_key_service.create_or_update_key(db, key_data)
+        db_key = api_key_service.create_or_update_key(db, key_data, tenant_id)
         
         # Get decrypted key for masking (only for response)
-        decrypted_key = encryption_service.decrypt(db_key.encrypted_key)
+        decrypted_key = get_encryption_service().decrypt(db_key.encrypted_key)
         
         return APIKeyResponse(
             id=db_key.id,
@@ -47,16 +48,19 @@ async def create_or_update_api_key(
 
 
 @router.get("/", response_model=APIKeyList)
-async def list_api_keys(db: Session = Depends(get_db)):
+async def list_api_keys(
+    db: Session = Depends(get_tenant_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
     """
-    List all API keys (with masked values)
+    List the tenant's API keys (with masked values)
     """
     try:
-        keys = api_key_service.list_keys(db)
+        keys = api_key_service.list_keys(db, tenant_id)
         
         key_responses = []
         for key in keys:
-            decrypted_key = encryption_service.decrypt(key.encrypted_key)
+            decrypted_key = get_encryption_service().decrypt(key.encrypted_key)
             key_responses.append(APIKeyResponse(
                 id=key.id,
                 name=key.name,
@@ -72,15 +76,19 @@ async def list_api_keys(db: Session = Depends(get_db)):
 
 
 @router.get("/{name}", response_model=APIKeyResponse)
-async def get_api_key(name: str, db: Session = Depends(get_db)):
+async def get_api_key(
+    name: str,
+    db: Session = Depends(get_tenant_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
     """
     Get a specific API key by name (with masked value)
     """
-    api_key = api_key_service.get_key(db, name)
+    api_key = api_key_service.get_key(db, name, tenant_id)
     if not api_key:
         raise HTTPException(status_code=404, detail=f"API key '{name}' not found")
     
-    decrypted_key = encryption_service.decrypt(api_key.encrypted_key)
+    decrypted_key = get_encryption_service().decrypt(api_key.encrypted_key)
     
     return APIKeyResponse(
         id=api_key.id,
@@ -93,11 +101,15 @@ async def get_api_key(name: str, db: Session = Depends(get_db)):
 
 
 @router.delete("/{name}")
-async def delete_api_key(name: str, db: Session = Depends(get_db)):
+async def delete_api_key(
+    name: str,
+    db: Session = Depends(get_tenant_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
     """
     Delete an API key
     """
-    success = api_key_service.delete_key(db, name)
+    success = api_key_service.delete_key(db, name, tenant_id)
     if not success:
         raise HTTPException(status_code=404, detail=f"API key '{name}' not found")
     
@@ -108,19 +120,20 @@ async def delete_api_key(name: str, db: Session = Depends(get_db)):
 async def update_api_key(
     name: str,
     update_data: APIKeyUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db),
+    tenant_id: str = Depends(get_tenant_id)
 ):
     """
     Update an API key (change the key value or active status)
     """
-    api_key = api_key_service.get_key(db, name)
+    api_key = api_key_service.get_key(db, name, tenant_id)
     if not api_key:
         raise HTTPException(status_code=404, detail=f"API key '{name}' not found")
     
     try:
         # Update key value if provided
         if update_data.key:
-            encrypted_key = encryption_service.encrypt(update_data.key)
+            encrypted_key = get_encryption_service().encrypt(update_data.key)
             api_key.encrypted_key = encrypted_key
         
         # Update active status if provided
@@ -130,7 +143,7 @@ async def update_api_key(
         db.commit()
         db.refresh(api_key)
         
-        decrypted_key = encryption_service.decrypt(api_key.encrypted_key)
+        decrypted_key = get_encryption_service().decrypt(api_key.encrypted_key)
         
         return APIKeyResponse(
             id=api_key.id,
@@ -1,76 +1,212 @@
 """Chat endpoints"""
 
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from datetime import datetime
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
 
+from pydantic import BaseModel
+from starlette.websockets import WebSocketState
+
+from app.core.config import settings
+from app.api.dependencies import bind_session_context, get_chat_service, get_tenant, get_tenant_id
 from app.schemas.chat import (
     ChatRequest,
     ChatResponse,
     ChatMessage,
     ChatSession,
-    ChatSessionCreate
+    ChatSessionCreate,
+    SearchHit,
+    SearchResponse
 )
-from app.services.chat_service import chat_service
+from app.services.chat_service import ChatService, session_topic
+from app.services.idempotency import IdempotencyConflictError, fingerprint
+from app.services.overload import overload
+from app.services.pubsub import SlowConsumerError, Subscription
+from app.services.quotas import QuotaExceededError
+from app.services.shutdown import shutdown
+from app.services.tenants import Tenant, tenant_registry
+from app.utils.cache import LRUCache
+from app.utils.http_cache import cache_headers, is_not_modified, make_etag, not_modified
 
 router = APIRouter()
 
+T = TypeVar("T")
+
+# Last session listings, served (stale) instead of recomputing while overloaded
+_session_lists: LRUCache[List[ChatSession]] = LRUCache(maxsize=1024, ttl=settings.overload_stale_ttl_s)
+
+IDEMPOTENCY_KEY = Header(
+    None,
+    max_length=255,
+    description="Retries with the same key return the original response instead of running again"
+)
+
+
+def _session_validators(service: ChatService, session: ChatSession) -> Tuple[str, datetime]:
+    """ETag and Last-Modified for a session and its message list"""
+    etag = make_etag(
+        service.get_version(session.id),
+        session.message_count,
+        int(session.updated_at.timestamp() * 1_000_000)
+    )
+    return etag, session.updated_at
+
+
+def _overloaded() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server overloaded; retry later",
+        headers={"Retry-After": "1"}
+    )
+
+
+async def _idempotent(
+    tenant: Tenant,
+    response: Response,
+    idempotency_key: Optional[str],
+    scope: str,
+    request: BaseModel,
+    operation: Callable[[], Awaitable[T]]
+) -> T:
+    """Run an operation at most once per Idempotency-Key and tenant"""
+    if not idempotency_key:
+        return await operation()
+    try:
+        result, replayed = await tenant.idempotency.run(
+            (scope, idempotency_key), fingerprint(request.model_dump_json()), operation
+        )
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
 
 @router.post("/", response_model=ChatResponse)
-async def send_message(request: ChatRequest):
+async def send_message(
+    request: ChatRequest,
+    response: Response,
+    chat_service: ChatService = Depends(get_chat_service),
+    tenant: Tenant = Depends(get_tenant),
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY
+):
     """
     Send a chat message and get a response
+    
+    With an `Idempotency-Key`, retries return the original response and
+    never generate twice.
     """
-    try:
-        response = await chat_service.process_message(
-            message=request.message,
-            session_id=request.session_id,
-            context=request.context
-        )
-        return response
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    async def process() -> ChatResponse:
+        try:
+            return await chat_service.process_message(
+                message=request.message,
+                session_id=request.session_id,
+                context=request.context
+            )
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return await _idempotent(tenant, response, idempotency_key, "chat", request, process)
 
 
 @router.post("/sessions", response_model=ChatSession)
-async def create_session(session: ChatSessionCreate):
+async def create_session(
+    session: ChatSessionCreate,
+    response: Response,
+    chat_service: ChatService = Depends(get_chat_service),
+    tenant: Tenant = Depends(get_tenant),
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY
+):
     """
     Create a new chat session
+    
+    With an `Idempotency-Key`, retries return the session created first.
     """
-    try:
-        new_session = await chat_service.create_session(
-            title=session.title,
-            metadata=session.metadata
-        )
-        return new_session
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    async def create() -> ChatSession:
+        try:
+            new_session = await chat_service.create_session(
+                title=session.title,
+                metadata=session.metadata
+            )
+            # Snapshot: the stored session keeps changing as messages arrive
+            return new_session.model_copy()
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return await _idempotent(tenant, response, idempotency_key, "sessions", session, create)
 
 
-@router.get("/sessions/{session_id}", response_model=ChatSession)
-async def get_session(session_id: str):
+@router.get(
+    "/sessions/{session_id}",
+    response_model=ChatSession,
+    dependencies=[Depends(bind_session_context)]
+)
+async def get_session(
+    session_id: str,
+    request: Request,
+    response: Response,
+    chat_service: ChatService = Depends(get_chat_service)
+):
     """
     Get a chat session by ID
+    
+    Supports conditional requests via If-None-Match / If-Modified-Since.
     """
     session = await chat_service.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    # A client reading a session is likely to post to it next
+    chat_service.prefetch_history(session_id)
+    
+    etag, last_modified = _session_validators(chat_service, session)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    response.headers.update(cache_headers(etag, last_modified))
     return session
 
 
 @router.get("/sessions", response_model=List[ChatSession])
-async def list_sessions(limit: int = 10, offset: int = 0):
+async def list_sessions(
+    response: Response,
+    limit: int = 10,
+    offset: int = 0,
+    chat_service: ChatService = Depends(get_chat_service),
+    tenant: Tenant = Depends(get_tenant)
+):
     """
     List all chat sessions
+    
+    Low priority: while the server is overloaded a recent listing is served
+    (marked `X-Degraded: stale`), or 503 if there is none.
     """
+    cache_key = (tenant.id, limit, offset)
+    level = overload.level()
+    if level != overload.NORMAL:
+        cached = _session_lists.get(cache_key)
+        if cached is not None:
+            response.headers["X-Degraded"] = "stale"
+            return cached
+        if level == overload.SHEDDING:
+            raise _overloaded()
+    
     try:
         sessions = await chat_service.list_sessions(limit=limit, offset=offset)
+        _session_lists.set(cache_key, sessions)
         return sessions
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.delete("/sessions/{session_id}")
-async def delete_session(session_id: str):
+@router.delete(
+    "/sessions/{session_id}",
+    dependencies=[Depends(bind_session_context)]
+)
+async def delete_session(session_id: str, chat_service: ChatService = Depends(get_chat_service)):
     """
     Delete a chat session
     """
@@ -80,11 +216,70 @@ async def delete_session(session_id: str):
     return {"message": "Session deleted successfully"}
 
 
-@router.get("/sessions/{session_id}/messages", response_model=List[ChatMessage])
-async def get_session_messages(session_id: str):
+@router.post(
+    "/sessions/{session_id}/fork",
+    response_model=ChatSession,
+    dependencies=[Depends(bind_session_context)]
+)
+async def fork_session(
+    session_id: str,
+    at: Optional[str] = Query(None, description="ID of the last message to keep (default: all)"),
+    title: Optional[str] = Query(None, description="Title of the new session"),
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    """
+    Branch a session at a message
+    
+    The new session shares the parent's messages up to `at` without copying
+    them; messages posted to either session afterwards are not shared.
+    """
+    try:
+        forked = await chat_service.fork_session(session_id, at=at, title=title)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Message not found")
+    except QuotaExceededError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if forked is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return forked.model_copy()
+
+
+@router.get(
+    "/sessions/{session_id}/messages",
+    response_model=List[ChatMessage],
+    dependencies=[Depends(bind_session_context)]
+)
+async def get_session_messages(
+    session_id: str,
+    request: Request,
+    response: Response,
+    chat_service: ChatService = Depends(get_chat_service)
+):
     """
     Get all messages from a chat session
+    
+    Supports conditional requests via If-None-Match / If-Modified-Since;
+    a 304 is answered from the session's validators without reading messages.
+    
+    Low priority: while the server sheds load, only sessions fully held in
+    the history cache are answered (marked `X-Degraded: cached`); others get 503.
     """
+    session = await chat_service.get_session(session_id)
+    if session:
+        etag, last_modified = _session_validators(chat_service, session)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
+        response.headers.update(cache_headers(etag, last_modified))
+    
+    if overload.level() == overload.SHEDDING:
+        window = chat_service.history_cache.get(session_id, count=False)
+        if session and window is not None and len(window) >= session.message_count:
+            response.headers["X-Degraded"] = "cached"
+            return list(window)
+        raise _overloaded()
+    
     try:
         messages = await chat_service.get_session_messages(session_id)
         return messages
@@ -92,3 +287,101 @@ async def get_session_messages(session_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/search", response_model=SearchResponse)
+async def search_messages(
+    q: str = Query(..., min_length=1, description="Search query; all terms must match"),
+    session_id: Optional[str] = Query(None, description="Only search this session"),
+    since: Optional[datetime] = Query(None, description="Only messages at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only messages before this time"),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    """
+    Full-text search over chat messages, ranked by relevance
+    """
+    total, matches = await chat_service.search_messages(
+        q,
+        session_id=session_id,
+        since=since,
+        until=until,
+        limit=limit,
+        offset=offset
+    )
+    hits = [
+        SearchHit(
+            message_id=match.message.id,
+            session_id=match.session_id,
+            role=match.message.role,
+            snippet=match.snippet,
+            timestamp=match.message.timestamp,
+            score=round(match.score, 4)
+        )
+        for match in matches
+    ]
+    return SearchResponse(query=q, total=total, limit=limit, offset=offset, hits=hits)
+
+
+async def _close_on_disconnect(websocket: WebSocket, subscription: Subscription) -> None:
+    """Read (and ignore) client frames until it disconnects, then end the subscription"""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    finally:
+        subscription.close()
+
+
+@router.websocket("/sessions/{session_id}/ws")
+async def session_updates(
+    websocket: WebSocket,
+    session_id: str,
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """
+    Stream session updates over a WebSocket
+    
+    Sends the current session on connect, then `message`, `session` and
+    `session_deleted` events as they happen. Clients that fall behind are
+    disconnected with code 1013 and should reconnect and re-fetch; on server
+    shutdown the code is 1012 and they should reconnect the same way.
+    """
+    # Long-lived, so not counted against the tenant's concurrency quota
+    chat_service = tenant_registry.get(tenant_id).service
+    session = await chat_service.get_session(session_id)
+    if not session:
+        await websocket.close(code=4404, reason="Session not found")
+        return
+    
+    if shutdown.draining:
+        await websocket.close(code=1012, reason="Server restarting")
+        return
+    
+    await websocket.accept()
+    chat_service.prefetch_history(session_id)
+    with chat_service.events.subscribe(session_topic(session_id)) as subscription:
+        watcher = asyncio.create_task(_close_on_disconnect(websocket, subscription))
+        unregister = shutdown.add_stream(subscription.close)
+        try:
+            await websocket.send_json({
+                "type": "session",
+                "session": session.model_dump(mode="json"),
+                "version": chat_service.get_version(session_id)
+            })
+            async for event in subscription:
+                await websocket.send_json(event)
+                if event["type"] == "session_deleted":
+                    await websocket.close()
+                    break
+            else:
+                # Subscription ended by the drain, not by the client leaving
+                if shutdown.draining and websocket.client_state == WebSocketState.CONNECTED:
+                    await websocket.close(code=1012, reason="Server restarting")
+        except SlowConsumerError:
+            await websocket.close(code=1013, reason="Slow consumer")
+        except WebSocketDisconnect:
+            pass
+        finally:
+            unregister()
+            watcher.cancel()
@@ -0,0 +1,98 @@
+"""Debug and diagnostics endpoints"""
+
+from fastapi import APIRouter, HTTPException
+
+from app.services.chat_service import chat_service
+from app.services.compaction import compaction_worker
+from app.services.provider_router import provider_router
+from app.services.tenants import tenant_registry
+from app.utils.loop_monitor import loop_monitor
+from app.utils.tracing import InMemoryExporter, tracer
+
+router = APIRouter()
+
+
+def _memory_exporter() -> InMemoryExporter:
+    for exporter in tracer.exporters:
+        if isinstance(exporter, InMemoryExporter):
+            return exporter
+    raise HTTPException(status_code=404, detail="In-memory trace exporter is not configured")
+
+
+@router.get("/traces")
+async def list_traces(limit: int = 50, min_duration_ms: float = 0.0):
+    """
+    List recently sampled traces, newest first
+    """
+    exporter = _memory_exporter()
+    traces = [t for t in reversed(exporter.traces) if t["duration_ms"] >= min_duration_ms]
+    return {"enabled": tracer.enabled, "traces": traces[:limit]}
+
+
+@router.delete("/traces")
+async def clear_traces():
+    """
+    Drop all traces held in memory
+    """
+    _memory_exporter().clear()
+    return {"message": "Traces cleared"}
+
+
+@router.get("/providers")
+async def provider_stats():
+    """
+    Latency, error rate and circuit state of each generation provider
+    """
+    return provider_router.stats()
+
+
+@router.get("/history-cache")
+async def history_cache_stats():
+    """
+    Hit rate of the speculative history cache
+    """
+    return chat_service.history_cache_stats()
+
+
+@router.get("/semantic-cache")
+async def semantic_cache_stats():
+    """
+    Hit and false-hit rates of the semantic response cache (per tenant under /tenants)
+    """
+    cache = chat_service.semantic_cache
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Semantic cache is disabled")
+    return cache.stats()
+
+
+@router.get("/compaction")
+async def compaction_stats():
+    """
+    Backlog of the background session compaction worker
+    """
+    return compaction_worker.stats()
+
+
+@router.get("/tenants")
+async def tenant_stats():
+    """
+    Usage, shard and quotas of each active tenant
+    """
+    return tenant_registry.stats()
+
+
+@router.get("/event-loop")
+async def event_loop_stats(limit: int = 50):
+    """
+    Event-loop lag and recent blocking calls with their route and stack, newest first
+    """
+    return loop_monitor.snapshot(limit=limit)
+
+
+@router.delete("/event-loop")
+async def clear_event_loop_stats():
+    """
+    Drop recorded blocking calls and reset the maximum lag
+    """
+    loop_monitor.clear()
+    return {"message": "Event-loop stats cleared"}
@@ -1,7 +1,39 @@
 """Application configuration using pydantic-settings"""
 
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Dict, List, Optional
+
+
+class MCPServerSettings(BaseModel):
+    """Connection settings for one MCP server"""
+    name: str
+    command: Optional[List[str]] = None  # stdio transport: command line to spawn
+    socket_path: Optional[str] = None  # local Unix socket transport
+    env: Dict[str, str] = {}
+    tool_timeouts: Dict[str, float] = {}  # per-tool overrides of mcp_tool_timeout
+    idempotent_tools: List[str] = []  # results memoized in addition to annotated tools
+
+
+class ProviderSettings(BaseModel):
+    """A generation provider registered with the provider router at startup"""
+    name: str  # also the APIKey name its key is stored under, e.g. "openai"
+    kind: str = "openai"  # "openai" (chat completions compatible) or "anthropic" (messages API)
+    model: str
+    base_url: Optional[str] = None  # defaults to the vendor's public endpoint
+    api_key: Optional[str] = None  # fallback when the tenant has no stored key
+    max_tokens: int = 1024
+    timeout: float = 60.0  # seconds
+
+
+class TenantQuotaSettings(BaseModel):
+    """Per-tenant overrides of the default tenant quotas (None keeps the default)"""
+    max_sessions: Optional[int] = None
+    max_message_bytes: Optional[int] = None
+    max_concurrency: Optional[int] = None
+    rate_per_s: Optional[float] = None
+    burst: Optional[int] = None
+    shard: Optional[int] = None  # pin the tenant to a database shard
 
 
 class Settings(BaseSettings):
@@ -20,9 +52,128 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite:///./chat.db"
+    # Create tables on each worker boot; disable when running `python -m app.db` once at deploy
+    db_create_on_startup: bool = True
+    # Extra database URLs; tenants are spread over [database_url, *database_shards]
+    database_shards: list[str] = []
+    
+    # /debug endpoints: open when `debug` is set, otherwise only with this key in X-Admin-Key
+    admin_api_key: Optional[str] = None
+    
+    # Tenants (selected by the X-API-Key header; requests without one use default_tenant)
+    default_tenant: str = "default"
+    # JSON object mapping API keys to tenant ids; other keys are rejected with 401
+    tenant_api_keys: Dict[str, str] = {}
+    tenant_idle_s: float = 24 * 3600  # drop idle tenants with nothing left in memory
+    tenant_max_sessions: int = 10_000
+    tenant_max_message_bytes: int = 64 * 1024 * 1024  # stored message content per tenant
+    tenant_max_concurrency: int = 32  # in-flight requests per tenant
+    tenant_rate_per_s: float = 50.0  # sustained requests per second per tenant
+    tenant_burst: int = 100
+    tenant_quotas: Dict[str, TenantQuotaSettings] = {}  # per-tenant overrides
+    
+    # Logging
+    log_json: bool = True
+    log_debug_sample_rate: float = 1.0  # fraction of requests whose DEBUG logs are kept
+    access_log: bool = True
+    
+    # Response compression (gzip; brotli/zstd when installed)
+    compression_enabled: bool = True
+    compression_min_size: int = 1024  # bytes; smaller complete responses are sent as-is
+    compression_level: int = 6
+    
+    # History cache (recent-history windows warmed when a session is touched)
+    history_window: int = 50  # messages passed to generation
+    history_cache_size: int = 1024  # sessions
+    
+    # Background compaction of long sessions (see app/services/compaction.py)
+    compaction_enabled: bool = True
+    compaction_threshold: int = 100  # uncompacted messages that trigger a summary
+    compaction_keep_recent: int = 20  # newest messages left out of the summary
+    compaction_summary_chars: int = 4000  # cap on summaries built without a provider
+    compaction_rate_per_s: float = 1.0  # compaction jobs started per second at most
+    compaction_max_in_flight: int = 4  # only compact while at most this many requests run
+
+    # Semantic response cache in front of generation (see app/services/semantic_cache.py)
+    semantic_cache_enabled: bool = True
+    semantic_cache_embedder: str = "hashing"  # or "package.module:factory" for a local model
+    semantic_cache_dimensions: int = 512  # hashing embedder vector size
+    semantic_cache_threshold: float = 0.9  # cosine similarity needed to serve a cached reply
+    semantic_cache_size: int = 10_000  # replies per tenant
+    semantic_cache_ttl_s: float = 24 * 3600
+    semantic_cache_ann_threshold: int = 5_000  # entries above which search uses LSH (at most 500 without NumPy)
+    semantic_cache_verify_rate: float = 0.01  # fraction of hits regenerated to measure false hits
+    # Reply similarity below which a verified hit is false; 0.45 suits the hashing embedder, raise it for models
+    semantic_cache_verify_threshold: float = 0.45
+
+    # Overload protection (see app/services/overload.py)
+    overload_enabled: bool = True
+    overload_max_in_flight: int = 256  # admitted concurrently; more wait in a queue
+    overload_queue_timeout_ms: float = 1000.0  # queued longer than this: 503
+    overload_lag_threshold_ms: float = 100.0  # event-loop lag at capacity
+    overload_queue_threshold_ms: float = 200.0  # queue wait at capacity
+    overload_degrade_ratio: float = 0.7  # pressure at which to start degrading
+    overload_degraded_history_window: int = 10
+    overload_stale_ttl_s: float = 30.0  # how stale a cached list may be when degraded
+    
+    # Event-loop lag and blocking-call detection (see app/utils/loop_monitor.py)
+    blocking_detector_enabled: bool = True  # lag is sampled either way
+    blocking_threshold_ms: float = 100.0  # loop steps longer than this are recorded with their stack
+    blocking_heartbeat_ms: float = 25.0  # lag sampling interval (also feeds overload protection)
+    blocking_max_events: int = 100  # recent stalls kept for /debug/event-loop
+
+    # Graceful shutdown (see app/services/shutdown.py)
+    shutdown_drain_timeout_s: float = 25.0  # wait this long for in-flight requests and generations
+    shutdown_drain_delay_s: float = 0.0  # after SIGTERM, fail readiness at least this long (load balancer probe period)
+    shutdown_archive_sessions: bool = True  # archive all live sessions on shutdown (needs archive_enabled)
+
+    # Idempotency-Key results for POST /chat/ and /chat/sessions, per tenant
+    idempotency_cache_size: int = 10_000
+    idempotency_ttl_s: float = 24 * 3600
+    
+    # Archival of idle sessions to compressed segment files (see app/services/archive.py)
+    archive_enabled: bool = False
+    archive_dir: str = "./archive"  # one subdirectory per tenant; use an absolute path in deployments
+    archive_idle_s: float = 7 * 24 * 3600  # archive sessions idle for longer than this
+    archive_interval_s: float = 600.0  # how often to look for idle sessions
+    archive_segment_max_mb: int = 64
+    
+    # Sanitized capture of chat traffic for replay (see app/middleware/capture.py)
+    capture_enabled: bool = False
+    capture_dir: str = "./captures"
+    capture_file_max_mb: int = 64
+
+    # Provider routing (see app/services/provider_router.py)
+    # JSON list, e.g. PROVIDERS='[{"name": "openai", "model": "gpt-4o-mini"}]'
+    providers: list[ProviderSettings] = []
+    router_ewma_alpha: float = 0.2
+    router_hedge_min_ms: float = 50.0  # never hedge earlier than this
+    router_breaker_failures: int = 5  # consecutive failures before skipping a provider
+    router_breaker_reset_s: float = 30.0  # cool-down before a trial request
+    
+    # Real-time updates (pub/sub for WebSocket subscribers)
+    pubsub_backend: str = "memory"  # "memory" (single worker) or "redis" (cross-worker)
+    pubsub_redis_url: str = "redis://localhost:6379/0"
+    pubsub_buffer_size: int = 100  # per-subscriber queue; slower consumers are dropped
+    
+    # Tracing (see app/utils/tracing.py)
+    tracing_enabled: bool = False
+    tracing_exporter: str = "memory"  # "memory" or "json"
+    tracing_export_path: str = "traces.jsonl"
+    tracing_slow_threshold_ms: float = 500.0  # always keep traces slower than this
+    tracing_sample_rate: float = 0.0  # fraction of fast traces to keep
+    
+    # Startup profiling (import and init timings, see app/utils/startup.py)
+    startup_profile: bool = False
     
     # MCP Settings (customize as needed)
     mcp_enabled: bool = True
+    # JSON list, e.g. MCP_SERVERS='[{"name": "files", "command": ["mcp-files"]}]'
+    mcp_servers: list[MCPServerSettings] = []
+    mcp_pool_size: int = 2  # connections per server
+    mcp_tool_timeout: float = 30.0  # seconds
+    mcp_result_cache_size: int = 1024
+    mcp_result_cache_ttl: float = 300.0  # seconds
     
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -0,0 +1,13 @@
+"""Request-scoped context shared by logging, middleware and services"""
+
+from contextvars import ContextVar
+from typing import Optional
+
+# Set by RequestContextMiddleware for every HTTP request
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Set by the chat routes/service once the session is known
+session_id_var: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+
+# Set by the tenant dependency from the request's API key
+tenant_id_var: ContextVar[Optional[str]] = ContextVar("tenant_id", default=None)
@@ -1,25 +1,95 @@
-"""Database configuration and session management"""
+"""Database configuration and session management
 
-from sqlalchemy import create_engine
+Storage can be sharded by tenant: shard 0 is `database_url` and shards
+1..n are `database_shards`. Each tenant lives on exactly one shard.
+"""
+
+import zlib
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.utils.tracing import instrument_engine
+
+# Engine is created lazily on first use so importing the app stays cheap
+_engine: Optional[Engine] = None
 
-# Create database engine
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+# Create session factory (bound to the engine on first use)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Engines and session factories of shards 1..n, also created lazily
+_shard_engines: Dict[int, Engine] = {}
+_shard_sessions: Dict[int, sessionmaker] = {}
 
 # Create base class for models
 Base = declarative_base()
 
 
+def _create_engine(url: str) -> Engine:
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False} if "sqlite" in url else {}
+    )
+    instrument_engine(engine)
+    return engine
+
+
+def shard_urls() -> List[str]:
+    """Database URLs of all shards, shard 0 first"""
+    return [settings.database_url, *settings.database_shards]
+
+
+def shard_for_tenant(tenant_id: str) -> int:
+    """
+    Shard holding a tenant's data
+
+    The default tenant stays on the primary database; others are placed by
+    hash unless pinned with `tenant_quotas[<tenant>].shard`.
+    """
+    shards = len(shard_urls())
+    pinned = settings.tenant_quotas.get(tenant_id)
+    if pinned is not None and pinned.shard is not None:
+        return pinned.shard % shards
+    if tenant_id == settings.default_tenant:
+        return 0
+    return zlib.crc32(tenant_id.encode()) % shards
+
+
+def get_engine(shard: int = 0) -> Engine:
+    """Get the database engine of a shard, creating it on first use"""
+    global _engine
+    if shard:
+        if shard not in _shard_engines:
+            _shard_engines[shard] = _create_engine(shard_urls()[shard])
+            _shard_sessions[shard] = sessionmaker(
+                autocommit=False, autoflush=False, bind=_shard_engines[shard]
+            )
+        return _shard_engines[shard]
+    if _engine is None:
+        _engine = _create_engine(settings.database_url)
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def get_session_factory(shard: int = 0) -> sessionmaker:
+    """Session factory bound to a shard"""
+    get_engine(shard)
+    return _shard_sessions[shard] if shard else SessionLocal
+
+
+def __getattr__(name: str):
+    # Keep `from app.db import engine` working without creating it at import time
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def get_db():
     """Database dependency for FastAPI"""
+    get_engine()
     db = SessionLocal()
     try:
         yield db
@@ -28,8 +98,48 @@ def get_db():
 
 
 def init_db():
-    """Initialize database tables"""
+    """Initialize database tables on every shard and upgrade older schemas"""
     from app.models import api_key  # noqa: F401
-    Base.metadata.create_all(bind=engine)
+    for shard in range(len(shard_urls())):
+        engine = get_engine(shard)
+        Base.metadata.create_all(bind=engine)
+        upgrade_api_keys(engine)
+
+
+def upgrade_api_keys(engine: Engine) -> bool:
+    """
+    Scope an `api_keys` table created before tenants to the default tenant
+
+    Adds the `tenant_id` column (existing keys belong to the default tenant)
+    and replaces the global unique key name with a per-tenant one. Idempotent:
+    does nothing once the column exists.
+
+    Returns:
+        True if the table was upgraded
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("api_keys")}
+    if "tenant_id" in columns:
+        return False
+    # DDL takes no bound parameters; quote the default as a SQL literal
+    default = "'" + settings.default_tenant.replace("'", "''") + "'"
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE api_keys ADD COLUMN tenant_id VARCHAR NOT NULL DEFAULT {default}"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_api_keys_name"))
+        conn.execute(text("CREATE INDEX ix_api_keys_name ON api_keys (name)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_api_keys_tenant_id ON api_keys (tenant_id)"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_api_keys_tenant_name ON api_keys (tenant_id, name)"
+        ))
+    return True
 
 
+def dispose_engines() -> None:
+    """Close the connection pools of all engines created so far"""
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+    for engine in _shard_engines.values():
+        engine.dispose()
+    _shard_engines.clear()
+    _shard_sessions.clear()
@@ -0,0 +1,11 @@
+"""Create (and upgrade) database tables once, ahead of starting the application workers
+
+Usage:
+    python -m app.db
+"""
+
+from app.db import init_db
+
+if __name__ == "__main__":
+    init_db()
+    print("Database initialized")
@@ -1,27 +1,124 @@
 """Main FastAPI application entry point"""
 
-from fastapi import FastAPI
+import asyncio
+import math
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
 from app.api.routes import api_router
+from app.middleware import (
+    CaptureMiddleware,
+    CompressionMiddleware,
+    DrainMiddleware,
+    OverloadMiddleware,
+    RequestContextMiddleware,
+    TracingMiddleware,
+)
+from app.middleware.capture import capture_writer
+from app.middleware.compression import precompressed
+from app.services.compaction import compaction_worker
+from app.services.mcp_client import mcp_client
+from app.services.overload import overload
+from app.services.provider_router import provider_router
+from app.services.providers import register_providers
+from app.services.pubsub import event_bus
+from app.services.quotas import QuotaExceededError
+from app.services.shutdown import shutdown
+from app.services.tenants import tenant_registry
+from app.utils.logger import configure_logging, logger, shutdown_logging
+from app.utils.loop_monitor import loop_monitor
+from app.utils.metrics import metrics
+from app.utils.tracing import tracer
+from app.utils.startup import profiler
+
+
+async def maintain_tenants() -> None:
+    """Periodically move idle sessions to cold storage and drop idle tenants"""
+    while True:
+        await asyncio.sleep(settings.archive_interval_s)
+        if settings.archive_enabled:
+            archived = await tenant_registry.archive_idle_sessions(settings.archive_idle_s)
+            if archived:
+                logger.info("Archived idle sessions", extra={"sessions": archived})
+        evicted = tenant_registry.evict_idle(settings.tenant_idle_s)
+        if evicted:
+            logger.info("Dropped idle tenants", extra={"tenants": evicted})
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
-    print(f"Starting {settings.app_name} v{settings.app_version}")
+    configure_logging()
+    logger.info(f"Starting {settings.app_name} v{settings.app_version}")
+    shutdown.reset()
     
     # Initialize database
-    from app.db import init_db
-    init_db()
-    print("Database initialized")
+    if settings.db_create_on_startup:
+        from app.db import init_db
+        with profiler.phase("init_db"):
+            init_db()
+        logger.info("Database initialized")
+    
+    await event_bus.start()
+    await overload.start()
+    providers = register_providers(provider_router)
+    if providers:
+        logger.info("Generation providers registered", extra={"providers": providers})
+    # Samples loop lag for overload protection; detects blocking calls if enabled
+    await loop_monitor.start(detect_blocking=settings.blocking_detector_enabled)
+    
+    # Render and compress the OpenAPI schema and docs pages once
+    if settings.compression_enabled:
+        with profiler.phase("precompress"):
+            await precompressed.build(
+                app.router,
+                [url for url in (app.openapi_url, app.docs_url, app.redoc_url) if url],
+                level=settings.compression_level
+            )
+    
+    maintenance = asyncio.create_task(maintain_tenants())
+    if settings.compaction_enabled:
+        await compaction_worker.start()
+    
+    if settings.startup_profile:
+        profiler.uninstall()
+        logger.info(profiler.report())
+    
+    # Drain on SIGTERM while the server still accepts connections, then let it stop
+    shutdown.install_signal_handlers(settings.shutdown_drain_timeout_s, settings.shutdown_drain_delay_s)
     
     yield
-    # Shutdown
-    print("Shutting down...")
+    # Shutdown: stop taking work and let in-flight requests and generations finish
+    # (already done when the server was stopped by a signal)
+    logger.info("Shutting down...")
+    shutdown.uninstall_signal_handlers()
+    await shutdown.drain(settings.shutdown_drain_timeout_s)
+    maintenance.cancel()
+    await compaction_worker.stop()
+    
+    # Flush state: live sessions to the archive (the next instance rehydrates them), buffered writes
+    if settings.archive_enabled and settings.shutdown_archive_sessions:
+        archived = await tenant_registry.archive_idle_sessions(0)
+        logger.info("Archived sessions", extra={"sessions": archived})
+    tenant_registry.close()
+    capture_writer.close()
+    
+    # Close connections
+    await event_bus.stop()
+    await mcp_client.close()
+    await provider_router.close()
+    from app.db import dispose_engines
+    dispose_engines()
+    await loop_monitor.stop()
+    await overload.stop()
+    precompressed.clear()
+    tracer.shutdown()
+    shutdown_logging()
 
 
 # Create FastAPI application
@@ -32,6 +129,12 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Negotiated compression (innermost, so CORS headers are added to precompressed responses too)
+app.add_middleware(CompressionMiddleware)
+
+# Admission control and load shedding (inside CORS, so 503s carry CORS headers)
+app.add_middleware(OverloadMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -41,10 +144,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request traces (no-op unless TRACING_ENABLED)
+app.add_middleware(TracingMiddleware)
+
+# Sanitized traffic capture for replay (outside overload protection, so shed requests are recorded)
+if settings.capture_enabled:
+    app.add_middleware(CaptureMiddleware)
+
+# Refuse new requests while draining for shutdown (inside request context, so refusals are logged)
+app.add_middleware(DrainMiddleware)
+
+# Request ids and access logs (outermost, so it also sees CORS responses)
+app.add_middleware(RequestContextMiddleware)
+
 # Include API routes
 app.include_router(api_router, prefix=settings.api_v1_prefix)
 
 
+@app.exception_handler(QuotaExceededError)
+async def quota_exceeded_handler(request: Request, exc: QuotaExceededError):
+    """Tenant over a quota: 429, with Retry-After when it is known"""
+    headers = {"Retry-After": str(math.ceil(exc.retry_after))} if exc.retry_after else None
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "quota": exc.quota},
+        headers=headers
+    )
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -61,3 +188,20 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/health/ready")
+async def readiness_check(response: Response):
+    """Readiness for load balancers: 503 while the server is shedding load or draining"""
+    state = overload.snapshot()
+    if shutdown.draining:
+        response.status_code = 503
+        return {"status": "draining", **state, **shutdown.snapshot()}
+    ready = state["level"] != overload.SHEDDING
+    if not ready:
+        response.status_code = 503
+    return {"status": "ready" if ready else "overloaded", **state}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus metrics"""
+    return metrics.render()
@@ -1,14 +1,17 @@
 """Custom middleware for the application"""
 
-# Example custom middleware can be added here
-# from fastapi import Request
-# from starlette.middleware.base import BaseHTTPMiddleware
-#
-# class CustomMiddleware(BaseHTTPMiddleware):
-#     async def dispatch(self, request: Request, call_next):
-#         # Custom logic before request
-#         response = await call_next(request)
-#         # Custom logic after request
-#         return response
-
+from app.middleware.capture import CaptureMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.drain import DrainMiddleware
+from app.middleware.overload import OverloadMiddleware
+from app.middleware.request_context import RequestContextMiddleware
+from app.middleware.tracing import TracingMiddleware
 
+__all__ = [
+    "CaptureMiddleware",
+    "CompressionMiddleware",
+    "DrainMiddleware",
+    "OverloadMiddleware",
+    "RequestContextMiddleware",
+    "TracingMiddleware",
+]
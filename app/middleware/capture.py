@@ -0,0 +1,246 @@
+"""Sanitized traffic capture for the chat routes
+
+Records one compact line per request under `{api_v1_prefix}/chat` so the
+traffic can be replayed later (see benchmarks/replay.py). No content,
+credentials or identifiers are kept. Session ids, tenants and message texts
+are replaced by keyed pseudonyms that are stable within a process, so a
+replay can rebuild which requests belong to the same session and which
+messages repeat. The salt never leaves the process.
+
+Record fields (JSON lines in gzip files under CAPTURE_DIR):
+
+    t   unix time the request started
+    m   method
+    r   route template, e.g. /api/v1/chat/sessions/{session_id}/messages
+    tn  tenant pseudonym
+    s   pseudonym of the session addressed (path or body)
+    ns  pseudonym of the session the response belongs to (creations)
+    n   message length in characters (POST /chat/)
+    h   message pseudonym (normalised text), so repeats can be replayed
+    tc  number of tool calls requested
+    q   query parameters: limit and offset as-is, other values as their length
+    ik  1 if an Idempotency-Key was sent
+    b   request body bytes
+    st  response status
+    rb  response body bytes
+    d   server-side duration in milliseconds
+"""
+
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.services.search_index import tokenize
+from app.services.tenants import tenant_registry
+from app.utils.logger import setup_logger
+
+logger = setup_logger("capture")
+
+# Bodies larger than this are counted but not inspected
+_MAX_INSPECTED_BODY = 1024 * 1024
+
+# Paging parameters are kept; any other value (digits included) only by its length
+_KEPT_PARAMS = frozenset({"limit", "offset"})
+
+
+class CaptureWriter:
+    """Buffers capture records and appends them to rotating gzip files"""
+
+    def __init__(self, directory: str, max_file_bytes: int = 64 * 1024 * 1024, flush_every: int = 256):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.flush_every = flush_every
+        self.records = 0
+        self._salt = os.urandom(16)
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._path: Optional[str] = None
+
+    def pseudonym(self, value: str) -> str:
+        return hmac.new(self._salt, value.encode(), hashlib.sha256).hexdigest()[:16]
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self._buffer.append(record)
+        self.records += 1
+        if len(self._buffer) >= self.flush_every:
+            records, self._buffer = self._buffer, []
+            asyncio.get_running_loop().run_in_executor(None, self._write, records)
+
+    def flush(self) -> None:
+        records, self._buffer = self._buffer, []
+        if records:
+            self._write(records)
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode()
+        with self._lock:
+            if self._path is None or os.path.getsize(self._path) >= self.max_file_bytes:
+                os.makedirs(self.directory, exist_ok=True)
+                stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+                self._path = os.path.join(self.directory, f"capture-{stamp}-{os.getpid()}.jsonl.gz")
+            # Each flush is its own gzip member; readers see one stream
+            with gzip.open(self._path, "ab") as f:
+                f.write(data)
+
+    def close(self) -> None:
+        self.flush()
+
+
+def read_capture(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """All records of the given capture files, in start-time order"""
+    records = []
+    for path in paths:
+        with gzip.open(path, "rt") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def _query(query_string: bytes) -> Dict[str, Any]:
+    return {
+        name: int(value) if name in _KEPT_PARAMS and value.isdigit() else len(value)
+        for name, value in parse_qsl(query_string.decode("latin-1"))
+    }
+
+
+def _json(body: bytes, encoding: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
+    if not body or len(body) > _MAX_INSPECTED_BODY or encoding not in (None, b"identity", b"gzip"):
+        return None
+    try:
+        document = json.loads(gzip.decompress(body) if encoding == b"gzip" else body)
+    except (ValueError, OSError, EOFError):
+        return None
+    return document if isinstance(document, dict) else None
+
+
+class CaptureMiddleware:
+    """
+    Record a sanitized summary of each chat request
+
+    Plain ASGI middleware; request and response bodies are passed through
+    unchanged and only inspected for sizes and session ids. Installed
+    outside overload protection, so shed requests are recorded too.
+    """
+
+    def __init__(self, app: ASGIApp, writer: Optional["CaptureWriter"] = None, prefix: Optional[str] = None):
+        self.app = app
+        self.writer = writer or capture_writer
+        self.prefix = prefix if prefix is not None else f"{settings.api_v1_prefix}/chat"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.time()
+        start = time.perf_counter()
+        request_body: List[bytes] = []
+        response_body: List[bytes] = []
+        request_bytes = 0
+        response_bytes = 0
+        status = 500
+        encoding = None
+        inspect_response = scope["method"] == "POST"
+
+        async def receive_wrapper() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                request_bytes += len(chunk)
+                if request_bytes <= _MAX_INSPECTED_BODY:
+                    request_body.append(chunk)
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, encoding, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                encoding = dict(message.get("headers", [])).get(b"content-encoding")
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                response_bytes += len(chunk)
+                if inspect_response and response_bytes <= _MAX_INSPECTED_BODY:
+                    response_body.append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            # Capture is best effort: a request never fails because it could not be recorded
+            try:
+                self.writer.add(self._record(
+                    scope,
+                    started_at=started_at,
+                    duration_ms=(time.perf_counter() - start) * 1000,
+                    request=_json(b"".join(request_body)) if request_bytes <= _MAX_INSPECTED_BODY else None,
+                    response=_json(b"".join(response_body), encoding) if inspect_response else None,
+                    request_bytes=request_bytes,
+                    response_bytes=response_bytes,
+                    status=status,
+                ))
+            except Exception:
+                logger.exception("Capture record failed", extra={"path": scope["path"]})
+
+    def _record(
+        self,
+        scope: Scope,
+        started_at: float,
+        duration_ms: float,
+        request: Optional[Dict[str, Any]],
+        response: Optional[Dict[str, Any]],
+        request_bytes: int,
+        response_bytes: int,
+        status: int
+    ) -> Dict[str, Any]:
+        pseudonym = self.writer.pseudonym
+        route = scope.get("route")
+        api_key = None
+        idempotent = False
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                api_key = value.decode("latin-1")
+            elif name == b"idempotency-key":
+                idempotent = True
+
+        record: Dict[str, Any] = {
+            "t": round(started_at, 3),
+            "m": scope["method"],
+            "r": getattr(route, "path", None),
+            "tn": pseudonym(tenant_registry.resolve(api_key) or "invalid"),
+        }
+        session_id = scope.get("path_params", {}).get("session_id") or (request or {}).get("session_id")
+        if isinstance(session_id, str):
+            record["s"] = pseudonym(session_id)
+        created = ((response or {}).get("session_id") or (response or {}).get("id")) if status < 400 else None
+        if isinstance(created, str) and pseudonym(created) != record.get("s"):
+            record["ns"] = pseudonym(created)
+        message = (request or {}).get("message")
+        if isinstance(message, str):
+            record["n"] = len(message)
+            record["h"] = pseudonym(" ".join(tokenize(message)))
+            context = request.get("context")
+            tool_calls = context.get("tool_calls") if isinstance(context, dict) else None
+            if isinstance(tool_calls, list) and tool_calls:
+                record["tc"] = len(tool_calls)
+        if scope.get("query_string"):
+            record["q"] = _query(scope["query_string"])
+        if idempotent:
+            record["ik"] = 1
+        record.update(b=request_bytes, st=status, rb=response_bytes, d=round(duration_ms, 3))
+        return record
+
+
+# Singleton instance (used when CAPTURE_ENABLED; nothing is written until then)
+capture_writer = CaptureWriter(settings.capture_dir, max_file_bytes=settings.capture_file_max_mb * 1024 * 1024)
@@ -0,0 +1,347 @@
+"""Negotiated response compression
+
+Supports gzip always, and brotli (`brotli`) and zstd (`zstandard`) when
+those optional packages are installed. Complete responses are compressed
+only above a minimum size; streamed responses (NDJSON, SSE, ...) are
+compressed chunk by chunk with a flush after each chunk so clients see
+events as soon as they are sent.
+
+Responses registered in `precompressed` (the OpenAPI schema and docs pages)
+are rendered and compressed once at startup and served directly.
+"""
+
+import gzip
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+_COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "application/problem+json",
+)
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def compress(encoding: str, data: bytes, level: int) -> bytes:
+    """One-shot compression of a complete body"""
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=min(level, 11))
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(encoding)
+
+
+def _stream(encoding: str, level: int):
+    return {"gzip": _GzipStream, "br": _BrotliStream, "zstd": _ZstdStream}[encoding](level)
+
+
+def available_encodings() -> List[str]:
+    """Supported encodings in server preference order"""
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate(accept_encoding: str, available: Iterable[str]) -> Optional[str]:
+    """
+    Pick the best encoding from an Accept-Encoding header
+
+    Highest q-value wins; ties go to the server's preference order.
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _header(headers: Headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _with_vary(headers: Headers) -> Headers:
+    """
+    Add Accept-Encoding to Vary
+
+    Set on every response whose encoding is negotiated, compressed or not, so
+    shared caches never hand one client's encoding to another.
+    """
+    vary = _header(headers, b"vary")
+    if vary and b"accept-encoding" in vary.lower():
+        return list(headers)
+    result = [(k, v) for k, v in headers if k.lower() != b"vary"]
+    result.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+    return result
+
+
+def _negotiable(message: Message) -> bool:
+    """Whether a response start is one this middleware would compress for some client"""
+    headers = message.get("headers", [])
+    if message["status"] < 200 or message["status"] in (204, 304):
+        return False
+    if _header(headers, b"content-encoding") is not None:
+        return False
+    content_type = (_header(headers, b"content-type") or b"").decode("latin-1").lower()
+    return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+def _with_encoding(headers: Headers, encoding: str, length: Optional[int]) -> Headers:
+    """Replace length, set Content-Encoding and add Accept-Encoding to Vary"""
+    result = [
+        (k, v) for k, v in _with_vary(headers)
+        if k.lower() not in (b"content-length", b"content-encoding")
+    ]
+    result.append((b"content-encoding", encoding.encode()))
+    if length is not None:
+        result.append((b"content-length", str(length).encode()))
+    return result
+
+
+class PrecompressedResponses:
+    """Responses rendered and compressed once, then served from memory"""
+
+    def __init__(self):
+        self.responses: Dict[str, Tuple[int, Headers, Dict[str, bytes]]] = {}
+
+    async def build(self, app: ASGIApp, paths: Iterable[str], level: int) -> None:
+        """Render each path through the app and store every encoding of it"""
+        for path in paths:
+            status, headers, body = await _render(app, path)
+            if status != 200:
+                continue
+            bodies = {"identity": body}
+            for encoding in available_encodings():
+                bodies[encoding] = compress(encoding, body, level)
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+            self.responses[path] = (status, headers, bodies)
+
+    def clear(self) -> None:
+        self.responses.clear()
+
+    async def serve(self, path: str, accept_encoding: str, send: Send) -> bool:
+        """Send a stored response; False if the path is not precompressed"""
+        entry = self.responses.get(path)
+        if entry is None:
+            return False
+        status, headers, bodies = entry
+        encoding = negotiate(accept_encoding, [e for e in bodies if e != "identity"])
+        if encoding is None:
+            body = bodies["identity"]
+            headers = _with_vary(headers) + [(b"content-length", str(len(body)).encode())]
+        else:
+            body = bodies[encoding]
+            headers = _with_encoding(headers, encoding, len(body))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+        return True
+
+
+async def _render(app: ASGIApp, path: str) -> Tuple[int, Headers, bytes]:
+    """Issue an internal GET through an ASGI app and capture the response"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    response: Dict[str, object] = {"status": 500, "headers": [], "body": b""}
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = list(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], response["body"]
+
+
+class CompressionMiddleware:
+    """Compress responses according to the client's Accept-Encoding"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: Optional[int] = None,
+        level: Optional[int] = None,
+        store: Optional[PrecompressedResponses] = None
+    ):
+        self.app = app
+        self.minimum_size = settings.compression_min_size if minimum_size is None else minimum_size
+        self.level = settings.compression_level if level is None else level
+        self.store = store or precompressed
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.compression_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+
+        if scope["method"] == "GET" and await self.store.serve(scope["path"], accept_encoding, send):
+            return
+
+        encoding = negotiate(accept_encoding, self.encodings) if accept_encoding else None
+        if encoding is None or scope["method"] == "HEAD":
+            async def send_with_vary(message: Message) -> None:
+                if message["type"] == "http.response.start" and _negotiable(message):
+                    message["headers"] = _with_vary(message.get("headers", []))
+                await send(message)
+
+            await self.app(scope, receive, send_with_vary)
+            return
+
+        await _CompressedResponder(self, encoding, send).run(scope, receive)
+
+
+class _CompressedResponder:
+    """Per-response state for CompressionMiddleware"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.stream = None
+
+    async def run(self, scope: Scope, receive: Receive) -> None:
+        await self.middleware.app(scope, receive, self.on_send)
+
+    async def on_send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.passthrough = not _negotiable(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        level = self.middleware.level
+
+        if self.stream is None and self.start is not None:
+            start, self.start = self.start, None
+            if not more_body:
+                # Complete response: compress once if it is large enough
+                if len(body) < self.middleware.minimum_size:
+                    start["headers"] = _with_vary(start.get("headers", []))
+                    await self.send(start)
+                    await self.send(message)
+                    return
+                compressed = compress(self.encoding, body, level)
+                start["headers"] = _with_encoding(start.get("headers", []), self.encoding, len(compressed))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming response: compress and flush chunk by chunk
+            self.stream = _stream(self.encoding, level)
+            start["headers"] = _with_encoding(start.get("headers", []), self.encoding, None)
+            await self.send(start)
+
+        chunk = self.stream.chunk(body) if body else b""
+        if not more_body:
+            chunk += self.stream.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+
+# Singleton instance, filled at startup
+precompressed = PrecompressedResponses()
@@ -0,0 +1,54 @@
+"""Refuse new requests while the server drains for shutdown"""
+
+import json
+from typing import Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.services.shutdown import ShutdownCoordinator, shutdown
+from app.utils.metrics import metrics
+
+_refused = metrics.counter("shutdown_refused_total", "Requests refused because the server was draining")
+
+_EXEMPT_PATHS = ("/health", "/metrics")
+
+
+class DrainMiddleware:
+    """
+    Count HTTP requests in flight and refuse new ones while draining
+
+    Refused requests get a 503 with `Connection: close` and `Retry-After`,
+    so clients reconnect (to another instance) before retrying. Health
+    checks and metrics are always served, so probes see the draining state.
+    """
+
+    def __init__(self, app: ASGIApp, coordinator: Optional[ShutdownCoordinator] = None):
+        self.app = app
+        self.coordinator = coordinator or shutdown
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(_EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        if self.coordinator.draining:
+            _refused.inc()
+            body = json.dumps({"detail": "Server is shutting down; retry later"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                    (b"retry-after", b"1"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        self.coordinator.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.coordinator.exit()
@@ -0,0 +1,57 @@
+"""Admission control in front of the application"""
+
+import json
+from typing import Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.services.overload import OverloadController, overload
+from app.utils.metrics import metrics
+
+_shed = metrics.counter("overload_shed_total", "Requests rejected because the server was overloaded")
+
+_EXEMPT_PATHS = ("/health", "/metrics")
+
+
+class OverloadMiddleware:
+    """
+    Admit at most `overload_max_in_flight` requests at a time
+
+    Requests beyond that wait in a FIFO queue and get a 503 if no slot frees
+    up within `overload_queue_timeout_ms`. Health checks and metrics bypass
+    admission so probes keep working under load.
+    """
+
+    def __init__(self, app: ASGIApp, controller: Optional[OverloadController] = None):
+        self.app = app
+        self.controller = controller or overload
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not settings.overload_enabled
+            or scope["path"].startswith(_EXEMPT_PATHS)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.controller.acquire():
+            _shed.inc(reason="queue_timeout")
+            body = json.dumps({"detail": "Server overloaded; retry later"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", b"1"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
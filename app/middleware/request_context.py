@@ -0,0 +1,80 @@
+"""Request context and access log middleware"""
+
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.context import request_id_var, session_id_var, tenant_id_var
+from app.utils.ids import uuid7
+from app.utils.logger import access_logger
+from app.utils.loop_monitor import loop_monitor
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+
+class RequestContextMiddleware:
+    """
+    Assign a request id to each HTTP request and emit one access log line
+
+    Implemented as plain ASGI middleware so context variables set here are
+    visible to the route handler and streamed responses are not buffered.
+    The request id is taken from the X-Request-ID header when present and
+    echoed back on the response.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:128]
+                break
+        if not request_id:
+            request_id = uuid7().replace("-", "")
+
+        request_token = request_id_var.set(request_id)
+        session_token = session_id_var.set(None)
+        tenant_token = tenant_id_var.set(None)
+        monitor_token = loop_monitor.track(scope)
+        start = time.perf_counter()
+        status_code = 500
+        response_bytes = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (REQUEST_ID_HEADER, request_id.encode("latin-1"))
+                ]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if settings.access_log:
+                access_logger.info(
+                    "request",
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                        "response_bytes": response_bytes,
+                        "client": scope["client"][0] if scope.get("client") else None,
+                    },
+                )
+            request_id_var.reset(request_token)
+            session_id_var.reset(session_token)
+            tenant_id_var.reset(tenant_token)
+            loop_monitor.untrack(monitor_token)
@@ -0,0 +1,47 @@
+"""Request tracing middleware"""
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.context import request_id_var
+from app.utils.tracing import tracer
+
+
+class TracingMiddleware:
+    """
+    Start a trace for each HTTP request when tracing is enabled
+
+    The trace id is the request id assigned by RequestContextMiddleware, so
+    traces can be joined with access logs. When tracing is disabled requests
+    pass straight through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = tracer.start_trace(
+            f"{scope['method']} {scope['path']}",
+            trace_id=request_id_var.get(),
+            **{"http.method": scope["method"], "http.path": scope["path"]},
+        )
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                trace.root.attributes["http.status_code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            trace.root.error = repr(e)
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None and hasattr(route, "path"):
+                trace.root.name = f"{scope['method']} {route.path}"
+                trace.root.attributes["http.route"] = route.path
+            tracer.finish_trace(trace)
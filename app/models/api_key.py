@@ -1,21 +1,24 @@
 """API Key database model"""
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, UniqueConstraint
 from datetime import datetime
+from app.core.config import settings
 from app.db import Base
 
 
 class APIKey(Base):
     """Model for storing API keys"""
     __tablename__ = "api_keys"
+    __table_args__ = (UniqueConstraint("tenant_id", "name", name="uq_api_keys_tenant_name"),)
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    name = Column(String, unique=True, index=True, nullable=False)  # e.g., "openai", "anthropic"
+    tenant_id = Column(String, index=True, nullable=False, default=lambda: settings.default_tenant)
+    name = Column(String, index=True, nullable=False)  # e.g., "openai", "anthropic"; unique per tenant
     encrypted_key = Column(String, nullable=False)  # Encrypted API key
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     def __repr__(self):
-        return f"<APIKey(name='{self.name}', is_active={self.is_active})>"
+        return f"<APIKey(tenant_id='{self.tenant_id}', name='{self.name}', is_active={self.is_active})>"
 
@@ -1,6 +1,6 @@
 """Chat-related Pydantic schemas"""
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter, field_validator
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from enum import Enum
@@ -31,12 +31,34 @@ class ChatMessage(BaseModel):
         }
 
 
+class ToolCallRequest(BaseModel):
+    """An MCP tool call requested in a chat message's `context["tool_calls"]`"""
+    server: str = Field(..., min_length=1, description="Configured MCP server name")
+    name: str = Field(..., min_length=1, description="Tool name")
+    arguments: Dict[str, Any] = Field(default_factory=dict, description="Tool arguments")
+    timeout: Optional[float] = Field(
+        None, gt=0, description="Per-call timeout in seconds, capped at the configured tool timeout"
+    )
+
+
+_tool_calls = TypeAdapter(List[ToolCallRequest])
+
+
 class ChatRequest(BaseModel):
     """Chat request schema"""
     message: str = Field(..., min_length=1, description="User message")
     session_id: Optional[str] = Field(None, description="Session ID for conversation continuity")
     context: Optional[Dict[str, Any]] = Field(None, description="Additional context for the message")
     
+    @field_validator("context")
+    @classmethod
+    def _validate_tool_calls(cls, context: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Reject malformed tool calls up front (422) instead of failing mid-turn"""
+        if context and context.get("tool_calls") is not None:
+            calls = _tool_calls.validate_python(context["tool_calls"])
+            context = {**context, "tool_calls": [call.model_dump() for call in calls]}
+        return context
+    
     class Config:
         json_schema_extra = {
             "example": {
@@ -88,6 +110,10 @@ class ChatSession(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     message_count: int = Field(0, description="Number of messages in session")
     metadata: Optional[Dict[str, Any]] = None
+    forked_from: Optional[str] = Field(None, description="Session this one was forked from")
+    forked_at: Optional[str] = Field(None, description="Last message shared with the parent session")
+    summary: Optional[str] = Field(None, description="Summary of the compacted messages")
+    compacted_count: int = Field(0, description="Number of leading messages covered by the summary")
     
     class Config:
         json_schema_extra = {
@@ -101,3 +127,38 @@ class ChatSession(BaseModel):
         }
 
 
+class SearchHit(BaseModel):
+    """A single message matching a search query"""
+    message_id: Optional[str] = Field(None, description="Matching message ID")
+    session_id: str = Field(..., description="Session containing the message")
+    role: MessageRole
+    snippet: str = Field(..., description="Excerpt of the message around the match")
+    timestamp: Optional[datetime] = None
+    score: float = Field(..., description="Relevance score (BM25)")
+
+
+class SearchResponse(BaseModel):
+    """Paginated search results"""
+    query: str
+    total: int = Field(..., description="Total number of matching messages")
+    limit: int
+    offset: int
+    hits: List[SearchHit]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "query": "fastapi",
+                "total": 1,
+                "limit": 10,
+                "offset": 0,
+                "hits": [{
+                    "message_id": "msg-789",
+                    "session_id": "session-123",
+                    "role": "user",
+                    "snippet": "What is FastAPI?",
+                    "timestamp": "2025-11-04T10:00:00Z",
+                    "score": 1.42
+                }]
+            }
+        }
@@ -2,13 +2,27 @@
 
 from sqlalchemy.orm import Session
 from typing import Optional, List
+from app.core.config import settings
 from app.models.api_key import APIKey
 from app.schemas.api_key import APIKeyCreate, APIKeyUpdate
-from app.utils.encryption import encryption_service
+from app.utils.encryption import get_encryption_service
+from app.utils.tracing import traced
+
+
+def _invalidate_cached(name: str, tenant_id: Optional[str]) -> None:
+    """Stop the provider router from using a cached copy of a changed key"""
+    from app.services.provider_router import CachedKeyResolver, provider_router
+
+    if isinstance(provider_router.key_resolver, CachedKeyResolver):
+        provider_router.key_resolver.invalidate(tenant_id or settings.default_tenant, name)
 
 
 class APIKeyService:
-    """Service for managing API keys"""
+    """
+    Service for managing API keys
+    
+    Keys are scoped by tenant; `tenant_id` defaults to the default tenant.
+    """
     
     def mask_key(self, key: str) -> str:
         """
@@ -19,102 +33,127 @@ class APIKeyService:
             return f"{key[:4]}...{key[-2:]}"
         return f"{key[:8]}...{key[-4:]}"
     
-    def create_or_update_key(self, db: Session, key_data: APIKeyCreate) -> APIKey:
+    def create_or_update_key(
+        self,
+        db: Session,
+        key_data: APIKeyCreate,
+        tenant_id: Optional[str] = None
+    ) -> APIKey:
         """
         Create a new API key or update existing one
         
         Args:
             db: Database session
             key_data: API key data to create/update
+            tenant_id: Owning tenant
             
         Returns:
             Created or updated APIKey model
         """
         # Check if key already exists
-        existing_key = db.query(APIKey).filter(APIKey.name == key_data.name).first()
+        existing_key = self.get_key(db, key_data.name, tenant_id)
         
         # Encrypt the key
-        encrypted_key = encryption_service.encrypt(key_data.key)
+        encrypted_key = get_encryption_service().encrypt(key_data.key)
         
         if existing_key:
             # Update existing key
             existing_key.encrypted_key = encrypted_key
             existing_key.is_active = True
             db.commit()
+            _invalidate_cached(key_data.name, tenant_id)
             db.refresh(existing_key)
             return existing_key
         else:
             # Create new key
             db_key = APIKey(
+                tenant_id=tenant_id or settings.default_tenant,
                 name=key_data.name,
                 encrypted_key=encrypted_key,
                 is_active=True
             )
             db.add(db_key)
             db.commit()
+            # A missing key may have been cached as None
+            _invalidate_cached(key_data.name, tenant_id)
             db.refresh(db_key)
             return db_key
     
-    def get_key(self, db: Session, name: str) -> Optional[APIKey]:
+    def get_key(self, db: Session, name: str, tenant_id: Optional[str] = None) -> Optional[APIKey]:
         """
         Get an API key by name
         
         Args:
             db: Database session
             name: Name of the API key
+            tenant_id: Owning tenant
             
         Returns:
             APIKey model or None
         """
-        return db.query(APIKey).filter(APIKey.name == name).first()
+        return db.query(APIKey).filter(
+            APIKey.tenant_id == (tenant_id or settings.default_tenant),
+            APIKey.name == name
+        ).first()
     
-    def get_decrypted_key(self, db: Session, name: str) -> Optional[str]:
+    @traced("api_keys.get_decrypted_key")
+    def get_decrypted_key(self, db: Session, name: str, tenant_id: Optional[str] = None) -> Optional[str]:
         """
         Get the decrypted API key value
         
         Args:
             db: Database session
             name: Name of the API key
+            tenant_id: Owning tenant
             
         Returns:
             Decrypted key string or None
         """
-        api_key = self.get_key(db, name)
+        api_key = self.get_key(db, name, tenant_id)
         if api_key and api_key.is_active:
-            return encryption_service.decrypt(api_key.encrypted_key)
+            return get_encryption_service().decrypt(api_key.encrypted_key)
         return None
     
-    def list_keys(self, db: Session) -> List[APIKey]:
+    def list_keys(self, db: Session, tenant_id: Optional[str] = None) -> List[APIKey]:
         """
-        List all API keys
+        List all API keys of a tenant
         
         Args:
             db: Database session
+            tenant_id: Owning tenant
             
         Returns:
             List of APIKey models
         """
-        return db.query(APIKey).all()
+        return db.query(APIKey).filter(APIKey.tenant_id == (tenant_id or settings.default_tenant)).all()
     
-    def delete_key(self, db: Session, name: str) -> bool:
+    def delete_key(self, db: Session, name: str, tenant_id: Optional[str] = None) -> bool:
         """
         Delete an API key
         
         Args:
             db: Database session
             name: Name of the API key
+            tenant_id: Owning tenant
             
         Returns:
             True if deleted, False if not found
         """
-        api_key = self.get_key(db, name)
+        api_key = self.get_key(db, name, tenant_id)
         if api_key:
             db.delete(api_key)
             db.commit()
+            _invalidate_cached(name, tenant_id)
             return True
         return False
     
-    def update_key_status(self, db: Session, name: str, is_active: bool) -> Optional[APIKey]:
+    def update_key_status(
+        self,
+        db: Session,
+        name: str,
+        is_active: bool,
+        tenant_id: Optional[str] = None
+    ) -> Optional[APIKey]:
         """
         Update API key active status
         
@@ -122,14 +161,16 @@ class APIKeyService:
             db: Database session
             name: Name of the API key
             is_active: New active status
+            tenant_id: Owning tenant
             
         Returns:
             Updated APIKey model or None
         """
-        api_key = self.get_key(db, name)
+        api_key = self.get_key(db, name, tenant_id)
         if api_key:
             api_key.is_active = is_active
             db.commit()
+            _invalidate_cached(name, tenant_id)
             db.refresh(api_key)
             return api_key
         return None
@@ -0,0 +1,262 @@
+"""Cold storage for idle sessions
+
+Sessions idle beyond `archive_idle_s` are moved out of the chat store into
+append-only segment files on local disk. Each record is a length-prefixed,
+zlib-compressed JSON document holding one session with its messages.
+An append-only `index.jsonl` maps session ids to (segment, offset, length)
+and keeps the session summary, so archived sessions can still be listed
+without reading their messages.
+
+Reads memory-map the segment and decompress only the requested record.
+Rehydrated and deleted sessions are tombstoned in the index; their old
+bytes stay in the segment and are reported as `dead_bytes`. Tombstones are
+queued on the event loop and written by the next `write()` or `flush()`,
+which run in worker threads.
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+_HEADER = struct.Struct(">I")  # compressed payload length
+_SEGMENT_NAME = "segment-{:06d}.log"
+_INDEX_NAME = "index.jsonl"
+
+
+def tenant_directory(base: str, tenant_id: str) -> str:
+    """Archive directory of a tenant (tenant ids are made filesystem-safe)"""
+    return os.path.join(base, re.sub(r"[^A-Za-z0-9_.-]", "_", tenant_id))
+
+
+@dataclass
+class ArchiveEntry:
+    """Location and summary of one archived session"""
+    session_id: str
+    segment: int
+    offset: int
+    length: int
+    archived_at: float
+    session: Dict[str, Any]
+
+
+class SessionArchive:
+    """Append-only, compressed segment store for archived sessions"""
+
+    def __init__(self, directory: str, segment_max_bytes: int = 64 * 1024 * 1024, level: int = 6):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.level = level
+        self.dead_bytes = 0
+        self._entries: Optional[Dict[str, ArchiveEntry]] = None
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._files: Dict[int, Any] = {}
+        self._active_segment: Optional[int] = None
+        self._tombstones: List[str] = []
+        # Segment appends / index appends / mmap reads / queued tombstones
+        self._write_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._map_lock = threading.Lock()
+        self._tombstone_lock = threading.Lock()
+
+    @property
+    def entries(self) -> Dict[str, ArchiveEntry]:
+        """Archived sessions by id; the index is read on first use (see `load()`)"""
+        if self._entries is None:
+            self.load()
+        return self._entries
+
+    @property
+    def loaded(self) -> bool:
+        return self._entries is not None
+
+    def load(self) -> None:
+        """Read the on-disk index if not done yet (blocking; call from a worker thread)"""
+        with self._index_lock:
+            if self._entries is None:
+                self._entries = self._load_index()
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, _SEGMENT_NAME.format(segment))
+
+    def _load_index(self) -> Dict[str, ArchiveEntry]:
+        entries: Dict[str, ArchiveEntry] = {}
+        path = os.path.join(self.directory, _INDEX_NAME)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn write at the end of the file
+                    if record.get("deleted"):
+                        entry = entries.pop(record["session_id"], None)
+                        if entry is not None:
+                            self.dead_bytes += entry.length
+                    else:
+                        entries[record["session_id"]] = ArchiveEntry(**record)
+        return entries
+
+    def _last_segment(self) -> int:
+        segments = [
+            int(name[8:14]) for name in os.listdir(self.directory)
+            if name.startswith("segment-")
+        ] if os.path.isdir(self.directory) else []
+        return max(segments, default=1)
+
+    def write(self, records: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[ArchiveEntry]:
+        """
+        Append sessions to the active segment and the on-disk index
+
+        Blocking (compression and disk I/O); call from a worker thread. The
+        in-memory index is read on the event loop, so it is left alone here:
+        pass the returned entries to `add()` from the loop.
+
+        Args:
+            records: (session summary, full document) pairs
+
+        Returns:
+            The new index entries, in order
+        """
+        new_entries: List[ArchiveEntry] = []
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if self._active_segment is None:
+                self._active_segment = self._last_segment()
+            path = self._segment_path(self._active_segment)
+            if os.path.exists(path) and os.path.getsize(path) >= self.segment_max_bytes:
+                self._active_segment += 1
+                path = self._segment_path(self._active_segment)
+
+            with open(path, "ab") as segment:
+                offset = segment.tell()
+                for summary, document in records:
+                    payload = zlib.compress(
+                        json.dumps(document, separators=(",", ":")).encode(), self.level
+                    )
+                    segment.write(_HEADER.pack(len(payload)))
+                    segment.write(payload)
+                    new_entries.append(ArchiveEntry(
+                        session_id=summary["id"],
+                        segment=self._active_segment,
+                        offset=offset + _HEADER.size,
+                        length=len(payload),
+                        archived_at=time.time(),
+                        session=summary,
+                    ))
+                    offset += _HEADER.size + len(payload)
+                segment.flush()
+                os.fsync(segment.fileno())
+
+            # Index after the data is durable, so an entry never points at missing bytes.
+            # Queued tombstones go first: they are for entries written before these
+            with self._index_lock:
+                records = [{"session_id": session_id, "deleted": True} for session_id in self._take_tombstones()]
+                self._append_index(records + [asdict(entry) for entry in new_entries])
+        return new_entries
+
+    def add(self, new_entries: List[ArchiveEntry]) -> None:
+        """Make entries returned by `write()` visible (call from the event loop)"""
+        entries = self.entries
+        for entry in new_entries:
+            previous = entries.get(entry.session_id)
+            if previous is not None:
+                self.dead_bytes += previous.length
+            entries[entry.session_id] = entry
+
+    def _append_index(self, records: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, _INDEX_NAME), "a", encoding="utf-8") as index:
+            for record in records:
+                index.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+            index.flush()
+            os.fsync(index.fileno())
+
+    def read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Decompress an archived session's document (None if not archived)
+
+        Blocking; safe to call from worker threads.
+        """
+        entry = self.entries.get(session_id)
+        if entry is None:
+            return None
+        with self._map_lock:
+            view = self._map(entry.segment, entry.offset + entry.length)
+            data = view[entry.offset:entry.offset + entry.length]
+        return json.loads(zlib.decompress(data))
+
+    def _map(self, segment: int, needed: int) -> mmap.mmap:
+        """Memory map of a segment covering at least `needed` bytes"""
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < needed:
+            # The active segment grows; remap it to see the new records
+            if mapped is not None:
+                mapped.close()
+            f = self._files.get(segment)
+            if f is None:
+                f = self._files[segment] = open(self._segment_path(segment), "rb")
+            mapped = self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    def discard(self, session_id: str) -> None:
+        """
+        Tombstone a session (rehydrated or deleted)
+
+        Called on the event loop: the tombstone is only queued. A tombstone
+        lost in a crash means the archived copy is served again.
+        """
+        entry = self.entries.pop(session_id, None)
+        if entry is None:
+            return
+        self.dead_bytes += entry.length
+        with self._tombstone_lock:
+            self._tombstones.append(session_id)
+
+    @property
+    def pending(self) -> int:
+        """Tombstones not written to the index yet"""
+        return len(self._tombstones)
+
+    def _take_tombstones(self) -> List[str]:
+        with self._tombstone_lock:
+            tombstones, self._tombstones = self._tombstones, []
+        return tombstones
+
+    def flush(self) -> None:
+        """Write queued tombstones to the index (blocking; call from a worker thread)"""
+        with self._index_lock:
+            tombstones = self._take_tombstones()
+            if tombstones:
+                self._append_index([{"session_id": session_id, "deleted": True} for session_id in tombstones])
+
+    def stats(self) -> Dict[str, Any]:
+        live_bytes = sum(entry.length for entry in self.entries.values())
+        return {
+            "sessions": len(self.entries),
+            "segments": (self._active_segment or self._last_segment()) if self.entries or self.dead_bytes else 0,
+            "live_bytes": live_bytes,
+            "dead_bytes": self.dead_bytes,
+        }
+
+    def close(self) -> None:
+        self.flush()
+        with self._map_lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            for f in self._files.values():
+                f.close()
+            self._maps.clear()
+            self._files.clear()
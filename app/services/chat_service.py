@@ -1,9 +1,26 @@
 """Chat service - business logic for chat operations"""
 
-from typing import Optional, Dict, Any, List
-from datetime import datetime
-import uuid
+from typing import Optional, Dict, Any, List, Set, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import json
 
+from app.core.config import settings
+from app.core.context import session_id_var
+from app.services.archive import ArchiveEntry, SessionArchive, tenant_directory
+from app.services.compaction import SUMMARY_PROMPT, compaction_worker, extractive_summary
+from app.services.message_store import MessageThread
+from app.services.mcp_client import MCPClient, ToolCall, ToolResult, mcp_client
+from app.services.overload import overload
+from app.services.provider_router import ProviderRouter, provider_router
+from app.services.pubsub import EventBus, event_bus
+from app.services.quotas import QuotaExceededError, TenantQuotas
+from app.services.search_index import SearchIndex, SearchMatch, complete_match
+from app.services.semantic_cache import SemanticCache, create_semantic_cache
+from app.utils.cache import LRUCache
+from app.utils.ids import uuid7
+from app.utils.metrics import metrics
+from app.utils.tracing import traced, tracer
 from app.schemas.chat import (
     ChatResponse,
     ChatMessage,
@@ -12,15 +29,84 @@ from app.schemas.chat import (
 )
 
 
+_history_hits = metrics.counter("history_cache_hits_total", "History builds served from the warm cache")
+_history_misses = metrics.counter("history_cache_misses_total", "History builds that had to load from the store")
+_history_prefetches = metrics.counter("history_prefetch_total", "Speculative history loads started")
+_orphaned_replies = metrics.counter("chat_replies_dropped_total", "Replies not stored because their session was deleted meanwhile")
+
+
+def stored_size(content: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+    """Bytes a message counts against its tenant's memory quota (content and metadata)"""
+    size = len(content.encode())
+    if metadata:
+        size += len(json.dumps(metadata, separators=(",", ":"), default=str))
+    return size
+
+
+def with_tool_results(history: List[ChatMessage], results: List[ToolResult]) -> List[ChatMessage]:
+    """History with a turn's tool results as a system message just before its prompt"""
+    if not results:
+        return history
+    tools = ChatMessage(role=MessageRole.SYSTEM, content="\n\n".join(result.to_text() for result in results))
+    if history and history[-1].role == MessageRole.USER:
+        return [*history[:-1], tools, history[-1]]
+    return [*history, tools]
+
+
+def session_topic(session_id: str) -> str:
+    """Pub/sub topic carrying updates for one session"""
+    return f"session:{session_id}"
+
+
 class ChatService:
     """Service for handling chat operations"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        events: Optional[EventBus] = None,
+        mcp: Optional[MCPClient] = None,
+        router: Optional[ProviderRouter] = None,
+        tenant_id: Optional[str] = None,
+        quotas: Optional[TenantQuotas] = None,
+        archive: Optional[SessionArchive] = None
+    ):
+        # Owning tenant and its memory quotas (None: unlimited)
+        self.tenant_id = tenant_id or settings.default_tenant
+        self.quotas = quotas
+        self.stored_bytes = 0
+        # Bytes charged for the messages each session wrote (see stored_size)
+        self.session_bytes: Dict[str, int] = {}
+        # Deleted sessions whose messages forks still share
+        self.retired: Set[str] = set()
         # In-memory storage for demo purposes
         # Replace with actual database in production
         self.sessions: Dict[str, ChatSession] = {}
-        self.messages: Dict[str, List[ChatMessage]] = {}
+        # Forks share their parent's prefix (see app/services/message_store.py)
+        self.messages: Dict[str, MessageThread] = {}
+        # Bumped on every write to a session; used for cheap ETag validation
+        self.versions: Dict[str, int] = {}
+        # Real-time updates for WebSocket subscribers
+        self.events = events or event_bus
+        # Full-text index, maintained as messages are stored
+        self.search_index = SearchIndex()
+        # MCP tool execution
+        self.mcp = mcp or mcp_client
+        # Provider selection for generation
+        self.router = router or provider_router
+        # Recent-history windows, warmed speculatively when a session is touched
+        self.history_cache: LRUCache[List[ChatMessage]] = LRUCache(maxsize=settings.history_cache_size)
+        self._prefetching: Dict[str, asyncio.Task] = {}
+        # Replies to earlier, similar prompts of this tenant
+        self.semantic_cache: Optional[SemanticCache] = create_semantic_cache(self.tenant_id)
+        # Cold storage for idle sessions, rehydrated on access
+        if archive is None and settings.archive_enabled:
+            archive = SessionArchive(
+                tenant_directory(settings.archive_dir, self.tenant_id),
+                segment_max_bytes=settings.archive_segment_max_mb * 1024 * 1024
+            )
+        self.archive = archive
     
+    @traced("chat.process_message")
     async def process_message(
         self,
         message: str,
@@ -33,110 +119,628 @@ class ChatService:
         Args:
             message: User message
             session_id: Optional session ID
-            context: Optional additional context
+            context: Optional additional context; `context["tool_calls"]` is a
+                list of {"server", "name", "arguments"} MCP tool calls to run
+                for this turn
             
         Returns:
             ChatResponse with assistant's reply
         """
+        # The reply and tool results are charged as they are stored, so a turn
+        # may take the tenant over its quota; the next turn is then rejected
+        self._check_storage(stored_size(message, context))
+        
         # Create session if not provided
         if not session_id:
-            session_id = str(uuid.uuid4())
-            await self.create_session(metadata=context)
+            session = await self.create_session(metadata=context)
+            session_id = session.id
+        elif session_id not in self.sessions:
+            await self._rehydrate(session_id)
+        existed = session_id in self.sessions
+        session_id_var.set(session_id)
+        # Warm the history window while the rest of the turn is prepared
+        self.prefetch_history(session_id)
         
         # Store user message
         user_message = ChatMessage(
-            id=str(uuid.uuid4()),
+            id=uuid7(),
             role=MessageRole.USER,
             content=message,
             timestamp=datetime.utcnow(),
             metadata=context
         )
         
-        if session_id not in self.messages:
-            self.messages[session_id] = []
-        self.messages[session_id].append(user_message)
+        self._append_message(session_id, user_message)
+        
+        # Run MCP tool calls for this turn (independent calls run concurrently)
+        tool_results = await self._run_tools(context)
+        response_metadata = (
+            {"tool_results": [result.to_dict() for result in tool_results]}
+            if tool_results else None
+        )
         
         # Generate response (placeholder - integrate with actual AI/MCP logic)
-        response_content = await self._generate_response(message, session_id)
+        response_content = await self._generate_response(message, session_id, tool_results)
         
         # Store assistant message
         assistant_message = ChatMessage(
-            id=str(uuid.uuid4()),
+            id=uuid7(),
             role=MessageRole.ASSISTANT,
             content=response_content,
-            timestamp=datetime.utcnow()
+            timestamp=datetime.utcnow(),
+            metadata=response_metadata
         )
-        self.messages[session_id].append(assistant_message)
-        
-        # Update session
-        if session_id in self.sessions:
-            self.sessions[session_id].updated_at = datetime.utcnow()
-            self.sessions[session_id].message_count = len(self.messages[session_id])
+        if existed and session_id not in self.sessions:
+            await self._rehydrate(session_id)  # archived while generating
+        if existed and session_id not in self.sessions:
+            # Deleted while generating: storing the reply would recreate the
+            # thread with nothing left to delete it (and its bytes) again
+            _orphaned_replies.inc(tenant=self.tenant_id)
+        else:
+            self._append_message(session_id, assistant_message)
+            self._publish_session(session_id)
+            self._schedule_compaction(session_id)
         
         return ChatResponse(
             message=response_content,
             session_id=session_id,
             message_id=assistant_message.id,
-            timestamp=assistant_message.timestamp
+            timestamp=assistant_message.timestamp,
+            metadata=response_metadata
         )
     
-    async def _generate_response(self, message: str, session_id: str) -> str:
+    async def _run_tools(self, context: Optional[Dict[str, Any]]) -> List[ToolResult]:
+        """Execute the MCP tool calls requested in the message context"""
+        if not settings.mcp_enabled or not context or not context.get("tool_calls"):
+            return []
+        calls = [
+            ToolCall(
+                server=call["server"],
+                name=call["name"],
+                arguments=call.get("arguments") or {},
+                timeout=call.get("timeout")
+            )
+            for call in context["tool_calls"]
+        ]
+        return await self.mcp.call_tools(calls, tenant_id=self.tenant_id)
+    
+    def _check_storage(self, size: int) -> None:
+        """Reject a write that would take the tenant over its memory quota"""
+        limit = self.quotas.max_message_bytes if self.quotas else 0
+        if limit and self.stored_bytes + size > limit:
+            raise QuotaExceededError(self.tenant_id, "memory")
+    
+    def _append_message(self, session_id: str, message: ChatMessage) -> None:
+        """Store a message and update the session's counters and version"""
+        if session_id not in self.messages:
+            self.messages[session_id] = MessageThread()
+        self.messages[session_id].append(message)
+        size = stored_size(message.content, message.metadata)
+        self.stored_bytes += size
+        self.session_bytes[session_id] = self.session_bytes.get(session_id, 0) + size
+        self.search_index.add(session_id, message)
+        
+        window = self.history_cache.get(session_id, count=False)
+        if window is not None:
+            window.append(message)
+            del window[:-settings.history_window]
+        
+        if session_id in self.sessions:
+            self.sessions[session_id].updated_at = message.timestamp or datetime.utcnow()
+            self.sessions[session_id].message_count = len(self.messages[session_id])
+        self.versions[session_id] = self.versions.get(session_id, 0) + 1
+        
+        topic = session_topic(session_id)
+        if self.events.wants(topic):
+            self.events.publish(topic, {
+                "type": "message",
+                "session_id": session_id,
+                "message": message.model_dump(mode="json")
+            })
+    
+    def _publish_session(self, session_id: str) -> None:
+        """Publish the current session state to subscribers"""
+        topic = session_topic(session_id)
+        session = self.sessions.get(session_id)
+        if session is None:
+            return
+        if self.events.wants(topic):
+            self.events.publish(topic, {
+                "type": "session",
+                "session": session.model_dump(mode="json"),
+                "version": self.get_version(session_id)
+            })
+    
+    def get_version(self, session_id: str) -> int:
+        """Get the write version of a session (0 if never written)"""
+        return self.versions.get(session_id, 0)
+    
+    @traced("chat.generate")
+    async def _generate_response(
+        self,
+        message: str,
+        session_id: str,
+        tool_results: Optional[List[ToolResult]] = None
+    ) -> str:
         """
         Generate AI response - placeholder for actual AI integration
         
         TODO: Integrate with actual AI model or MCP
         """
         # Get conversation history
-        history = self.messages.get(session_id, [])
+        with tracer.span("chat.history", session_id=session_id):
+            history = await self.get_history(session_id)
+        
+        if self.router.has_providers():
+            if self.semantic_cache is not None and not tool_results:
+                return await self._generate_cached(message, session_id, history)
+            content, _ = await self.router.generate(message, with_tool_results(history, tool_results or []))
+            return content
         
         # Simple echo response for now - replace with actual AI logic
         return f"Echo: {message}. (This is a placeholder response. Integrate with your AI model or MCP here.)"
     
+    async def _generate_cached(self, message: str, session_id: str, history: List[ChatMessage]) -> str:
+        """
+        Generate through the semantic cache
+        
+        Only a session's opening prompt is looked up and stored: later turns
+        depend on the conversation, not just on their own text. Later turns
+        are still embedded after a hit, to catch the prompt being re-asked.
+        """
+        cache = self.semantic_cache
+        opening = len(history) <= 1
+        if not opening and not cache.recently_served(session_id):
+            content, _ = await self.router.generate(message, history)
+            return content
+        
+        vector = await cache.embed(message)
+        cache.check_reask(session_id, vector)
+        hit = cache.lookup(vector, session_id=session_id) if opening else None
+        if hit is not None and not cache.should_verify():
+            return hit.entry.reply
+        
+        content, _ = await self.router.generate(message, history)
+        if hit is not None:
+            await cache.verify(hit, content, vector)
+        elif opening:
+            cache.add(message, content, vector)
+        return content
+    
+    def _schedule_compaction(self, session_id: str) -> None:
+        """Queue the session for background compaction once it has grown long"""
+        session = self.sessions.get(session_id)
+        if not settings.compaction_enabled or session is None:
+            return
+        backlog = len(self.messages[session_id]) - session.compacted_count
+        if backlog > settings.compaction_threshold:
+            compaction_worker.schedule(self, session_id, backlog)
+    
+    @traced("chat.compact_session")
+    async def compact_session(self, session_id: str) -> bool:
+        """
+        Fold older messages into the session's summary
+        
+        Everything but the newest `compaction_keep_recent` messages gets
+        summarized, by a provider when one is configured and extractively
+        otherwise. The summary is only stored if the session was not deleted,
+        archived or compacted in the meantime.
+        
+        Returns:
+            True if the session was compacted
+        """
+        session = self.sessions.get(session_id)
+        thread = self.messages.get(session_id)
+        if session is None or thread is None:
+            return False
+        start = session.compacted_count
+        end = len(thread) - settings.compaction_keep_recent
+        if end <= start:
+            return False
+        
+        previous = session.summary
+        messages = thread[start:end]
+        if self.router.has_providers():
+            history = [ChatMessage(role=MessageRole.SYSTEM, content=previous)] if previous else []
+            summary, _ = await self.router.generate(SUMMARY_PROMPT, history + messages)
+        else:
+            summary = await asyncio.to_thread(
+                extractive_summary, previous, messages, settings.compaction_summary_chars
+            )
+        
+        if self.sessions.get(session_id) is not session or session.compacted_count != start:
+            return False
+        session.summary = summary
+        session.compacted_count = end
+        self.versions[session_id] = self.versions.get(session_id, 0) + 1
+        return True
+    
+    def prefetch_history(self, session_id: str) -> None:
+        """Start loading a session's recent history into the cache, if not warm"""
+        if session_id in self.history_cache or self._inflight_prefetch(session_id):
+            return
+        _history_prefetches.inc()
+        task = asyncio.get_running_loop().create_task(self._warm_history(session_id))
+        self._prefetching[session_id] = task
+        task.add_done_callback(
+            lambda done: self._prefetching.pop(session_id, None)
+            if self._prefetching.get(session_id) is done else None
+        )
+    
+    def _inflight_prefetch(self, session_id: str) -> Optional[asyncio.Task]:
+        """The pending prefetch for a session, if it belongs to the running loop"""
+        task = self._prefetching.get(session_id)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return None
+        return task
+    
+    async def _warm_history(self, session_id: str) -> List[ChatMessage]:
+        window = await self._load_history(session_id)
+        self.history_cache.set(session_id, window)
+        return window
+    
+    async def _load_history(self, session_id: str) -> List[ChatMessage]:
+        """Read the recent-history window from the message store"""
+        return self.messages.get(session_id, MessageThread())[-settings.history_window:]
+    
+    async def get_history(self, session_id: str) -> List[ChatMessage]:
+        """
+        Get the recent-history window for generation
+        
+        Served from the cache when warm (or from an in-flight prefetch),
+        otherwise loaded from the store. Shortened while the server is
+        overloaded. Compacted messages are replaced by the session's summary.
+        """
+        size = overload.history_window(settings.history_window)
+        window = self.history_cache.get(session_id, count=False)
+        if window is None:
+            pending = self._inflight_prefetch(session_id)
+            if pending is not None:
+                window = await asyncio.shield(pending)
+        if window is None:
+            self.history_cache.misses += 1
+            _history_misses.inc()
+            window = await self._warm_history(session_id)
+        else:
+            self.history_cache.hits += 1
+            _history_hits.inc()
+        return self._with_summary(session_id, window[-size:])
+    
+    def _with_summary(self, session_id: str, recent: List[ChatMessage]) -> List[ChatMessage]:
+        """Replace compacted messages in a history window by the session's summary"""
+        session = self.sessions.get(session_id)
+        if session is None or not session.summary:
+            return list(recent)
+        uncompacted = len(self.messages.get(session_id, ())) - session.compacted_count
+        summary = ChatMessage(role=MessageRole.SYSTEM, content=session.summary)
+        return [summary, *recent[max(0, len(recent) - uncompacted):]]
+    
+    def history_cache_stats(self) -> Dict[str, Any]:
+        """Hit rate and size of the history cache"""
+        return {
+            "size": len(self.history_cache),
+            "hits": self.history_cache.hits,
+            "misses": self.history_cache.misses,
+            "hit_rate": round(self.history_cache.hit_rate, 4),
+            "prefetching": len(self._prefetching)
+        }
+    
+    @traced("chat.create_session")
     async def create_session(
         self,
         title: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None
     ) -> ChatSession:
         """Create a new chat session"""
-        session_id = str(uuid.uuid4())
+        limit = self.quotas.max_sessions if self.quotas else 0
+        if limit and len(self.sessions) >= limit:
+            raise QuotaExceededError(self.tenant_id, "sessions")
+        session_id = uuid7()
+        now = datetime.utcnow()
         session = ChatSession(
             id=session_id,
-            title=title or f"Chat Session {session_id[:8]}",
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
+            # The leading digits of a time-ordered id are shared by nearby sessions
+            title=title or f"Chat Session {session_id[-8:]}",
+            created_at=now,
+            updated_at=now,
             message_count=0,
             metadata=metadata
         )
         self.sessions[session_id] = session
-        self.messages[session_id] = []
+        self.messages[session_id] = MessageThread()
+        self.history_cache.set(session_id, [])
+        self.versions[session_id] = 1
+        return session
+    
+    @traced("chat.fork_session")
+    async def fork_session(
+        self,
+        session_id: str,
+        at: Optional[str] = None,
+        title: Optional[str] = None
+    ) -> Optional[ChatSession]:
+        """
+        Branch a session at one of its messages
+        
+        The fork shares the parent's messages up to and including `at` (all
+        of them if omitted) without copying them, and stores only what is
+        posted to it afterwards. Shared messages are indexed and counted
+        against the quota once, and stay so until the last session sharing
+        them is deleted.
+        
+        Args:
+            session_id: Session to fork
+            at: ID of the last message to keep
+            title: Optional title for the fork
+            
+        Returns:
+            The new session, or None if the session does not exist
+            
+        Raises:
+            KeyError: If `at` is not a message of the session
+        """
+        parent = await self.get_session(session_id)
+        if parent is None:
+            return None
+        thread = self.messages.get(session_id, MessageThread())
+        if at is None:
+            length = len(thread)
+        else:
+            position = thread.position(at)
+            if position is None:
+                raise KeyError(at)
+            length = position + 1
+        
+        session = await self.create_session(
+            title=title or f"{parent.title} (fork)",
+            metadata=parent.metadata
+        )
+        session.forked_from = session_id
+        session.forked_at = at
+        session.message_count = length
+        if parent.summary and parent.compacted_count <= length:
+            session.summary = parent.summary
+            session.compacted_count = parent.compacted_count
+        self.messages[session.id] = thread.fork(length)
+        self.search_index.link(session.id, session_id, length)
+        self.history_cache.pop(session.id)
         return session
     
     async def get_session(self, session_id: str) -> Optional[ChatSession]:
-        """Get a chat session by ID"""
-        return self.sessions.get(session_id)
+        """Get a chat session by ID, rehydrating it from the archive if needed"""
+        return self.sessions.get(session_id) or await self._rehydrate(session_id)
     
+    @traced("chat.list_sessions")
     async def list_sessions(self, limit: int = 10, offset: int = 0) -> List[ChatSession]:
-        """List all chat sessions"""
-        sessions = list(self.sessions.values())
+        """List all chat sessions, including archived ones"""
+        rows: List[Tuple[datetime, Any]] = [(session.updated_at, session) for session in self.sessions.values()]
+        archive = await self._archive_loaded()
+        if archive is not None:
+            # Archived summaries are only validated for the page returned
+            rows.extend(
+                (datetime.fromisoformat(entry.session["updated_at"]), entry)
+                for entry in archive.entries.values()
+            )
         # Sort by updated_at descending
-        sessions.sort(key=lambda s: s.updated_at, reverse=True)
-        return sessions[offset:offset + limit]
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return [
+            item if isinstance(item, ChatSession) else ChatSession.model_validate(item.session)
+            for _, item in rows[offset:offset + limit]
+        ]
     
     async def delete_session(self, session_id: str) -> bool:
-        """Delete a chat session"""
+        """
+        Delete a chat session
+        
+        Messages that forks still share stay indexed and counted until the
+        last of those forks is deleted too.
+        """
+        archive = await self._archive_loaded()
+        if session_id not in self.sessions and archive is not None and session_id in archive:
+            if self.search_index.is_shared(session_id):
+                # Forks still show these messages: keep them in memory once the archive copy is gone
+                decoded = await asyncio.to_thread(self._read_archived, session_id)
+                if session_id in self.sessions:
+                    return await self.delete_session(session_id)  # rehydrated meanwhile
+                if decoded is None or session_id not in self.archive:
+                    return False  # deleted meanwhile
+                _, messages, _, size = decoded
+                self.search_index.attach(session_id, messages)
+                self.stored_bytes += size
+                self.session_bytes[session_id] = size
+            self.archive.discard(session_id)
+            self._retire(session_id)
+            return True
         if session_id in self.sessions:
             del self.sessions[session_id]
-            if session_id in self.messages:
-                del self.messages[session_id]
+            self.messages.pop(session_id, None)
+            self.versions.pop(session_id, None)
+            self.history_cache.pop(session_id)
+            self._retire(session_id)
+            topic = session_topic(session_id)
+            if self.events.wants(topic):
+                self.events.publish(topic, {"type": "session_deleted", "session_id": session_id})
             return True
         return False
     
+    @traced("chat.get_session_messages")
     async def get_session_messages(self, session_id: str) -> List[ChatMessage]:
-        """Get all messages from a session"""
-        return self.messages.get(session_id, [])
+        """Get all messages from a session, rehydrating it from the archive if needed"""
+        if session_id not in self.messages:
+            await self._rehydrate(session_id)
+        return list(self.messages.get(session_id, ()))
+    
+    @traced("chat.archive_idle_sessions")
+    async def archive_idle_sessions(self, idle_seconds: float) -> int:
+        """
+        Move sessions idle for longer than `idle_seconds` to the archive
+        
+        Compression and disk writes run in a worker thread. Sessions written
+        to (or deleted) while that happens keep their hot copy.
+        
+        Returns:
+            Number of sessions archived
+        """
+        if self.archive is None:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(seconds=idle_seconds)
+        candidates = [
+            session for session in self.sessions.values()
+            if session.updated_at < cutoff and not self.events.has_subscribers(session_topic(session.id))
+        ]
+        if not candidates:
+            if self.archive.pending:
+                await asyncio.to_thread(self.archive.flush)
+            return 0
+        
+        versions = {session.id: self.get_version(session.id) for session in candidates}
+        snapshots = [
+            (session, list(self.messages.get(session.id, ())), versions[session.id], self.session_bytes.get(session.id, 0))
+            for session in candidates
+        ]
+        self.archive.add(await asyncio.to_thread(self._write_archive, snapshots))
+        
+        archived = 0
+        for session in candidates:
+            if session.id not in self.sessions or self.get_version(session.id) != versions[session.id]:
+                self.archive.discard(session.id)
+                continue
+            self._evict(session.id)
+            archived += 1
+        return archived
+    
+    def _write_archive(self, snapshots: List[Tuple[ChatSession, List[ChatMessage], int, int]]) -> List[ArchiveEntry]:
+        """Serialize sessions and append them to the archive (blocking; worker thread)"""
+        records = []
+        for session, messages, version, size in snapshots:
+            summary = session.model_dump(mode="json")
+            records.append((summary, {
+                "session": summary,
+                "messages": [m.model_dump(mode="json") for m in messages],
+                "version": version,
+                "bytes": size,
+            }))
+        return self.archive.write(records)
+    
+    def _evict(self, session_id: str) -> None:
+        """Drop a session from the hot store (it lives on in the archive)"""
+        self.sessions.pop(session_id, None)
+        self.messages.pop(session_id, None)
+        self.stored_bytes -= self.session_bytes.pop(session_id, 0)
+        self.versions.pop(session_id, None)
+        # Stays searchable; matches are read back from the archive
+        self.search_index.detach_session(session_id)
+        self.history_cache.pop(session_id)
+    
+    def _retire(self, session_id: str) -> None:
+        """Release a deleted session's messages, unless forks still share them"""
+        self.retired.add(session_id)
+        while session_id is not None and not self.search_index.is_shared(session_id):
+            self.retired.discard(session_id)
+            self.stored_bytes -= self.session_bytes.pop(session_id, 0)
+            parent_id = self.search_index.remove_session(session_id)
+            # A deleted parent kept alive only by this fork goes with it
+            session_id = parent_id if parent_id in self.retired else None
+    
+    def _read_archived(self, session_id: str) -> Optional[Tuple[ChatSession, List[ChatMessage], int, int]]:
+        """Decode an archived session with its version and charged bytes (blocking; worker thread)"""
+        document = self.archive.read(session_id)
+        if document is None:
+            return None
+        messages = [ChatMessage.model_validate(m) for m in document["messages"]]
+        size = document.get("bytes")
+        if size is None:
+            size = sum(stored_size(m.content, m.metadata) for m in messages)
+        return ChatSession.model_validate(document["session"]), messages, document["version"], size
+    
+    async def _archive_loaded(self) -> Optional[SessionArchive]:
+        """The archive with its index read (off the event loop), or None without one"""
+        if self.archive is not None and not self.archive.loaded:
+            await asyncio.to_thread(self.archive.load)
+        return self.archive
+    
+    async def _rehydrate(self, session_id: str) -> Optional[ChatSession]:
+        """Move an archived session back into the hot store (None if not archived)"""
+        archive = await self._archive_loaded()
+        if archive is None or session_id not in archive:
+            return None
+        with tracer.span("chat.rehydrate", session_id=session_id):
+            decoded = await asyncio.to_thread(self._read_archived, session_id)
+            # Rehydrated or deleted by another request while decoding
+            if decoded is None or session_id in self.sessions or session_id not in self.archive:
+                return self.sessions.get(session_id)
+            session, messages, version, size = decoded
+            self.sessions[session_id] = session
+            self.messages[session_id] = MessageThread(messages)
+            self.versions[session_id] = version
+            self.stored_bytes += size
+            self.session_bytes[session_id] = size
+            self.search_index.attach(session_id, messages)
+            self.archive.discard(session_id)
+        return session
+    
+    def _read_archived_messages(self, wanted: Dict[str, Set[str]]) -> Dict[str, ChatMessage]:
+        """Archived messages by id, from the sessions they were indexed under (worker thread)"""
+        found: Dict[str, ChatMessage] = {}
+        for session_id, message_ids in wanted.items():
+            document = self.archive.read(session_id)
+            for data in (document or {}).get("messages", ()):
+                if data.get("id") in message_ids:
+                    found[data["id"]] = ChatMessage.model_validate(data)
+        return found
+    
+    @traced("chat.search")
+    async def search_messages(
+        self,
+        query: str,
+        session_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 10,
+        offset: int = 0
+    ) -> Tuple[int, List[SearchMatch]]:
+        """
+        Search stored messages
+        
+        Args:
+            query: Free-text query; all terms must match
+            session_id: Optional session filter
+            since: Optional lower time bound (inclusive)
+            until: Optional upper time bound (exclusive)
+            limit: Page size
+            offset: Number of results to skip
+            
+        Returns:
+            Tuple of (total matches, ranked matches for the page)
+        """
+        total, matches = self.search_index.search(
+            query,
+            session_id=session_id,
+            since=since,
+            until=until,
+            limit=limit,
+            offset=offset
+        )
+        archived = [match for match in matches if match.message is None]
+        if archived and self.archive is not None:
+            # Read each message from the archive of the session that wrote it
+            wanted: Dict[str, Set[str]] = {}
+            for match in archived:
+                doc = self.search_index.message_documents.get(match.message_id)
+                if doc is not None:
+                    wanted.setdefault(self.search_index.documents[doc].session_id, set()).add(match.message_id)
+            found = await asyncio.to_thread(self._read_archived_messages, wanted)
+            for match in archived:
+                message = found.get(match.message_id)
+                if message is None:
+                    # Rehydrated while the archive was read
+                    doc = self.search_index.message_documents.get(match.message_id)
+                    message = self.search_index.documents[doc].message if doc is not None else None
+                if message is not None:
+                    complete_match(match, message, query)
+        # A match whose session was deleted while the archive was read is dropped
+        return total, [match for match in matches if match.message is not None]
 
 
 # Create singleton instance
 chat_service = ChatService()
-
-
@@ -0,0 +1,146 @@
+"""Background compaction of long sessions
+
+When a session has more than `compaction_threshold` messages not covered by
+its summary, it is queued for compaction. The worker folds all but the
+last `compaction_keep_recent` of them into the session's running summary.
+Afterwards, generation sees the summary plus the recent messages (see
+ChatService.get_history).
+
+The worker runs one job at a time, off the request path:
+
+- sessions with the largest backlog go first;
+- jobs are rate limited by a token bucket;
+- no job starts while the overload controller reports anything but NORMAL,
+  or while more than `compaction_max_in_flight` requests are running.
+"""
+
+import asyncio
+import heapq
+import itertools
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.context import tenant_id_var
+from app.schemas.chat import ChatMessage
+from app.services.overload import overload
+from app.services.quotas import TokenBucket
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from app.services.chat_service import ChatService
+
+logger = setup_logger("compaction")
+
+_compactions = metrics.counter("compaction_jobs_total", "Session compaction jobs by result")
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation so far in a few sentences, keeping names, "
+    "facts, decisions and open questions needed to continue it."
+)
+
+
+def extractive_summary(previous: Optional[str], messages: List[ChatMessage], max_chars: int = 4000) -> str:
+    """
+    Summary without a model: the first sentence of each turn, oldest dropped first
+
+    Used when no generation provider is configured.
+    """
+    lines = previous.splitlines() if previous else []
+    for message in messages:
+        text = " ".join(message.content.split())
+        sentence = text.split(". ", 1)[0][:200]
+        if sentence:
+            lines.append(f"{message.role.value}: {sentence}")
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class CompactionWorker:
+    """Priority queue of sessions to compact, drained slowly in the background"""
+
+    def __init__(self, rate_per_s: float = 1.0, max_in_flight: int = 0, poll_interval: float = 0.5):
+        self.bucket = TokenBucket(rate_per_s, 1)
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        # (-backlog, order, service, session id); the largest backlog pops first.
+        # Re-scheduling pushes a new entry; outdated ones are skipped on pop.
+        self._queue: List[Tuple[int, int, "ChatService", str]] = []
+        self._queued: Dict[Tuple[int, str], int] = {}
+        self._order = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self.completed = 0
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def schedule(self, service: "ChatService", session_id: str, backlog: int) -> None:
+        """Queue a session for compaction, or raise its priority (its backlog)"""
+        key = (id(service), session_id)
+        if self._queued.get(key, 0) >= backlog:
+            return
+        self._queued[key] = backlog
+        heapq.heappush(self._queue, (-backlog, next(self._order), service, session_id))
+
+    def _idle(self) -> bool:
+        """Whether interactive traffic leaves room for a compaction job"""
+        return overload.level() == overload.NORMAL and overload.in_flight <= self.max_in_flight
+
+    async def run_once(self) -> bool:
+        """Compact the highest-priority session; returns False if none was queued"""
+        while self._queue:
+            priority, _, service, session_id = heapq.heappop(self._queue)
+            key = (id(service), session_id)
+            if self._queued.get(key) == -priority:
+                del self._queued[key]
+                break
+        else:
+            return False
+        token = tenant_id_var.set(service.tenant_id)
+        try:
+            compacted = await service.compact_session(session_id)
+            _compactions.inc(result="compacted" if compacted else "skipped")
+            self.completed += compacted
+        except Exception:
+            _compactions.inc(result="error")
+            logger.exception("Compaction failed", extra={"tenant": service.tenant_id, "session_id": session_id})
+        finally:
+            tenant_id_var.reset(token)
+        return True
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            if not self._queued or not self._idle():
+                await asyncio.sleep(self.poll_interval)
+                continue
+            wait = self.bucket.acquire()
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            await self.run_once()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "queued": len(self._queued),
+            "completed": self.completed,
+        }
+
+
+# Singleton instance (started in the application lifespan)
+compaction_worker = CompactionWorker(
+    rate_per_s=settings.compaction_rate_per_s,
+    max_in_flight=settings.compaction_max_in_flight,
+)
+
+metrics.gauge("compaction_queue_size", "Sessions waiting for compaction", lambda: len(compaction_worker))
@@ -0,0 +1,69 @@
+"""Local text embedders for the semantic cache
+
+`HashingEmbedder` needs no model: it hashes word unigrams and character
+trigrams into a fixed-size vector, which is enough to match reworded and
+re-punctuated FAQ questions. A model-based embedder can be plugged in
+with `SEMANTIC_CACHE_EMBEDDER=package.module:factory`, where the factory
+returns an object with `dimensions` and `embed(text) -> list of floats`.
+"""
+
+import importlib
+import math
+import zlib
+from typing import List
+
+from app.services.search_index import tokenize
+
+
+class Embedder:
+    """Maps text to a fixed-size vector; similar texts get similar vectors"""
+
+    dimensions: int = 0
+    # True when embed() is cheap enough to run on the event loop
+    inline: bool = False
+
+    def embed(self, text: str) -> List[float]:
+        raise NotImplementedError
+
+
+class HashingEmbedder(Embedder):
+    """Feature-hashed word unigrams and character trigrams, L2-normalised"""
+
+    inline = True
+
+    def __init__(self, dimensions: int = 512, trigram_weight: float = 0.5):
+        self.dimensions = dimensions
+        self.trigram_weight = trigram_weight
+
+    def _add(self, vector: List[float], feature: str, weight: float) -> None:
+        digest = zlib.crc32(feature.encode())
+        # The top bit picks the sign so colliding features tend to cancel out
+        vector[digest % self.dimensions] += -weight if digest & 0x80000000 else weight
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        tokens = tokenize(text)
+        for token in tokens:
+            self._add(vector, "w:" + token, 1.0)
+        padded = f" {' '.join(tokens)} "
+        for i in range(len(padded) - 2):
+            self._add(vector, "c:" + padded[i:i + 3], self.trigram_weight)
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+
+def load_embedder(spec: str, dimensions: int = 512) -> Embedder:
+    """
+    Create the embedder named by a setting
+
+    Args:
+        spec: "hashing", or "package.module:factory" for a custom embedder
+        dimensions: Vector size of the hashing embedder
+    """
+    if spec == "hashing":
+        return HashingEmbedder(dimensions)
+    module_name, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"Embedder must be 'hashing' or 'module:factory', got {spec!r}")
+    factory = getattr(importlib.import_module(module_name), attribute)
+    return factory()
@@ -0,0 +1,96 @@
+"""Idempotency keys - replay the original result of a retried request
+
+Results are kept in a bounded LRU with a TTL, keyed by the client's
+`Idempotency-Key`. A duplicate that arrives while the original is still
+running waits for it instead of running the operation again. The operation
+is shielded from the original caller's cancellation, so a client that
+times out and retries still gets the result of the first attempt; graceful
+shutdown waits for such operations too.
+"""
+
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from app.services.shutdown import shutdown
+from app.utils.cache import LRUCache
+from app.utils.metrics import metrics
+
+T = TypeVar("T")
+
+_replays = metrics.counter("idempotency_replays_total", "Requests answered from an earlier attempt")
+
+
+class IdempotencyConflictError(Exception):
+    """An idempotency key was reused with a different request"""
+
+
+def fingerprint(payload: str) -> str:
+    """Digest identifying the request a key was first used with"""
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Bounded, TTL'd results of idempotent operations plus in-flight tracking"""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 24 * 3600):
+        self.results: LRUCache[Tuple[str, Any]] = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[Hashable, Tuple[str, asyncio.Task]] = {}
+
+    def _pending(self, key: Hashable) -> Optional[Tuple[str, asyncio.Task]]:
+        """The in-flight attempt for a key, if it runs on the current loop"""
+        entry = self._inflight.get(key)
+        if entry is None or entry[1].done() or entry[1].get_loop() is not asyncio.get_running_loop():
+            return None
+        return entry
+
+    async def run(
+        self,
+        key: Hashable,
+        request_fingerprint: str,
+        operation: Callable[[], Awaitable[T]]
+    ) -> Tuple[T, bool]:
+        """
+        Run an operation once per key
+
+        Args:
+            key: Idempotency key (scoped by the caller)
+            request_fingerprint: Digest of the request; reusing a key with a
+                different request is an error
+            operation: Coroutine function producing the result
+
+        Returns:
+            Tuple of (result, whether it was replayed from an earlier attempt)
+
+        Raises:
+            IdempotencyConflictError: If the key was used for a different request
+        """
+        cached = self.results.get(key)
+        if cached is None:
+            pending = self._pending(key)
+            if pending is not None:
+                cached_fingerprint, task = pending
+                if cached_fingerprint != request_fingerprint:
+                    raise IdempotencyConflictError("Idempotency-Key reused with a different request")
+                result = await asyncio.shield(task)
+                _replays.inc()
+                return result, True
+        else:
+            cached_fingerprint, result = cached
+            if cached_fingerprint != request_fingerprint:
+                raise IdempotencyConflictError("Idempotency-Key reused with a different request")
+            _replays.inc()
+            return result, True
+
+        task = asyncio.ensure_future(operation())
+        shutdown.track(task)
+        self._inflight[key] = (request_fingerprint, task)
+        task.add_done_callback(lambda done: self._finish(key, request_fingerprint, done))
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: Hashable, request_fingerprint: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key, (None, None))[1] is task:
+            del self._inflight[key]
+        # Failures are not remembered; a retry runs the operation again
+        if not task.cancelled() and task.exception() is None:
+            self.results.set(key, (request_fingerprint, task.result()))
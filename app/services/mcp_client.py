@@ -0,0 +1,388 @@
+"""MCP (Model Context Protocol) client - connection pooling and tool execution
+
+Servers are reached over stdio (a spawned subprocess) or a local Unix socket,
+speaking newline-delimited JSON-RPC 2.0. Connections are opened lazily,
+kept alive in a small pool per server and multiplexed: several requests can
+be in flight on one connection.
+
+Tool schemas are fetched once per server and cached. Tool calls within a turn
+run concurrently, each with its own timeout, and results of idempotent tools
+(declared in settings or via the tool's `idempotentHint`/`readOnlyHint`
+annotations) are memoized per tenant.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.core.config import MCPServerSettings, settings
+from app.utils.cache import LRUCache
+from app.utils.logger import setup_logger
+from app.utils.tracing import tracer
+
+logger = setup_logger("mcp")
+
+PROTOCOL_VERSION = "2024-11-05"
+
+# Tool results can be large; raise asyncio's default 64 KiB line limit
+_STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class MCPError(Exception):
+    """Error returned by an MCP server or raised by the transport"""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass
+class ToolCall:
+    """A tool invocation requested within a chat turn"""
+    server: str
+    name: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+    timeout: Optional[float] = None
+
+
+@dataclass
+class ToolResult:
+    """Outcome of a tool invocation"""
+    server: str
+    name: str
+    content: List[Dict[str, Any]] = field(default_factory=list)
+    is_error: bool = False
+    error: Optional[str] = None
+    cached: bool = False
+    duration_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "server": self.server,
+            "name": self.name,
+            "content": self.content,
+            "is_error": self.is_error,
+            "error": self.error,
+            "cached": self.cached,
+            "duration_ms": round(self.duration_ms, 3),
+        }
+
+    def to_text(self) -> str:
+        """The result as text for a model's context (non-text content as JSON)"""
+        if self.error:
+            return f"Tool {self.server}/{self.name} failed: {self.error}"
+        parts = [
+            item["text"] if item.get("type") == "text" else json.dumps(item, separators=(",", ":"))
+            for item in self.content
+        ]
+        status = "returned an error" if self.is_error else "returned"
+        return f"Tool {self.server}/{self.name} {status}:\n" + "\n".join(parts)
+
+
+class MCPConnection:
+    """One JSON-RPC session with an MCP server"""
+
+    def __init__(self, config: MCPServerSettings):
+        self.config = config
+        self.in_flight = 0
+        self.server_info: Dict[str, Any] = {}
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._write_lock = asyncio.Lock()
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    async def connect(self, timeout: float) -> None:
+        """Open the transport and perform the MCP initialize handshake"""
+        if self.config.command:
+            self._process = await asyncio.create_subprocess_exec(
+                *self.config.command,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                env={**os.environ, **self.config.env},
+                limit=_STREAM_LIMIT,
+            )
+            self._reader, self._writer = self._process.stdout, self._process.stdin
+        elif self.config.socket_path:
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                self.config.socket_path, limit=_STREAM_LIMIT
+            )
+        else:
+            raise MCPError(f"MCP server '{self.config.name}' has no command or socket_path")
+
+        self._read_task = asyncio.create_task(self._read_loop())
+        try:
+            result = await self.request("initialize", {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": settings.app_name, "version": settings.app_version},
+            }, timeout=timeout)
+            self.server_info = result.get("serverInfo", {})
+            await self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+        except BaseException:
+            # Not pooled: stop the server process and close the transport here
+            await self.close()
+            raise
+
+    async def request(
+        self,
+        method: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """Send a request and wait for its response"""
+        if self._closed:
+            raise MCPError(f"Connection to '{self.config.name}' is closed")
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.in_flight += 1
+        try:
+            message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+            if params is not None:
+                message["params"] = params
+            await self._send(message)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # Let the server stop working on it; ignore send failures
+            try:
+                await self._send({
+                    "jsonrpc": "2.0",
+                    "method": "notifications/cancelled",
+                    "params": {"requestId": request_id, "reason": "timeout"},
+                })
+            except Exception:
+                pass
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+            self.in_flight -= 1
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        data = (json.dumps(message, separators=(",", ":")) + "\n").encode()
+        async with self._write_lock:
+            self._writer.write(data)
+            await self._writer.drain()
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    logger.warning("Invalid JSON from MCP server", extra={"server": self.config.name})
+                    continue
+                future = self._pending.get(message.get("id")) if "id" in message else None
+                if future is None or future.done():
+                    continue  # server notifications and late responses
+                if "error" in message:
+                    error = message["error"] or {}
+                    future.set_exception(MCPError(error.get("message", "MCP error"), error.get("code")))
+                else:
+                    future.set_result(message.get("result", {}))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._closed = True
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(MCPError(f"Connection to '{self.config.name}' lost"))
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._writer is not None:
+            self._writer.close()
+        if self._read_task is not None:
+            self._read_task.cancel()
+        if self._process is not None and self._process.returncode is None:
+            self._process.terminate()
+            try:
+                await asyncio.wait_for(self._process.wait(), timeout=2)
+            except asyncio.TimeoutError:
+                self._process.kill()
+
+
+class MCPServerPool:
+    """Persistent connections and cached tool schemas for one MCP server"""
+
+    def __init__(self, config: MCPServerSettings, size: int, connect_timeout: float):
+        self.config = config
+        self.size = max(1, size)
+        self.connect_timeout = connect_timeout
+        self.connections: List[MCPConnection] = []
+        self.tools: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = asyncio.Lock()
+        self._tools_lock = asyncio.Lock()
+
+    async def acquire(self) -> MCPConnection:
+        """Pick the least busy live connection, opening a new one while below pool size"""
+        self.connections = [c for c in self.connections if not c.closed]
+        idle = [c for c in self.connections if c.in_flight == 0]
+        if idle:
+            return idle[0]
+        if len(self.connections) < self.size:
+            async with self._lock:
+                if len(self.connections) < self.size:
+                    connection = MCPConnection(self.config)
+                    await connection.connect(self.connect_timeout)
+                    self.connections.append(connection)
+                    return connection
+        return min(self.connections, key=lambda c: c.in_flight)
+
+    async def list_tools(self) -> Dict[str, Dict[str, Any]]:
+        """Tool schemas by name, fetched once per server"""
+        if self.tools is not None:
+            return self.tools
+        async with self._tools_lock:
+            if self.tools is None:
+                connection = await self.acquire()
+                tools: Dict[str, Dict[str, Any]] = {}
+                cursor = None
+                while True:
+                    result = await connection.request(
+                        "tools/list",
+                        {"cursor": cursor} if cursor else {},
+                        timeout=self.connect_timeout
+                    )
+                    for tool in result.get("tools", []):
+                        tools[tool["name"]] = tool
+                    cursor = result.get("nextCursor")
+                    if not cursor:
+                        break
+                self.tools = tools
+        return self.tools
+
+    def is_idempotent(self, name: str) -> bool:
+        if name in self.config.idempotent_tools:
+            return True
+        annotations = (self.tools or {}).get(name, {}).get("annotations") or {}
+        return bool(annotations.get("idempotentHint") or annotations.get("readOnlyHint"))
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        connection = await self.acquire()
+        return await connection.request(
+            "tools/call", {"name": name, "arguments": arguments}, timeout=timeout
+        )
+
+    async def close(self) -> None:
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
+
+
+class MCPClient:
+    """Entry point for listing and calling tools across configured MCP servers"""
+
+    def __init__(
+        self,
+        servers: Optional[List[MCPServerSettings]] = None,
+        pool_size: int = 2,
+        tool_timeout: float = 30.0,
+        cache_size: int = 1024,
+        cache_ttl: float = 300.0,
+    ):
+        self.tool_timeout = tool_timeout
+        self.pools: Dict[str, MCPServerPool] = {
+            server.name: MCPServerPool(server, pool_size, connect_timeout=tool_timeout)
+            for server in servers or []
+        }
+        self.results: LRUCache[Dict[str, Any]] = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def _pool(self, server: str) -> MCPServerPool:
+        pool = self.pools.get(server)
+        if pool is None:
+            raise MCPError(f"Unknown MCP server '{server}'")
+        return pool
+
+    async def list_tools(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Cached tool schemas for every configured server"""
+        schemas = await asyncio.gather(*(pool.list_tools() for pool in self.pools.values()))
+        return {name: list(tools.values()) for name, tools in zip(self.pools, schemas)}
+
+    async def call_tools(self, calls: List[ToolCall], tenant_id: Optional[str] = None) -> List[ToolResult]:
+        """
+        Execute independent tool calls concurrently
+
+        Args:
+            calls: Tool calls from one chat turn
+            tenant_id: Tenant the calls are made for (memoized results are not shared across tenants)
+
+        Returns:
+            One result per call, in order; failures and timeouts are reported
+            in the result rather than raised
+        """
+        return list(await asyncio.gather(*(self.call_tool(call, tenant_id) for call in calls)))
+
+    async def call_tool(self, call: ToolCall, tenant_id: Optional[str] = None) -> ToolResult:
+        """Execute one tool call, serving idempotent tools from the memo cache"""
+        start = time.perf_counter()
+        result = ToolResult(server=call.server, name=call.name)
+        with tracer.span("mcp.call_tool", server=call.server, tool=call.name):
+            try:
+                pool = self._pool(call.server)
+                await pool.list_tools()
+                if call.name not in pool.tools:
+                    raise MCPError(f"Unknown tool '{call.name}' on server '{call.server}'")
+
+                cache_key = None
+                if pool.is_idempotent(call.name):
+                    cache_key = (
+                        tenant_id or settings.default_tenant,
+                        call.server,
+                        call.name,
+                        json.dumps(call.arguments, sort_keys=True, default=str),
+                    )
+                    cached = self.results.get(cache_key)
+                    if cached is not None:
+                        result.content = cached["content"]
+                        result.cached = True
+                        return result
+
+                # A caller may ask for less time than configured, never more
+                timeout = pool.config.tool_timeouts.get(call.name, self.tool_timeout)
+                if call.timeout:
+                    timeout = min(call.timeout, timeout)
+                response = await pool.call_tool(call.name, call.arguments, timeout)
+                result.content = response.get("content", [])
+                result.is_error = bool(response.get("isError"))
+                if cache_key is not None and not result.is_error:
+                    self.results.set(cache_key, response)
+            except asyncio.TimeoutError:
+                result.is_error = True
+                result.error = "timeout"
+            except (MCPError, OSError) as e:
+                result.is_error = True
+                result.error = str(e)
+            finally:
+                result.duration_ms = (time.perf_counter() - start) * 1000
+        return result
+
+    async def close(self) -> None:
+        """Close all pooled connections"""
+        for pool in self.pools.values():
+            await pool.close()
+
+
+# Singleton instance
+mcp_client = MCPClient(
+    servers=settings.mcp_servers,
+    pool_size=settings.mcp_pool_size,
+    tool_timeout=settings.mcp_tool_timeout,
+    cache_size=settings.mcp_result_cache_size,
+    cache_ttl=settings.mcp_result_cache_ttl,
+)
@@ -0,0 +1,109 @@
+"""Append-only message threads with structural sharing
+
+A forked session does not copy its parent's messages. Its thread points at
+the parent thread plus the length of the shared prefix, and holds only the
+messages appended after the fork. Threads are append-only, so later
+appends to the parent stay outside the prefix and are never seen by the
+fork. Forking is O(1), and the prefix is stored once however many
+branches share it.
+"""
+
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union, overload
+
+from app.schemas.chat import ChatMessage
+
+# Forks deeper than this get a flat copy of their prefix, bounding lookups
+MAX_FORK_DEPTH = 32
+
+
+class MessageThread(Sequence[ChatMessage]):
+    """The messages of one session: a prefix shared with a parent plus its own tail"""
+
+    __slots__ = ("_parent", "_shared", "_tail", "_positions", "depth")
+
+    def __init__(
+        self,
+        messages: Iterable[ChatMessage] = (),
+        parent: Optional["MessageThread"] = None,
+        shared: int = 0
+    ):
+        self._parent = parent
+        self._shared = shared if parent is not None else 0
+        self._tail: List[ChatMessage] = []
+        # Message id -> index in the tail, for locating fork points
+        self._positions: Dict[str, int] = {}
+        self.depth = parent.depth + 1 if parent is not None else 0
+        for message in messages:
+            self.append(message)
+
+    def __len__(self) -> int:
+        return self._shared + len(self._tail)
+
+    @overload
+    def __getitem__(self, index: int) -> ChatMessage: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[ChatMessage]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[ChatMessage, List[ChatMessage]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message index out of range")
+        thread = self
+        while index < thread._shared:
+            thread = thread._parent
+        return thread._tail[index - thread._shared]
+
+    def __iter__(self) -> Iterator[ChatMessage]:
+        for tail, count in self._segments():
+            yield from islice(tail, count)
+
+    def _segments(self) -> List[Tuple[List[ChatMessage], int]]:
+        """(tail, number of its messages visible here) from the root down"""
+        segments = []
+        thread, limit = self, len(self)
+        while thread is not None:
+            segments.append((thread._tail, limit - thread._shared))
+            limit = thread._shared
+            thread = thread._parent
+        segments.reverse()
+        return segments
+
+    @property
+    def own(self) -> List[ChatMessage]:
+        """Messages stored by this thread (not shared with a parent)"""
+        return self._tail
+
+    def append(self, message: ChatMessage) -> None:
+        if message.id is not None:
+            self._positions[message.id] = len(self._tail)
+        self._tail.append(message)
+
+    def position(self, message_id: str) -> Optional[int]:
+        """Index of a message in this thread, or None"""
+        thread, limit = self, len(self)
+        while thread is not None:
+            index = thread._positions.get(message_id)
+            if index is not None and thread._shared + index < limit:
+                return thread._shared + index
+            limit = min(limit, thread._shared)
+            thread = thread._parent
+        return None
+
+    def fork(self, length: int) -> "MessageThread":
+        """A new thread sharing the first `length` messages of this one"""
+        if not 0 <= length <= len(self):
+            raise IndexError("fork point out of range")
+        # Share with the thread that owns the last prefix message directly
+        parent = self
+        while parent._parent is not None and length <= parent._shared:
+            parent = parent._parent
+        if length == 0:
+            return MessageThread()
+        if parent.depth + 1 > MAX_FORK_DEPTH:
+            return MessageThread(self[:length])
+        return MessageThread(parent=parent, shared=length)
@@ -0,0 +1,169 @@
+"""Adaptive overload protection
+
+The controller combines three signals into a single pressure value:
+
+- event-loop lag, as sampled by the loop monitor's heartbeat;
+- requests in flight, admitted by OverloadMiddleware up to a limit;
+- admission queue wait of requests that arrived while at that limit.
+
+Each signal is divided by its threshold; the largest ratio is the pressure.
+Above `overload_degrade_ratio` the service is DEGRADED (shorter history
+windows, stale cached reads); at 1.0 or more it is SHEDDING (low-priority
+reads without a cached answer get 503 and readiness fails).
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from app.core.config import settings
+from app.utils.loop_monitor import LoopMonitor, loop_monitor
+from app.utils.metrics import metrics
+
+
+class OverloadController:
+    """Tracks load signals and decides the degradation level"""
+
+    NORMAL = "normal"
+    DEGRADED = "degraded"
+    SHEDDING = "shedding"
+
+    def __init__(
+        self,
+        max_in_flight: int = 256,
+        queue_timeout: float = 1.0,
+        lag_threshold_ms: float = 100.0,
+        queue_threshold_ms: float = 200.0,
+        degrade_ratio: float = 0.7,
+        alpha: float = 0.1,
+        monitor: Optional[LoopMonitor] = None
+    ):
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.lag_threshold_ms = lag_threshold_ms
+        self.queue_threshold_ms = queue_threshold_ms
+        self.degrade_ratio = degrade_ratio
+        self.alpha = alpha  # EWMA weight of each lag sample
+        self.monitor = monitor or loop_monitor
+        self.in_flight = 0
+        self.loop_lag_ms = 0.0  # EWMA
+        self.queue_wait_ms = 0.0  # EWMA
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def pressure(self) -> float:
+        """Load relative to the thresholds; 1.0 means at capacity"""
+        return max(
+            self.loop_lag_ms / self.lag_threshold_ms,
+            self.queue_wait_ms / self.queue_threshold_ms,
+            self.in_flight / self.max_in_flight,
+        )
+
+    def level(self) -> str:
+        pressure = self.pressure()
+        if pressure >= 1.0:
+            return self.SHEDDING
+        if pressure >= self.degrade_ratio:
+            return self.DEGRADED
+        return self.NORMAL
+
+    def history_window(self, default: int) -> int:
+        """History messages to use for generation at the current level"""
+        if self.level() == self.NORMAL:
+            return default
+        return min(default, settings.overload_degraded_history_window)
+
+    async def start(self) -> None:
+        """Follow the loop monitor's lag samples (the monitor is started by the lifespan)"""
+        self.monitor.subscribe(self.observe_lag)
+
+    async def stop(self) -> None:
+        self.monitor.unsubscribe(self.observe_lag)
+
+    def observe_lag(self, lag_ms: float) -> None:
+        """Fold one event-loop lag sample into the smoothed signals"""
+        self.loop_lag_ms += self.alpha * (lag_ms - self.loop_lag_ms)
+        if not self._waiters:
+            # Nobody is queueing; let the queue-wait signal decay
+            self.queue_wait_ms *= 1 - self.alpha
+
+    def _record_wait(self, wait_ms: float) -> None:
+        self.queue_wait_ms += self.alpha * (wait_ms - self.queue_wait_ms)
+
+    async def acquire(self) -> bool:
+        """
+        Admit a request, queueing it for up to `queue_timeout` when at the limit
+
+        Returns:
+            True if admitted (call `release()` when done), False if it timed out
+        """
+        while self._waiters and self._stale(self._waiters[0]):
+            self._waiters.popleft()
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._record_wait(0.0)
+            return True
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        start = loop.time()
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot was handed to us; pass it on
+            raise
+        finally:
+            self._record_wait((loop.time() - start) * 1000)
+            if not waiter.done():
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        return not waiter.cancelled()
+
+    def release(self) -> None:
+        """Free a slot, handing it directly to the oldest live waiter"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if self._stale(waiter):
+                continue
+            waiter.get_loop().call_soon_threadsafe(self._hand_off, waiter)
+            return
+        self.in_flight -= 1
+
+    @staticmethod
+    def _stale(waiter: asyncio.Future) -> bool:
+        return waiter.done() or waiter.get_loop().is_closed()
+
+    def _hand_off(self, waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            waiter.set_result(None)
+        else:
+            # Timed out in the meantime; the slot goes to the next waiter
+            self.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "level": self.level(),
+            "pressure": round(self.pressure(), 3),
+            "event_loop_lag_ms": round(self.loop_lag_ms, 3),
+            "queue_wait_ms": round(self.queue_wait_ms, 3),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+        }
+
+
+# Singleton instance
+overload = OverloadController(
+    max_in_flight=settings.overload_max_in_flight,
+    queue_timeout=settings.overload_queue_timeout_ms / 1000,
+    lag_threshold_ms=settings.overload_lag_threshold_ms,
+    queue_threshold_ms=settings.overload_queue_threshold_ms,
+    degrade_ratio=settings.overload_degrade_ratio,
+)
+
+metrics.gauge("overload_queue_wait_ms", "Smoothed admission queue wait", lambda: overload.queue_wait_ms)
+metrics.gauge("overload_in_flight", "Requests admitted and not yet finished", lambda: overload.in_flight)
+metrics.gauge("overload_pressure", "Load relative to capacity (>= 1 sheds)", lambda: overload.pressure())
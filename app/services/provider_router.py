@@ -0,0 +1,339 @@
+"""Latency-aware routing across generation providers
+
+Each registered provider (one per APIKey name, e.g. "openai") tracks an
+exponentially weighted moving average (EWMA) of its latency and error rate.
+Requests go to the fastest healthy provider; if it has not answered by its
+own p95 latency a single hedged request is fired at the next best one and
+the first success wins. Providers that keep failing trip a circuit breaker
+and are skipped until a cool-down has passed.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.context import tenant_id_var
+from app.schemas.chat import ChatMessage
+from app.utils.cache import LRUCache
+from app.utils.logger import setup_logger
+from app.utils.tracing import tracer
+
+logger = setup_logger("provider_router")
+
+KeyResolver = Callable[[str], Awaitable[Optional[str]]]
+
+
+class ProviderError(Exception):
+    """Raised when no provider could produce a response"""
+
+
+class Provider:
+    """Base class for generation backends"""
+
+    name: str = "provider"
+
+    async def generate(
+        self,
+        message: str,
+        history: List[ChatMessage],
+        api_key: Optional[str] = None
+    ) -> str:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release pooled connections"""
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures; half-open trial after a cool-down"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            return True
+        return False
+
+    def on_start(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = True
+
+    def on_cancel(self) -> None:
+        self._trial_in_flight = False
+
+    def on_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def on_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class Backend:
+    """A provider together with its health statistics"""
+
+    def __init__(self, provider: Provider, alpha: float, breaker: CircuitBreaker):
+        self.provider = provider
+        self.alpha = alpha
+        self.breaker = breaker
+        self.ewma_latency: Optional[float] = None  # seconds
+        self.ewma_error_rate = 0.0
+        self.requests = 0
+        self.latencies: Deque[float] = deque(maxlen=200)
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+    def record_success(self, latency: float) -> None:
+        self.requests += 1
+        self.latencies.append(latency)
+        self.ewma_latency = latency if self.ewma_latency is None else (
+            self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+        )
+        self.ewma_error_rate *= 1 - self.alpha
+        self.breaker.on_success()
+
+    def record_failure(self) -> None:
+        self.requests += 1
+        self.ewma_error_rate = self.alpha + (1 - self.alpha) * self.ewma_error_rate
+        self.breaker.on_failure()
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < 5:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def score(self) -> float:
+        """Expected cost of sending a request here; lower is better"""
+        if self.ewma_latency is None:
+            return 0.0  # untried backends are explored first
+        return self.ewma_latency * (1 + 4 * self.ewma_error_rate)
+
+    def snapshot(self) -> Dict[str, object]:
+        p95 = self.p95()
+        return {
+            "name": self.name,
+            "state": self.breaker.state,
+            "requests": self.requests,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 3) if self.ewma_latency is not None else None,
+            "p95_latency_ms": round(p95 * 1000, 3) if p95 is not None else None,
+            "ewma_error_rate": round(self.ewma_error_rate, 4),
+        }
+
+
+class ProviderRouter:
+    """Pick a provider per request, hedge slow requests and fail over on errors"""
+
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        hedge_min_delay: float = 0.05,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        key_resolver: Optional[KeyResolver] = None
+    ):
+        self.alpha = alpha
+        self.hedge_min_delay = hedge_min_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.key_resolver = key_resolver
+        self.backends: Dict[str, Backend] = {}
+        self.hedged_requests = 0
+
+    def register(self, provider: Provider) -> None:
+        self.backends[provider.name] = Backend(
+            provider,
+            alpha=self.alpha,
+            breaker=CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        )
+
+    def unregister(self, name: str) -> None:
+        self.backends.pop(name, None)
+
+    async def close(self) -> None:
+        """Close and unregister all providers"""
+        backends, self.backends = self.backends, {}
+        for backend in backends.values():
+            await backend.provider.close()
+
+    def has_providers(self) -> bool:
+        return bool(self.backends)
+
+    def ranked(self) -> List[Backend]:
+        """Healthy backends, best first"""
+        healthy = [b for b in self.backends.values() if b.breaker.allow()]
+        return sorted(healthy, key=lambda b: b.score())
+
+    def _hedge_delay(self, backend: Backend) -> Optional[float]:
+        """How long to wait for a backend before hedging (None: don't hedge yet)"""
+        p95 = backend.p95()
+        if p95 is None:
+            if backend.ewma_latency is None:
+                return None
+            # Too few samples for a percentile; only hedge well past the average
+            p95 = 3 * backend.ewma_latency
+        return max(self.hedge_min_delay, p95)
+
+    async def generate(self, message: str, history: List[ChatMessage]) -> Tuple[str, str]:
+        """
+        Generate a response on the best available provider
+
+        Args:
+            message: User message
+            history: Conversation history
+
+        Returns:
+            Tuple of (response text, name of the provider that answered)
+
+        Raises:
+            ProviderError: If every candidate failed or none is healthy
+        """
+        candidates = self.ranked()
+        if not candidates:
+            raise ProviderError("No healthy provider available")
+
+        pending: Dict[asyncio.Task, Backend] = {}
+        last_error: Optional[BaseException] = None
+        hedged = False
+
+        def launch() -> Backend:
+            backend = candidates.pop(0)
+            backend.breaker.on_start()
+            task = asyncio.create_task(self._call(backend, message, history))
+            pending[task] = backend
+            return backend
+
+        current = launch()
+        started = time.perf_counter()
+        try:
+            while pending:
+                # Hedge at most once, only while the first attempt is still running
+                timeout = self._hedge_delay(current) if candidates and not hedged else None
+                if timeout is not None:
+                    timeout = max(0.0, timeout - (time.perf_counter() - started))
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    self.hedged_requests += 1
+                    current = launch()
+                    continue
+
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result(), backend.name
+                    last_error = task.exception()
+                    logger.warning(
+                        "Provider failed",
+                        extra={"provider": backend.name, "error": repr(last_error)}
+                    )
+
+                # Fail over to the next candidate once nothing is in flight
+                if not pending and candidates:
+                    current = launch()
+                    started = time.perf_counter()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise ProviderError("All providers failed") from last_error
+
+    async def _call(self, backend: Backend, message: str, history: List[ChatMessage]) -> str:
+        start = time.perf_counter()
+        with tracer.span("provider.generate", provider=backend.name):
+            try:
+                api_key = await self.key_resolver(backend.name) if self.key_resolver else None
+                result = await backend.provider.generate(message, history, api_key)
+            except asyncio.CancelledError:
+                # Lost a hedge race; says nothing about the provider's health
+                backend.breaker.on_cancel()
+                raise
+            except Exception:
+                backend.record_failure()
+                raise
+        backend.record_success(time.perf_counter() - start)
+        return result
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "hedged_requests": self.hedged_requests,
+            "providers": [backend.snapshot() for backend in self.backends.values()],
+        }
+
+
+class CachedKeyResolver:
+    """
+    Resolve decrypted provider keys from the APIKey table, caching them briefly
+
+    Keys are looked up for the tenant of the current request, on its shard.
+    Writes through api_key_service invalidate the entry in this process;
+    other workers see the change within `ttl`.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.cache: LRUCache[Optional[str]] = LRUCache(maxsize=1024, ttl=ttl)
+        self._invalidations = 0
+
+    async def __call__(self, name: str) -> Optional[str]:
+        cache_key = (tenant_id_var.get() or settings.default_tenant, name)
+        if cache_key in self.cache:
+            return self.cache.get(cache_key)
+        invalidations = self._invalidations
+        # Sync SQLAlchemy and Fernet; keep them off the event loop
+        key = await asyncio.to_thread(self._load, *cache_key)
+        # A key changed while loading may have been read before the change
+        if invalidations == self._invalidations:
+            self.cache.set(cache_key, key)
+        return key
+
+    def invalidate(self, tenant_id: str, name: str) -> None:
+        """Forget a cached key after it was updated, deactivated or deleted"""
+        self._invalidations += 1
+        self.cache.pop((tenant_id, name))
+
+    @staticmethod
+    def _load(tenant_id: str, name: str) -> Optional[str]:
+        from app.db import get_session_factory, shard_for_tenant
+        from app.services.api_key_service import api_key_service
+
+        db = get_session_factory(shard_for_tenant(tenant_id))()
+        try:
+            return api_key_service.get_decrypted_key(db, name, tenant_id)
+        finally:
+            db.close()
+
+
+# Singleton instance (providers from PROVIDERS are registered in the application lifespan)
+provider_router = ProviderRouter(
+    alpha=settings.router_ewma_alpha,
+    hedge_min_delay=settings.router_hedge_min_ms / 1000,
+    failure_threshold=settings.router_breaker_failures,
+    reset_timeout=settings.router_breaker_reset_s,
+    key_resolver=CachedKeyResolver()
+)
@@ -0,0 +1,114 @@
+"""HTTP generation providers built from the PROVIDERS setting
+
+Each configured provider is registered with the provider router at startup.
+The API key is the tenant's stored key of the same name (see
+CachedKeyResolver), falling back to the key in the provider's settings.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.core.config import ProviderSettings, settings
+from app.schemas.chat import ChatMessage, MessageRole
+from app.services.provider_router import Provider, ProviderError, ProviderRouter
+
+_DEFAULT_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "anthropic": "https://api.anthropic.com/v1",
+}
+
+ANTHROPIC_VERSION = "2023-06-01"
+
+
+def _conversation(message: str, history: List[ChatMessage]) -> List[ChatMessage]:
+    """History plus the prompt, unless the history already ends with it"""
+    if history and history[-1].role == MessageRole.USER and history[-1].content == message:
+        return list(history)
+    return [*history, ChatMessage(role=MessageRole.USER, content=message)]
+
+
+class HTTPProvider(Provider):
+    """Provider calling a vendor HTTP API over a pooled client"""
+
+    def __init__(self, config: ProviderSettings):
+        self.name = config.name
+        self.config = config
+        self.client = httpx.AsyncClient(
+            base_url=config.base_url or _DEFAULT_URLS[config.kind],
+            timeout=config.timeout,
+        )
+
+    def _key(self, api_key: Optional[str]) -> str:
+        key = api_key or self.config.api_key
+        if not key:
+            raise ProviderError(f"No API key stored for provider {self.name!r}")
+        return key
+
+    async def _post(self, path: str, headers: Dict[str, str], body: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self.client.post(path, headers=headers, json=body)
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class OpenAIProvider(HTTPProvider):
+    """OpenAI-compatible chat completions API"""
+
+    async def generate(self, message: str, history: List[ChatMessage], api_key: Optional[str] = None) -> str:
+        data = await self._post(
+            "/chat/completions",
+            {"Authorization": f"Bearer {self._key(api_key)}"},
+            {
+                "model": self.config.model,
+                "max_tokens": self.config.max_tokens,
+                "messages": [
+                    {"role": item.role.value, "content": item.content}
+                    for item in _conversation(message, history)
+                ],
+            },
+        )
+        return data["choices"][0]["message"]["content"]
+
+
+class AnthropicProvider(HTTPProvider):
+    """Anthropic messages API; system messages go to the `system` parameter"""
+
+    async def generate(self, message: str, history: List[ChatMessage], api_key: Optional[str] = None) -> str:
+        conversation = _conversation(message, history)
+        body: Dict[str, Any] = {
+            "model": self.config.model,
+            "max_tokens": self.config.max_tokens,
+            "messages": [
+                {"role": item.role.value, "content": item.content}
+                for item in conversation if item.role != MessageRole.SYSTEM
+            ],
+        }
+        system = "\n\n".join(item.content for item in conversation if item.role == MessageRole.SYSTEM)
+        if system:
+            body["system"] = system
+        data = await self._post(
+            "/messages",
+            {"x-api-key": self._key(api_key), "anthropic-version": ANTHROPIC_VERSION},
+            body,
+        )
+        return "".join(block.get("text", "") for block in data["content"] if block.get("type") == "text")
+
+
+_KINDS = {"openai": OpenAIProvider, "anthropic": AnthropicProvider}
+
+
+def build_provider(config: ProviderSettings) -> HTTPProvider:
+    if config.kind not in _KINDS:
+        raise ValueError(f"Unknown provider kind {config.kind!r} for {config.name!r}")
+    return _KINDS[config.kind](config)
+
+
+def register_providers(router: ProviderRouter, configs: Optional[List[ProviderSettings]] = None) -> List[str]:
+    """Register the configured providers; returns their names"""
+    configs = settings.providers if configs is None else configs
+    for config in configs:
+        router.register(build_provider(config))
+    return [config.name for config in configs]
@@ -0,0 +1,280 @@
+"""In-process publish/subscribe for real-time session updates
+
+Each subscriber gets a bounded queue. Publishing never waits on subscribers:
+a subscriber whose queue is full is dropped and its iterator raises
+SlowConsumerError, so one slow client cannot hold back the others or grow
+memory without bound.
+
+With a broker backend configured (e.g. Redis), events are published to the
+broker and fanned out locally when they come back, so subscribers connected
+to any worker receive them.
+"""
+
+import asyncio
+import json
+from typing import Any, Callable, Dict, Optional, Set
+
+from app.core.config import settings
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+logger = setup_logger("pubsub")
+
+_reconnects = metrics.counter("pubsub_broker_reconnects_total", "Broker subscriptions lost and retried")
+
+Event = Dict[str, Any]
+
+_CLOSED = object()
+_DROPPED = object()
+
+
+class SlowConsumerError(Exception):
+    """Raised to a subscriber that fell too far behind and was dropped"""
+
+
+class Subscription:
+    """A bounded stream of events for one topic"""
+
+    def __init__(self, bus: "EventBus", topic: str, maxsize: int):
+        self.bus = bus
+        self.topic = topic
+        self.dropped = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize + 1)  # +1 for the sentinel
+        self._maxsize = maxsize
+        self._loop = asyncio.get_running_loop()
+        self._closed = False
+
+    def deliver(self, event: Event) -> None:
+        """Queue an event, safe to call from any thread or event loop"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(event)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: Event) -> None:
+        if self._closed:
+            return
+        if self._queue.qsize() >= self._maxsize:
+            # Slow consumer: drop it rather than block or buffer unboundedly
+            self.dropped = True
+            self._terminate(_DROPPED)
+            logger.warning("Dropped slow subscriber", extra={"topic": self.topic})
+            return
+        self._queue.put_nowait(event)
+
+    def _terminate(self, sentinel: object) -> None:
+        self._closed = True
+        self.bus.unsubscribe(self)
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(sentinel)
+
+    def close(self) -> None:
+        """Stop the subscription; pending iteration ends cleanly"""
+        if self._loop.is_closed():
+            self._closed = True
+            self.bus.unsubscribe(self)
+        elif not self._closed:
+            self._loop.call_soon_threadsafe(self._terminate, _CLOSED)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Event:
+        item = await self._queue.get()
+        if item is _CLOSED:
+            raise StopAsyncIteration
+        if item is _DROPPED:
+            raise SlowConsumerError(self.topic)
+        return item
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._closed = True
+        self.bus.unsubscribe(self)
+
+
+class BrokerBackend:
+    """Base class for cross-worker broker backends"""
+
+    async def start(self, on_event: Callable[[str, Event], None]) -> None:
+        """Connect and start delivering broker events to `on_event`"""
+        raise NotImplementedError
+
+    async def publish(self, topic: str, event: Event) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        raise NotImplementedError
+
+
+class RedisBackend(BrokerBackend):
+    """
+    Redis pub/sub backend (requires the optional `redis` package)
+
+    If the connection drops, the reader logs it and resubscribes with
+    exponential backoff (from `retry_initial` up to `retry_max` seconds).
+    Events published by other workers while disconnected are lost.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        channel_prefix: str = "chat-events:",
+        retry_initial: float = 0.5,
+        retry_max: float = 30.0
+    ):
+        self.url = url
+        self.channel_prefix = channel_prefix
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self._client = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self, on_event: Callable[[str, Event], None]) -> None:
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("PUBSUB_BACKEND=redis requires the 'redis' package") from e
+
+        self._client = redis.from_url(self.url)
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.psubscribe(f"{self.channel_prefix}*")
+        self._reader = asyncio.create_task(self._read(on_event))
+
+    async def _read(self, on_event: Callable[[str, Event], None]) -> None:
+        delay = self.retry_initial
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self._client.pubsub()
+                    await self._pubsub.psubscribe(f"{self.channel_prefix}*")
+                    logger.info("Resubscribed to broker", extra={"url": self.url})
+                async for message in self._pubsub.listen():
+                    delay = self.retry_initial
+                    self._dispatch(message, on_event)
+                raise ConnectionError("Broker subscription ended")
+            except Exception as e:
+                # Redis errors (ConnectionError, TimeoutError) and socket errors alike
+                _reconnects.inc()
+                logger.warning(
+                    "Broker connection lost; resubscribing",
+                    extra={"error": repr(e), "retry_in_s": delay}
+                )
+                pubsub, self._pubsub = self._pubsub, None
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+
+    def _dispatch(self, message: Dict[str, Any], on_event: Callable[[str, Event], None]) -> None:
+        if message.get("type") != "pmessage":
+            return
+        channel = message["channel"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        try:
+            on_event(channel[len(self.channel_prefix):], json.loads(message["data"]))
+        except Exception:
+            logger.exception("Failed to dispatch broker event")
+
+    async def publish(self, topic: str, event: Event) -> None:
+        await self._client.publish(
+            f"{self.channel_prefix}{topic}", json.dumps(event, default=str)
+        )
+
+    async def stop(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._client is not None:
+            await self._client.aclose()
+
+
+class EventBus:
+    """Topic based fan-out to bounded subscriber queues"""
+
+    def __init__(self, buffer_size: int = 100, backend: Optional[BrokerBackend] = None):
+        self.buffer_size = buffer_size
+        self.backend = backend
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._pending: Set[asyncio.Task] = set()
+        self._started = False
+
+    async def start(self) -> None:
+        """Connect the broker backend, if any"""
+        if self.backend is not None and not self._started:
+            await self.backend.start(self._fanout)
+        self._started = True
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Close all subscriptions, finish pending broker publishes and disconnect the backend"""
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                subscription.close()
+        loop = asyncio.get_running_loop()
+        pending = {task for task in self._pending if task.get_loop() is loop}
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+        if self.backend is not None and self._started:
+            await self.backend.stop()
+        self._started = False
+
+    def subscribe(self, topic: str, maxsize: Optional[int] = None) -> Subscription:
+        """Subscribe the calling event loop to a topic"""
+        subscription = Subscription(self, topic, maxsize or self.buffer_size)
+        self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.topic, None)
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._subscribers
+
+    def wants(self, topic: str) -> bool:
+        """Whether publishing to a topic can reach anyone (lets callers skip serializing)"""
+        return self.backend is not None or topic in self._subscribers
+
+    def publish(self, topic: str, event: Event) -> None:
+        """
+        Publish an event without waiting for subscribers
+
+        With a broker backend the event is sent to the broker in a background
+        task; local subscribers receive it when the broker echoes it back.
+        """
+        if self.backend is not None and self._started:
+            task = asyncio.get_running_loop().create_task(self.backend.publish(topic, event))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+            return
+        self._fanout(topic, event)
+
+    def _fanout(self, topic: str, event: Event) -> None:
+        for subscription in tuple(self._subscribers.get(topic, ())):
+            subscription.deliver(event)
+
+
+def _build_backend() -> Optional[BrokerBackend]:
+    if settings.pubsub_backend == "redis":
+        return RedisBackend(settings.pubsub_redis_url)
+    return None
+
+
+# Singleton instance
+event_bus = EventBus(buffer_size=settings.pubsub_buffer_size, backend=_build_backend())
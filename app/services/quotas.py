@@ -0,0 +1,64 @@
+"""Per-tenant quota primitives"""
+
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.config import settings
+
+
+class QuotaExceededError(Exception):
+    """Raised when a tenant is over one of its quotas"""
+
+    def __init__(self, tenant_id: str, quota: str, retry_after: Optional[float] = None):
+        super().__init__(f"Tenant '{tenant_id}' exceeded its {quota} quota")
+        self.tenant_id = tenant_id
+        self.quota = quota
+        self.retry_after = retry_after
+
+
+@dataclass
+class TenantQuotas:
+    """Limits applied to one tenant (0 disables a limit)"""
+    max_sessions: int
+    max_message_bytes: int
+    max_concurrency: int
+    rate_per_s: float
+    burst: int
+
+    @classmethod
+    def for_tenant(cls, tenant_id: str) -> "TenantQuotas":
+        """Defaults from settings, with the tenant's overrides applied"""
+        quotas = cls(
+            max_sessions=settings.tenant_max_sessions,
+            max_message_bytes=settings.tenant_max_message_bytes,
+            max_concurrency=settings.tenant_max_concurrency,
+            rate_per_s=settings.tenant_rate_per_s,
+            burst=settings.tenant_burst,
+        )
+        overrides = settings.tenant_quotas.get(tenant_id)
+        if overrides is not None:
+            for name, value in overrides.model_dump(exclude_none=True).items():
+                if hasattr(quotas, name):
+                    setattr(quotas, name, value)
+        return quotas
+
+
+class TokenBucket:
+    """Token bucket rate limiter; not thread-safe, used from the event loop"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def acquire(self) -> float:
+        """Take a token; returns 0 on success, else seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
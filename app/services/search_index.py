@@ -0,0 +1,319 @@
+"""In-process full-text index over chat messages
+
+An inverted index (term -> {doc: term frequency}) maintained incrementally as
+messages are stored. Queries match all terms, evaluate the rarest term's
+postings first and rank candidates with BM25, so cost scales with the
+size of the smallest posting list rather than the number of messages.
+
+A fork's inherited messages are indexed once, under the session that wrote
+them. The fork is linked to that prefix, so filtering by the fork sees them,
+and a session's documents outlive it while forks still share them.
+
+Archived sessions stay indexed: their postings are kept but the messages
+themselves are dropped, and matches on them come back without a message
+for the caller to read from the archive (see `complete_match`). Each
+document keeps its distinct terms, so removing it only touches its own
+posting lists, archived or not.
+"""
+
+import heapq
+import math
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.schemas.chat import ChatMessage
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+@dataclass
+class _Document:
+    message: Optional[ChatMessage]  # None while the session is archived
+    message_id: Optional[str]
+    timestamp: Optional[datetime]
+    session_id: str
+    length: int
+    terms: Tuple[str, ...]  # distinct terms, to unpost without the text
+
+
+@dataclass
+class SearchMatch:
+    """A ranked search result (`message` is None for archived messages)"""
+    message: Optional[ChatMessage]
+    message_id: Optional[str]
+    session_id: str
+    score: float
+    snippet: str
+
+
+class SearchIndex:
+    """Incrementally maintained BM25 index over chat messages"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.documents: Dict[int, _Document] = {}
+        self.session_documents: Dict[str, List[int]] = {}
+        # Message id -> document, to reattach archived messages
+        self.message_documents: Dict[str, int] = {}
+        # Fork -> (session it was forked from, length of the shared prefix)
+        self.prefixes: Dict[str, Tuple[str, int]] = {}
+        # Session -> number of forks linked to it
+        self.forks: Dict[str, int] = {}
+        self._next_doc = 0
+        self._total_length = 0
+        self._detached = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @property
+    def attached(self) -> int:
+        """Indexed messages held in memory (not archived)"""
+        return len(self.documents) - self._detached
+
+    def add(self, session_id: str, message: ChatMessage) -> None:
+        """Index a stored message"""
+        tokens = tokenize(message.content)
+        doc = self._next_doc
+        self._next_doc += 1
+
+        frequencies: Dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, count in frequencies.items():
+            self.postings.setdefault(token, {})[doc] = count
+
+        self.documents[doc] = _Document(
+            message=message,
+            message_id=message.id,
+            timestamp=message.timestamp,
+            session_id=session_id,
+            length=len(tokens),
+            terms=tuple(frequencies)
+        )
+        self.session_documents.setdefault(session_id, []).append(doc)
+        if message.id is not None:
+            self.message_documents[message.id] = doc
+        self._total_length += len(tokens)
+
+    def link(self, session_id: str, parent_id: str, length: int) -> None:
+        """Share the first `length` messages visible in `parent_id` with fork `session_id`"""
+        # Link to the session that wrote the last shared message, as MessageThread.fork does
+        while parent_id in self.prefixes and length <= self.prefixes[parent_id][1]:
+            parent_id = self.prefixes[parent_id][0]
+        if length:
+            self.prefixes[session_id] = (parent_id, length)
+            self.forks[parent_id] = self.forks.get(parent_id, 0) + 1
+
+    def is_shared(self, session_id: str) -> bool:
+        """Whether forks still see some of this session's messages"""
+        return self.forks.get(session_id, 0) > 0
+
+    def session_view(self, session_id: str) -> List[int]:
+        """Documents visible in a session: the shared prefix, then its own"""
+        own = self.session_documents.get(session_id, [])
+        if session_id not in self.prefixes:
+            return own
+        segments = []
+        limit = len(own) + self.prefixes[session_id][1]
+        while session_id is not None and limit:
+            own = self.session_documents.get(session_id, [])
+            parent_id, shared = self.prefixes.get(session_id, (None, 0))
+            segments.append(own[:max(0, min(limit, shared + len(own)) - shared)])
+            limit = min(limit, shared)
+            session_id = parent_id
+        return [doc for segment in reversed(segments) for doc in segment]
+
+    def detach_session(self, session_id: str) -> None:
+        """Drop an archived session's messages but keep them searchable"""
+        for doc in self.session_documents.get(session_id, ()):
+            document = self.documents[doc]
+            if document.message is not None:
+                document.message = None
+                self._detached += 1
+
+    def attach(self, session_id: str, messages: List[ChatMessage]) -> None:
+        """Reattach rehydrated messages; messages not indexed yet are added"""
+        for message in messages:
+            doc = self.message_documents.get(message.id) if message.id is not None else None
+            if doc is None:
+                self.add(session_id, message)
+            elif self.documents[doc].message is None:
+                self.documents[doc].message = message
+                self._detached -= 1
+
+    def remove_session(self, session_id: str) -> Optional[str]:
+        """
+        Drop all messages of a session from the index
+
+        Returns:
+            The session it was forked from, if it shared a prefix
+        """
+        for doc in self.session_documents.pop(session_id, []):
+            document = self.documents.pop(doc)
+            self._total_length -= document.length
+            if document.message_id is not None:
+                self.message_documents.pop(document.message_id, None)
+            if document.message is None:
+                self._detached -= 1
+            for token in document.terms:
+                self._unpost(token, doc)
+        parent_id, _ = self.prefixes.pop(session_id, (None, 0))
+        if parent_id is not None:
+            self.forks[parent_id] -= 1
+            if not self.forks[parent_id]:
+                del self.forks[parent_id]
+        return parent_id
+
+    def _unpost(self, token: str, doc: int) -> None:
+        postings = self.postings.get(token)
+        if postings is not None:
+            postings.pop(doc, None)
+            if not postings:
+                del self.postings[token]
+
+    def search(
+        self,
+        query: str,
+        session_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 10,
+        offset: int = 0
+    ) -> Tuple[int, List[SearchMatch]]:
+        """
+        Find messages containing every query term
+
+        Args:
+            query: Free-text query
+            session_id: Only match messages from this session
+            since: Only match messages at or after this time
+            until: Only match messages before this time
+            limit: Page size
+            offset: Number of ranked results to skip
+
+        Returns:
+            Tuple of (total matches, ranked page of matches)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.documents:
+            return 0, []
+
+        term_postings = []
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                return 0, []
+            term_postings.append((term, postings))
+        term_postings.sort(key=lambda item: len(item[1]))
+
+        # Start from the smallest candidate set
+        candidates: Set[int]
+        if session_id is not None:
+            session_docs = self.session_view(session_id)
+            if not session_docs:
+                return 0, []
+            if len(session_docs) < len(term_postings[0][1]) or session_id in self.prefixes:
+                candidates = {doc for doc in session_docs if doc in term_postings[0][1]}
+            else:
+                candidates = {
+                    doc for doc in term_postings[0][1]
+                    if self.documents[doc].session_id == session_id
+                }
+        else:
+            candidates = set(term_postings[0][1])
+
+        for _, postings in term_postings[1:]:
+            candidates.intersection_update(postings)
+            if not candidates:
+                return 0, []
+
+        if since is not None or until is not None:
+            since, until = _naive_utc(since), _naive_utc(until)
+            candidates = {
+                doc for doc in candidates
+                if self._in_range(self.documents[doc].timestamp, since, until)
+            }
+
+        total = len(candidates)
+        if total == 0:
+            return 0, []
+
+        doc_count = len(self.documents)
+        avg_length = self._total_length / doc_count if doc_count else 0.0
+        idf = {
+            term: math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in term_postings
+        }
+
+        def score(doc: int) -> float:
+            length_norm = _K1 * (1 - _B + _B * self.documents[doc].length / (avg_length or 1))
+            total_score = 0.0
+            for term, postings in term_postings:
+                tf = postings[doc]
+                total_score += idf[term] * tf * (_K1 + 1) / (tf + length_norm)
+            return total_score
+
+        ranked = heapq.nlargest(offset + limit, ((score(doc), doc) for doc in candidates))
+        matches = []
+        for doc_score, doc in ranked[offset:offset + limit]:
+            document = self.documents[doc]
+            matches.append(SearchMatch(
+                message=document.message,
+                message_id=document.message_id,
+                session_id=session_id or document.session_id,
+                score=doc_score,
+                snippet=_snippet(document.message.content, terms) if document.message is not None else ""
+            ))
+        return total, matches
+
+    @staticmethod
+    def _in_range(
+        timestamp: Optional[datetime],
+        since: Optional[datetime],
+        until: Optional[datetime]
+    ) -> bool:
+        if timestamp is None:
+            return False
+        if since is not None and timestamp < since:
+            return False
+        if until is not None and timestamp >= until:
+            return False
+        return True
+
+
+def complete_match(match: SearchMatch, message: ChatMessage, query: str) -> None:
+    """Fill in a match on an archived message once it has been read back"""
+    match.message = message
+    match.snippet = _snippet(message.content, list(dict.fromkeys(tokenize(query))))
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Message timestamps are naive UTC; align aware filter values with them"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _snippet(content: str, terms: List[str], width: int = 160) -> str:
+    """Excerpt of the content around the first query term"""
+    if len(content) <= width:
+        return content
+    lowered = content.lower()
+    positions = [pos for pos in (lowered.find(term) for term in terms) if pos >= 0]
+    start = max(0, min(positions) - width // 4) if positions else 0
+    excerpt = content[start:start + width]
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if start + width < len(content) else ""
+    return f"{prefix}{excerpt}{suffix}"
@@ -0,0 +1,212 @@
+"""Semantic response cache in front of generation
+
+A generated reply is stored with the embedding of the prompt that produced
+it. A later prompt whose embedding is at least `threshold`-similar is
+answered with the stored reply, without calling a provider. Each ChatService
+has its own cache, so entries never cross tenants. Entries are evicted
+least-recently-used beyond `maxsize` and after `ttl` seconds.
+
+False hits (a reply served for a prompt it does not answer) are measured in
+two ways, and either one evicts the entry:
+
+- verification: a sampled fraction of hits is generated anyway and the fresh
+  reply is compared with the cached one. Two good answers to one question
+  are worded differently, so this uses its own, lower `verify_threshold`
+  (calibrated for the hashing embedder: paraphrased replies score about
+  0.5-0.7, unrelated ones below 0.4);
+- re-asks: a similar prompt in the same session right after a hit means the
+  cached answer did not help.
+"""
+
+import asyncio
+import functools
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.embeddings import Embedder, load_embedder
+from app.services.vector_index import VectorIndex, normalize
+from app.utils.cache import LRUCache
+from app.utils.metrics import metrics
+
+_lookups = metrics.counter("semantic_cache_lookups_total", "Semantic cache lookups by result (hit/miss)")
+_false_hits = metrics.counter("semantic_cache_false_hits_total", "Semantic cache hits found to be wrong, by how")
+
+
+@dataclass
+class CachedReply:
+    """A reply stored for a prompt"""
+    key: int
+    prompt: str
+    reply: str
+    created_at: float
+    hits: int = 0
+
+
+@dataclass
+class SemanticHit:
+    entry: CachedReply
+    similarity: float
+
+
+def _similarity(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(x * y for x, y in zip(normalize(a), normalize(b)))
+
+
+class SemanticCache:
+    """Nearest-neighbour lookup of earlier replies by prompt embedding"""
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        threshold: float = 0.9,
+        maxsize: int = 10_000,
+        ttl: Optional[float] = None,
+        ann_threshold: int = 5_000,
+        verify_rate: float = 0.0,
+        verify_threshold: float = 0.45,
+        tenant_id: Optional[str] = None
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.verify_threshold = verify_threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.verify_rate = verify_rate
+        self.tenant_id = tenant_id or settings.default_tenant
+        self.entries: "OrderedDict[int, CachedReply]" = OrderedDict()
+        self.index = VectorIndex(embedder.dimensions, ann_threshold=ann_threshold)
+        # Session -> (entry served, prompt embedding) of its last hit, to spot re-asks
+        self._recent_hits: LRUCache[Tuple[int, List[float]]] = LRUCache(maxsize=1024)
+        self._next_key = 0
+        self.hits = 0
+        self.misses = 0
+        self.false_hits = 0
+        self.verified = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed a text, off the event loop unless the embedder is cheap"""
+        if self.embedder.inline:
+            return self.embedder.embed(text)
+        return await asyncio.to_thread(self.embedder.embed, text)
+
+    def recently_served(self, session_id: str) -> bool:
+        """Whether the session's last lookup was a hit"""
+        return session_id in self._recent_hits
+
+    def check_reask(self, session_id: str, vector: List[float]) -> None:
+        """Count a false hit if a session repeats the prompt it was just served a cached reply for"""
+        recent = self._recent_hits.pop(session_id)
+        if recent is not None and _similarity(recent[1], vector) >= self.threshold:
+            self.report_false_hit(recent[0], reason="reask")
+
+    def lookup(self, vector: List[float], session_id: Optional[str] = None) -> Optional[SemanticHit]:
+        """The stored reply for the most similar earlier prompt, if similar enough"""
+        matches = self.index.search(vector, k=1)
+        if matches and matches[0][1] >= self.threshold:
+            key, similarity = matches[0]
+            entry = self.entries[key]
+            if self.ttl and time.monotonic() - entry.created_at > self.ttl:
+                self._remove(key)
+            else:
+                self.entries.move_to_end(key)
+                entry.hits += 1
+                self.hits += 1
+                _lookups.inc(tenant=self.tenant_id, result="hit")
+                if session_id is not None:
+                    self._recent_hits.set(session_id, (key, vector))
+                return SemanticHit(entry=entry, similarity=similarity)
+
+        self.misses += 1
+        _lookups.inc(tenant=self.tenant_id, result="miss")
+        return None
+
+    def add(self, prompt: str, reply: str, vector: List[float]) -> CachedReply:
+        """Store a generated reply, evicting the least recently used beyond `maxsize`"""
+        key = self._next_key
+        self._next_key += 1
+        entry = CachedReply(key=key, prompt=prompt, reply=reply, created_at=time.monotonic())
+        self.entries[key] = entry
+        self.index.add(key, vector)
+        while len(self.entries) > self.maxsize:
+            self._remove(next(iter(self.entries)))
+        return entry
+
+    def should_verify(self) -> bool:
+        """Whether to generate anyway for this hit, to measure the false-hit rate"""
+        return self.verify_rate > 0 and random.random() < self.verify_rate
+
+    async def verify(self, hit: SemanticHit, reply: str, vector: List[float]) -> bool:
+        """
+        Compare a freshly generated reply with the one served from the cache
+
+        A cached reply less than `verify_threshold`-similar to the fresh one
+        is a false hit and is replaced by the fresh reply.
+
+        Returns:
+            True if the cached reply held up
+        """
+        self.verified += 1
+        cached, fresh = await self.embed(hit.entry.reply), await self.embed(reply)
+        if _similarity(cached, fresh) >= self.verify_threshold:
+            return True
+        self.report_false_hit(hit.entry.key, reason="verify")
+        self.add(hit.entry.prompt, reply, vector)
+        return False
+
+    def report_false_hit(self, key: int, reason: str = "reported") -> None:
+        """Record that an entry answered a prompt wrongly and drop it"""
+        if key not in self.entries:
+            return
+        self.false_hits += 1
+        _false_hits.inc(tenant=self.tenant_id, reason=reason)
+        self._remove(key)
+
+    def _remove(self, key: int) -> None:
+        self.entries.pop(key, None)
+        self.index.remove(key)
+
+    def clear(self) -> None:
+        for key in list(self.entries):
+            self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "approximate": self.index.approximate,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "false_hits": self.false_hits,
+            "false_hit_rate": round(self.false_hits / self.hits, 4) if self.hits else 0.0,
+            "verified": self.verified,
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def default_embedder() -> Embedder:
+    """The configured embedder, shared by all tenants' caches"""
+    return load_embedder(settings.semantic_cache_embedder, settings.semantic_cache_dimensions)
+
+
+def create_semantic_cache(tenant_id: Optional[str] = None) -> Optional[SemanticCache]:
+    """A semantic cache configured from settings (None when disabled)"""
+    if not settings.semantic_cache_enabled:
+        return None
+    return SemanticCache(
+        default_embedder(),
+        threshold=settings.semantic_cache_threshold,
+        maxsize=settings.semantic_cache_size,
+        ttl=settings.semantic_cache_ttl_s,
+        ann_threshold=settings.semantic_cache_ann_threshold,
+        verify_rate=settings.semantic_cache_verify_rate,
+        verify_threshold=settings.semantic_cache_verify_threshold,
+        tenant_id=tenant_id,
+    )
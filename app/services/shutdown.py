@@ -0,0 +1,195 @@
+"""Coordinated graceful shutdown
+
+The server drains before it stops accepting connections. A server such as
+uvicorn closes its listeners and waits for open connections as soon as it
+gets SIGTERM, and only then runs the lifespan shutdown, so nothing would see
+a drain that started there. `install_signal_handlers()` puts a handler in
+front of the server's: on SIGTERM or SIGINT it drains first, then passes the
+signal on. Draining:
+
+1. Draining starts: readiness fails and DrainMiddleware answers new
+   requests with 503 and `Connection: close`, so load balancers and clients
+   move to other instances.
+2. Long-lived streams (session WebSockets) are ended with close code 1012
+   (service restart), telling clients to reconnect elsewhere.
+3. Requests in flight, and operations that outlive their request (shielded
+   idempotent generations), run to completion up to `shutdown_drain_timeout_s`.
+   Readiness keeps failing for at least `shutdown_drain_delay_s`, so load
+   balancers see it before the listener closes.
+
+A second signal is passed on at once. Once the server has stopped, the
+lifespan shutdown drains again (a no-op after a signal) and only then are
+background workers stopped, sessions archived, buffers
+flushed and connections closed (see the application lifespan).
+"""
+
+import asyncio
+import signal
+import threading
+from typing import Any, Callable, Dict, Optional, Set
+
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+logger = setup_logger("shutdown")
+
+_abandoned = metrics.counter("shutdown_abandoned_total", "Work still running when the drain deadline passed")
+
+
+class ShutdownCoordinator:
+    """Tracks in-flight work so shutdown can wait for it"""
+
+    def __init__(self):
+        self.draining = False
+        self.in_flight = 0
+        self._tasks: Set[asyncio.Future] = set()
+        self._streams: Set[Callable[[], None]] = set()
+        self._changed: Optional[asyncio.Event] = None
+        self._handlers: Dict[int, Any] = {}
+        self._signalled: Optional[asyncio.Task] = None
+
+    def reset(self) -> None:
+        """Accept work again (the app may be started more than once per process, e.g. in tests)"""
+        self.draining = False
+        self._signalled = None
+
+    def enter(self) -> None:
+        self.in_flight += 1
+
+    def exit(self) -> None:
+        self.in_flight -= 1
+        self._notify()
+
+    def track(self, task: asyncio.Future) -> None:
+        """Wait for a task that may outlive the request that started it"""
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Future) -> None:
+        self._tasks.discard(task)
+        self._notify()
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+
+    def add_stream(self, close: Callable[[], None]) -> Callable[[], None]:
+        """
+        Register a long-lived stream; `close` is called when draining starts
+
+        Returns:
+            Function to call when the stream ends on its own
+        """
+        if self.draining:
+            close()
+        else:
+            self._streams.add(close)
+        return lambda: self._streams.discard(close)
+
+    def pending(self) -> int:
+        # Tasks of an event loop that has been closed will never finish
+        self._tasks = {task for task in self._tasks if not task.get_loop().is_closed()}
+        return self.in_flight + len(self._tasks)
+
+    def begin(self) -> None:
+        """Stop accepting new work and end long-lived streams"""
+        if self.draining:
+            return
+        self.draining = True
+        logger.info("Draining", extra={"in_flight": self.in_flight, "tasks": len(self._tasks)})
+        streams, self._streams = self._streams, set()
+        for close in streams:
+            close()
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Begin draining and wait until in-flight work finishes or `timeout` passes
+
+        Returns:
+            Number of requests and tasks still running at the deadline
+        """
+        self.begin()
+        # Let the stream closes scheduled by begin() run
+        await asyncio.sleep(0)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self._changed = asyncio.Event()
+        try:
+            while self.pending() and loop.time() < deadline:
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            self._changed = None
+        remaining = self.pending()
+        if remaining:
+            _abandoned.inc(remaining)
+            logger.warning("Drain deadline passed", extra={"in_flight": self.in_flight, "tasks": len(self._tasks)})
+        return remaining
+
+    def install_signal_handlers(self, timeout: float, delay: float = 0.0) -> bool:
+        """
+        Drain on SIGTERM/SIGINT before the server's own handler sees the signal
+
+        Must be called from the running loop, after the server installed its
+        handlers (e.g. in the lifespan startup).
+
+        Returns:
+            False when not on the main thread, where signals cannot be handled
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return False
+        loop = asyncio.get_running_loop()
+
+        def handle(sig: int, frame: Any) -> None:
+            loop.call_soon_threadsafe(self._on_signal, sig, timeout, delay)
+
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            self._handlers[sig] = signal.signal(sig, handle)
+        return True
+
+    def uninstall_signal_handlers(self) -> None:
+        """Give the signals back to the handlers that were replaced"""
+        handlers, self._handlers = self._handlers, {}
+        for sig, handler in handlers.items():
+            signal.signal(sig, handler)
+
+    def _on_signal(self, sig: int, timeout: float, delay: float) -> None:
+        if self._signalled is not None:
+            # Second signal: stop waiting
+            self._pass_on(sig)
+            return
+        logger.info("Shutdown signal received", extra={"signal": signal.Signals(sig).name})
+        self._signalled = asyncio.ensure_future(self._drain_then_pass_on(sig, timeout, delay))
+
+    async def _drain_then_pass_on(self, sig: int, timeout: float, delay: float) -> None:
+        try:
+            await asyncio.gather(self.drain(timeout), asyncio.sleep(delay))
+        finally:
+            self._pass_on(sig)
+
+    def _pass_on(self, sig: int) -> None:
+        handler = self._handlers.get(sig, signal.SIG_DFL)
+        if callable(handler):
+            handler(sig, None)
+            return
+        # Default or ignored disposition: restore it and let it act
+        self.uninstall_signal_handlers()
+        if handler != signal.SIG_IGN:
+            signal.raise_signal(sig)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "draining": self.draining,
+            "in_flight": self.in_flight,
+            "tasks": len(self._tasks),
+            "streams": len(self._streams),
+        }
+
+
+# Singleton instance (drained on SIGTERM and in the application lifespan)
+shutdown = ShutdownCoordinator()
+
+metrics.gauge("shutdown_draining", "1 while the server drains before shutdown", lambda: int(shutdown.draining))
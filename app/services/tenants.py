@@ -0,0 +1,166 @@
+"""Tenant registry - isolated storage and quotas per tenant
+
+A tenant is selected by the request's API key (`tenant_api_keys`); requests
+without a key use the default tenant. Each tenant gets its own
+ChatService (sessions, messages, search index and history cache), its own
+database shard for API keys, and its own memory, concurrency and rate
+quotas, so a hot tenant is throttled instead of slowing down everyone else.
+
+Tenants are created on first use and dropped again once idle with nothing
+left in memory (see `TenantRegistry.evict_idle`).
+"""
+
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from typing import Any, Dict, Iterator, Optional
+
+from app.core.config import settings
+from app.db import shard_for_tenant
+from app.services.chat_service import ChatService, chat_service
+from app.services.idempotency import IdempotencyStore
+from app.services.quotas import QuotaExceededError, TenantQuotas, TokenBucket
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+logger = setup_logger("tenants")
+
+_rejections = metrics.counter("tenant_quota_rejections_total", "Requests rejected by a tenant quota")
+
+
+class Tenant:
+    """One tenant's storage and admission state"""
+
+    def __init__(self, tenant_id: str, quotas: TenantQuotas, service: ChatService):
+        self.id = tenant_id
+        self.quotas = quotas
+        self.service = service
+        self.shard = shard_for_tenant(tenant_id)
+        self.bucket = TokenBucket(quotas.rate_per_s, quotas.burst) if quotas.rate_per_s else None
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+        # Results of requests sent with an Idempotency-Key
+        self.idempotency = IdempotencyStore(
+            maxsize=settings.idempotency_cache_size,
+            ttl=settings.idempotency_ttl_s
+        )
+
+    @contextmanager
+    def admit(self) -> Iterator["Tenant"]:
+        """
+        Hold a request slot for the duration of a request
+
+        Raises:
+            QuotaExceededError: If the tenant is over its rate or concurrency quota
+        """
+        if self.bucket is not None:
+            retry_after = self.bucket.acquire()
+            if retry_after:
+                _rejections.inc(tenant=self.id, quota="rate")
+                raise QuotaExceededError(self.id, "rate", retry_after)
+        if self.quotas.max_concurrency and self.in_flight >= self.quotas.max_concurrency:
+            _rejections.inc(tenant=self.id, quota="concurrency")
+            raise QuotaExceededError(self.id, "concurrency", 1.0)
+        self.in_flight += 1
+        self.last_used = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tenant_id": self.id,
+            "shard": self.shard,
+            "sessions": len(self.service.sessions),
+            "stored_bytes": self.service.stored_bytes,
+            "in_flight": self.in_flight,
+            "quotas": asdict(self.quotas),
+            "archive": self.service.archive.stats() if self.service.archive is not None else None,
+            "semantic_cache": self.service.semantic_cache.stats() if self.service.semantic_cache is not None else None,
+        }
+
+
+class TenantRegistry:
+    """Resolves API keys to tenants and holds each tenant's state"""
+
+    def __init__(self, default_service: Optional[ChatService] = None):
+        self.tenants: Dict[str, Tenant] = {}
+        self._default_service = default_service
+
+    def resolve(self, api_key: Optional[str]) -> Optional[str]:
+        """
+        Tenant id for an API key
+
+        Requests without a key belong to the default tenant. Only keys listed
+        in `tenant_api_keys` select a tenant; any other key resolves to None
+        and is rejected, so clients cannot mint tenants (and fresh quotas).
+        """
+        if not api_key:
+            return settings.default_tenant
+        return settings.tenant_api_keys.get(api_key)
+
+    def get(self, tenant_id: str) -> Tenant:
+        """Get a tenant, creating its storage on first use"""
+        tenant = self.tenants.get(tenant_id)
+        if tenant is None:
+            quotas = TenantQuotas.for_tenant(tenant_id)
+            if tenant_id == settings.default_tenant and self._default_service is not None:
+                service = self._default_service
+                service.tenant_id, service.quotas = tenant_id, quotas
+            else:
+                service = ChatService(tenant_id=tenant_id, quotas=quotas)
+            tenant = self.tenants[tenant_id] = Tenant(tenant_id, quotas, service)
+        return tenant
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tenants": [tenant.stats() for tenant in self.tenants.values()]}
+
+    def evict_idle(self, idle_seconds: float) -> int:
+        """
+        Drop tenants unused for `idle_seconds` that hold nothing in memory
+
+        A tenant is only dropped without requests in flight, hot sessions or
+        messages held in memory; its archive stays on disk and is reopened on
+        next use. Its archived sessions are then searchable again once
+        rehydrated (as after a restart). Idempotency results are kept for
+        `idempotency_ttl_s` at least.
+
+        Returns:
+            Number of tenants dropped
+        """
+        cutoff = time.monotonic() - max(idle_seconds, settings.idempotency_ttl_s)
+        evicted = 0
+        for tenant_id, tenant in list(self.tenants.items()):
+            if (
+                tenant_id == settings.default_tenant
+                or tenant.in_flight
+                or tenant.last_used > cutoff
+                or tenant.service.sessions
+                or tenant.service.search_index.attached
+            ):
+                continue
+            del self.tenants[tenant_id]
+            if tenant.service.archive is not None:
+                tenant.service.archive.close()
+            evicted += 1
+        return evicted
+
+    async def archive_idle_sessions(self, idle_seconds: float) -> int:
+        """Archive idle sessions of every tenant; returns the number archived"""
+        archived = 0
+        for tenant in list(self.tenants.values()):
+            try:
+                archived += await tenant.service.archive_idle_sessions(idle_seconds)
+            except Exception:
+                logger.exception("Archiving failed", extra={"tenant": tenant.id})
+        return archived
+
+    def close(self) -> None:
+        for tenant in self.tenants.values():
+            if tenant.service.archive is not None:
+                tenant.service.archive.close()
+
+
+# Singleton instance; the default tenant uses the shared chat_service
+tenant_registry = TenantRegistry(default_service=chat_service)
@@ -0,0 +1,200 @@
+"""In-process nearest-neighbour index over embedding vectors
+
+Similarity is cosine; vectors are normalised on the way in so it is a dot
+product. Up to `ann_threshold` vectors, search is exact brute force: one
+matrix-vector product when NumPy is installed, and a loop over each
+query's non-zero components otherwise (so without NumPy the threshold is
+capped at `PYTHON_ANN_THRESHOLD`). Past that size, random-hyperplane LSH
+tables narrow the search to vectors sharing a bucket with the query, and
+only those candidates are scored exactly. This trades a little recall for
+search cost proportional to the candidates rather than the index.
+
+The LSH tables are kept up to date on every add, so crossing the threshold
+costs nothing, and the hyperplanes are only drawn on the first add, so an
+index that is never used costs nothing either.
+"""
+
+import heapq
+import math
+import random
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional
+    np = None
+
+# Largest index searched by brute force in pure Python (about 3 ms per search)
+PYTHON_ANN_THRESHOLD = 500
+
+
+def normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else list(vector)
+
+
+class VectorIndex:
+    """Cosine-similarity index; exact when small, LSH-approximate when large"""
+
+    def __init__(
+        self,
+        dimensions: int,
+        ann_threshold: int = 5_000,
+        tables: int = 16,
+        bits: int = 10,
+        seed: int = 0
+    ):
+        self.dimensions = dimensions
+        self.ann_threshold = ann_threshold if np is not None else min(ann_threshold, PYTHON_ANN_THRESHOLD)
+        self.tables = tables
+        self.bits = bits
+        self.seed = seed
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: List[Optional[Hashable]] = []
+        self._free: List[int] = []
+        if np is not None:
+            self._matrix = np.zeros((64, dimensions), dtype=np.float32)
+            self._weights = 1 << np.arange(bits)
+        else:
+            self._rows: List[Optional[List[float]]] = []
+        # Hyperplanes, drawn on the first add
+        self._planes = None
+        # LSH tables (signature -> slots); searched once the index outgrows brute force
+        self._buckets: List[Dict[int, Set[int]]] = [{} for _ in range(tables)]
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    @property
+    def approximate(self) -> bool:
+        return len(self._slots) > self.ann_threshold
+
+    def add(self, key: Hashable, vector: Sequence[float]) -> None:
+        """Insert or replace the vector stored under a key"""
+        if key in self._slots:
+            self.remove(key)
+        vector = normalize(vector)
+        slot = self._free.pop() if self._free else self._grow()
+        if np is not None:
+            self._matrix[slot] = vector
+        else:
+            self._rows[slot] = vector
+        self._keys[slot] = key
+        self._slots[key] = slot
+        for table, signature in zip(self._buckets, self._signatures(vector)):
+            table.setdefault(signature, set()).add(slot)
+
+    def remove(self, key: Hashable) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        for table, signature in zip(self._buckets, self._signatures(self._row(slot))):
+            members = table.get(signature)
+            if members is not None:
+                members.discard(slot)
+                if not members:
+                    del table[signature]
+        if np is not None:
+            self._matrix[slot] = 0.0
+        else:
+            self._rows[slot] = None
+        self._keys[slot] = None
+        self._free.append(slot)
+
+    def search(self, vector: Sequence[float], k: int = 1) -> List[Tuple[Hashable, float]]:
+        """The `k` most similar keys with their cosine similarity, best first"""
+        if not self._slots:
+            return []
+        query = normalize(vector)
+        candidates: Optional[Set[int]] = None
+        if self.approximate:
+            candidates = set()
+            for table, signature in zip(self._buckets, self._signatures(query)):
+                candidates.update(table.get(signature, ()))
+            if not candidates:
+                return []
+        if np is not None:
+            return self._search_numpy(query, k, candidates)
+        return self._search_python(query, k, candidates)
+
+    def _search_numpy(self, query: List[float], k: int, candidates: Optional[Set[int]]) -> List[Tuple[Hashable, float]]:
+        q = np.asarray(query, dtype=np.float32)
+        if candidates is None:
+            slots = np.arange(len(self._keys))
+            scores = self._matrix[:len(self._keys)] @ q
+        else:
+            slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            scores = self._matrix[slots] @ q
+        top = np.argsort(-scores)[:k + len(self._free)]
+        results = []
+        for i in top:
+            key = self._keys[int(slots[i])]
+            if key is not None:
+                results.append((key, float(scores[i])))
+                if len(results) == k:
+                    break
+        return results
+
+    def _search_python(self, query: List[float], k: int, candidates: Optional[Set[int]]) -> List[Tuple[Hashable, float]]:
+        # Embeddings of short texts are sparse; only score the non-zero components
+        components = [(i, v) for i, v in enumerate(query) if v]
+        slots: Iterable[int] = candidates if candidates is not None else range(len(self._rows))
+        scored = []
+        for slot in slots:
+            row = self._rows[slot]
+            if row is not None:
+                scored.append((sum(row[i] * v for i, v in components), slot))
+        return [(self._keys[slot], score) for score, slot in heapq.nlargest(k, scored)]
+
+    def _row(self, slot: int) -> List[float]:
+        return self._matrix[slot].tolist() if np is not None else self._rows[slot]
+
+    def _grow(self) -> int:
+        slot = len(self._keys)
+        self._keys.append(None)
+        if np is not None:
+            if slot == len(self._matrix):
+                grown = np.zeros((2 * len(self._matrix), self.dimensions), dtype=np.float32)
+                grown[:slot] = self._matrix
+                self._matrix = grown
+        else:
+            self._rows.append(None)
+        return slot
+
+    def _hyperplanes(self):
+        if self._planes is None:
+            count = self.tables * self.bits
+            if np is not None:
+                self._planes = np.random.default_rng(self.seed).standard_normal(
+                    (count, self.dimensions), dtype=np.float32
+                )
+            else:
+                # Random +-1 components: as good as Gaussian ones for LSH, and far cheaper to draw
+                rng = random.Random(self.seed)
+                signs = (-1.0, 1.0)
+                self._planes = [
+                    [signs[(draw >> i) & 1] for i in range(self.dimensions)]
+                    for draw in (rng.getrandbits(self.dimensions) for _ in range(count))
+                ]
+        return self._planes
+
+    def _signatures(self, vector: List[float]) -> List[int]:
+        """One `bits`-bit bucket id per table: the sides of its hyperplanes the vector is on"""
+        planes = self._hyperplanes()
+        if np is not None:
+            signs = (planes @ np.asarray(vector, dtype=np.float32)) > 0
+            return [int(s) for s in signs.reshape(self.tables, self.bits) @ self._weights]
+        components = [(i, v) for i, v in enumerate(vector) if v]
+        signatures = []
+        for table in range(self.tables):
+            signature = 0
+            for bit in range(self.bits):
+                plane = planes[table * self.bits + bit]
+                if sum(plane[i] * v for i, v in components) > 0:
+                    signature |= 1 << bit
+            signatures.append(signature)
+        return signatures
+
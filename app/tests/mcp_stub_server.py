@@ -0,0 +1,159 @@
+"""Stand-in MCP server for tests and latency benchmarks
+
+Speaks newline-delimited JSON-RPC over stdio, or over a Unix socket with
+`--socket PATH`. Requests are handled concurrently so multiplexing and
+parallel tool calls can be observed.
+
+Tools:
+    echo     returns its `text` argument (read-only, memoizable)
+    add      returns a + b (idempotent, memoizable)
+    sleep    waits `seconds` then returns (not memoizable)
+    counter  returns how many times it has been called (not memoizable)
+    fail     returns an error result
+
+Usage:
+    python -m app.tests.mcp_stub_server [--socket PATH] [--latency SECONDS]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+TOOLS = [
+    {
+        "name": "echo",
+        "description": "Echo the given text",
+        "inputSchema": {"type": "object", "properties": {"text": {"type": "string"}}},
+        "annotations": {"readOnlyHint": True},
+    },
+    {
+        "name": "add",
+        "description": "Add two numbers",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"a": {"type": "number"}, "b": {"type": "number"}},
+        },
+        "annotations": {"idempotentHint": True},
+    },
+    {
+        "name": "sleep",
+        "description": "Sleep for the given number of seconds",
+        "inputSchema": {"type": "object", "properties": {"seconds": {"type": "number"}}},
+    },
+    {
+        "name": "counter",
+        "description": "Count calls",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+    {
+        "name": "fail",
+        "description": "Always fails",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+]
+
+
+class StubServer:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.list_calls = 0
+
+    async def handle(self, message: dict):
+        method = message.get("method")
+        params = message.get("params") or {}
+        if method == "initialize":
+            return {
+                "protocolVersion": params.get("protocolVersion", "2024-11-05"),
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "mcp-stub", "version": "0.1.0"},
+            }
+        if method == "tools/list":
+            self.list_calls += 1
+            return {"tools": TOOLS}
+        if method == "tools/call":
+            return await self.call_tool(params.get("name"), params.get("arguments") or {})
+        raise LookupError(method)
+
+    async def call_tool(self, name: str, arguments: dict) -> dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls += 1
+        if name == "echo":
+            text = str(arguments.get("text", ""))
+        elif name == "add":
+            text = str(arguments.get("a", 0) + arguments.get("b", 0))
+        elif name == "sleep":
+            await asyncio.sleep(float(arguments.get("seconds", 0)))
+            text = "slept"
+        elif name == "counter":
+            text = str(self.calls)
+        elif name == "fail":
+            return {"content": [{"type": "text", "text": "failure"}], "isError": True}
+        else:
+            raise LookupError(name)
+        return {"content": [{"type": "text", "text": text}], "isError": False}
+
+    async def serve(self, reader: asyncio.StreamReader, write) -> None:
+        tasks = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if "id" not in message:
+                continue  # notifications
+            task = asyncio.create_task(self._respond(message, write))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    async def _respond(self, message: dict, write) -> None:
+        try:
+            response = {"jsonrpc": "2.0", "id": message["id"], "result": await self.handle(message)}
+        except LookupError as e:
+            response = {"jsonrpc": "2.0", "id": message["id"], "error": {"code": -32601, "message": f"Not found: {e}"}}
+        await write((json.dumps(response) + "\n").encode())
+
+
+async def _serve_stdio(server: StubServer) -> None:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=16 * 1024 * 1024)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    async def write(data: bytes) -> None:
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    await server.serve(reader, write)
+
+
+async def _serve_socket(server: StubServer, path: str) -> None:
+    async def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async def write(data: bytes) -> None:
+            writer.write(data)
+            await writer.drain()
+
+        await server.serve(reader, write)
+        writer.close()
+
+    unix_server = await asyncio.start_unix_server(on_client, path)
+    async with unix_server:
+        await unix_server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", help="Serve on this Unix socket instead of stdio")
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency per tool call (s)")
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency)
+    if args.socket:
+        asyncio.run(_serve_socket(server, args.socket))
+    else:
+        asyncio.run(_serve_stdio(server))
+
+
+if __name__ == "__main__":
+    main()
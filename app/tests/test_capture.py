@@ -0,0 +1,87 @@
+"""Test cases for traffic capture and replay"""
+
+import asyncio
+import glob
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.middleware.capture import CaptureMiddleware, CaptureWriter, read_capture
+from benchmarks.replay import run
+
+
+def _capture(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "tenant_api_keys", {"capture-secret-key": "capture"})
+    writer = CaptureWriter(str(tmp_path))
+    client = TestClient(CaptureMiddleware(app, writer=writer))
+    headers = {"X-API-Key": "capture-secret-key"}
+    session_id = client.post("/api/v1/chat/sessions", json={"title": "Private"}, headers=headers).json()["id"]
+    client.post("/api/v1/chat/", json={"message": "my password is hunter2", "session_id": session_id}, headers=headers)
+    client.post("/api/v1/chat/", json={"message": "My password is hunter2!", "session_id": session_id}, headers=headers)
+    client.get(f"/api/v1/chat/sessions/{session_id}/messages", headers=headers)
+    client.get("/api/v1/chat/search", params={"q": "hunter2", "limit": 5}, headers=headers)
+    client.get("/health")
+    writer.close()
+    return session_id, glob.glob(str(tmp_path / "*.jsonl.gz"))
+
+
+def test_capture_is_sanitized_and_links_sessions(tmp_path, monkeypatch):
+    """Records keep shapes and pseudonyms, never content, keys or ids"""
+    session_id, paths = _capture(tmp_path, monkeypatch)
+    assert len(paths) == 1
+    raw = open(paths[0], "rb").read()
+    records = read_capture(paths)
+
+    text = str(records)
+    for secret in ("hunter2", "capture-secret-key", session_id, "Private"):
+        assert secret not in text
+        assert secret.encode() not in raw
+    assert [r["r"] for r in records] == [
+        "/api/v1/chat/sessions",
+        "/api/v1/chat/",
+        "/api/v1/chat/",
+        "/api/v1/chat/sessions/{session_id}/messages",
+        "/api/v1/chat/search",
+    ]
+    created, first, second, messages, search = records
+    assert first["s"] == second["s"] == messages["s"] == created["ns"]
+    assert first["n"] == 22 and first["h"] == second["h"]
+    assert search["q"] == {"q": 7, "limit": 5}
+    assert all(r["st"] == 200 and r["d"] > 0 for r in records)
+
+
+def test_replay_drives_the_app(tmp_path, monkeypatch):
+    """The capture is replayed against live sessions with a fake generator"""
+    _, paths = _capture(tmp_path, monkeypatch)
+    replayer = asyncio.run(run(paths, speed=0, gen_latency_ms=1, lifespan=False))
+
+    routes = {route: (latencies, statuses) for route, (latencies, _, statuses) in replayer.results.items()}
+    assert len(routes["POST /api/v1/chat/"][0]) == 2
+    assert all(status == 200 for _, statuses in routes.values() for status in statuses)
+    assert "GET /api/v1/chat/sessions/{session_id}/messages" in replayer.report()
+
+
+def test_capture_never_breaks_a_request(tmp_path):
+    """Malformed bodies and recording errors are not surfaced to the client"""
+    writer = CaptureWriter(str(tmp_path))
+    client = TestClient(CaptureMiddleware(app, writer=writer))
+    for body in ({"message": "hi", "context": "oops"}, {"message": "hi", "context": {"tool_calls": 5}}):
+        assert client.post("/api/v1/chat/", json=body).status_code == 422
+    assert [r["st"] for r in writer._buffer] == [422, 422]
+    assert all("tc" not in r for r in writer._buffer)
+
+    def broken(value):
+        raise RuntimeError("pseudonym failed")
+
+    writer.pseudonym = broken
+    assert client.get("/api/v1/chat/sessions").status_code == 200
+    assert len(writer._buffer) == 2
+
+
+def test_only_paging_parameters_are_kept_verbatim(tmp_path):
+    """Digit-only values of other parameters are recorded by length"""
+    writer = CaptureWriter(str(tmp_path))
+    client = TestClient(CaptureMiddleware(app, writer=writer))
+    client.get("/api/v1/chat/search", params={"q": "4111111111111111", "limit": 5, "offset": 0})
+    assert writer._buffer[0]["q"] == {"q": 16, "limit": 5, "offset": 0}
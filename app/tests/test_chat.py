@@ -119,3 +119,64 @@ def test_delete_session():
     assert get_response.status_code == 404
 
 
+
+
+def test_send_message_without_session_uses_created_session():
+    """A chat message without session ID is stored in the newly created session"""
+    response = client.post("/api/v1/chat/", json={"message": "Hello"})
+    session_id = response.json()["session_id"]
+    
+    session = client.get(f"/api/v1/chat/sessions/{session_id}")
+    assert session.status_code == 200
+    assert session.json()["message_count"] == 2
+
+
+def test_conditional_get_session_and_messages():
+    """Unchanged sessions answer 304 until a new message is written"""
+    session_id = client.post(
+        "/api/v1/chat/sessions",
+        json={"title": "Conditional Session"}
+    ).json()["id"]
+    
+    first = client.get(f"/api/v1/chat/sessions/{session_id}")
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+    
+    cached = client.get(f"/api/v1/chat/sessions/{session_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    
+    messages = client.get(f"/api/v1/chat/sessions/{session_id}/messages")
+    assert messages.headers["etag"] == etag
+    cached = client.get(
+        f"/api/v1/chat/sessions/{session_id}/messages",
+        headers={"If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+    
+    client.post("/api/v1/chat/", json={"message": "New", "session_id": session_id})
+    
+    fresh = client.get(
+        f"/api/v1/chat/sessions/{session_id}/messages",
+        headers={"If-None-Match": etag}
+    )
+    assert fresh.status_code == 200
+    assert len(fresh.json()) == 2
+    assert fresh.headers["etag"] != etag
+    
+    # A write within the same second as the Last-Modified value must not yield
+    # a stale 304, so If-Modified-Since is ignored for resources with an ETag
+    client.post("/api/v1/chat/", json={"message": "Newer", "session_id": session_id})
+    by_date = client.get(
+        f"/api/v1/chat/sessions/{session_id}",
+        headers={"If-Modified-Since": fresh.headers["last-modified"]}
+    )
+    assert by_date.status_code == 200
+    assert by_date.json()["message_count"] == 4
+
+
+def test_malformed_tool_calls_are_rejected():
+    """Tool calls in the message context are validated before the turn runs"""
+    for context in ({"tool_calls": 5}, {"tool_calls": [{"server": "files"}]}, {"tool_calls": ["x"]}):
+        response = client.post("/api/v1/chat/", json={"message": "Hi", "context": context})
+        assert response.status_code == 422
@@ -0,0 +1,84 @@
+"""Test cases for background session compaction"""
+
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.schemas.chat import ChatMessage, MessageRole
+from app.services import chat_service as chat_service_module
+from app.services.chat_service import ChatService
+from app.services.compaction import CompactionWorker, extractive_summary
+from app.services.overload import overload
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """A private worker with a low compaction threshold"""
+    worker = CompactionWorker(rate_per_s=100.0)
+    monkeypatch.setattr(chat_service_module, "compaction_worker", worker)
+    monkeypatch.setattr(settings, "compaction_threshold", 6)
+    monkeypatch.setattr(settings, "compaction_keep_recent", 2)
+    return worker
+
+
+def test_extractive_summary_keeps_first_sentences_within_budget():
+    messages = [
+        ChatMessage(role=MessageRole.USER, content="Question 0. With more detail."),
+        ChatMessage(role=MessageRole.ASSISTANT, content="Answer 0.  Long   reply."),
+    ]
+    summary = extractive_summary(None, messages)
+    assert summary == "user: Question 0\nassistant: Answer 0"
+    assert extractive_summary("x" * 50, messages, max_chars=40) == "user: Question 0\nassistant: Answer 0"
+
+
+def test_long_session_is_compacted_in_background(worker):
+    """Generation sees the summary plus recent messages once compacted"""
+    service = ChatService()
+
+    async def scenario():
+        session = await service.create_session(title="Long")
+        for i in range(4):
+            await service.process_message(f"Turn {i}. Details.", session_id=session.id)
+        assert len(worker) == 1
+        assert await worker.run_once()
+        history = await service.get_history(session.id)
+        return session, history
+
+    session, history = asyncio.run(scenario())
+    assert session.compacted_count == 6
+    assert session.summary.startswith("user: Turn 0\nassistant: Echo: Turn 0")
+    assert history[0].role == MessageRole.SYSTEM and history[0].content == session.summary
+    assert [m.content for m in history[1:]][0] == "Turn 3. Details."
+    assert len(history) == 3
+    assert len(asyncio.run(service.get_session_messages(session.id))) == 8
+
+
+def test_largest_backlog_is_compacted_first(worker):
+    service = ChatService()
+
+    async def scenario():
+        short = await service.create_session(title="Short")
+        long = await service.create_session(title="Long")
+        for i in range(4):
+            await service.process_message(f"turn {i}", session_id=short.id)
+        for i in range(6):
+            await service.process_message(f"turn {i}", session_id=long.id)
+        assert len(worker) == 2
+        await worker.run_once()
+        return short, long
+
+    short, long = asyncio.run(scenario())
+    assert long.summary is not None
+    assert short.summary is None
+
+
+def test_worker_waits_for_quiet(worker):
+    """No compaction starts while the server is under pressure"""
+    saved = overload.loop_lag_ms
+    try:
+        overload.loop_lag_ms = overload.lag_threshold_ms
+        assert not worker._idle()
+    finally:
+        overload.loop_lag_ms = saved
+    assert worker._idle()
@@ -0,0 +1,109 @@
+"""Test cases for response compression"""
+
+import asyncio
+import zlib
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.middleware.compression import (
+    CompressionMiddleware,
+    PrecompressedResponses,
+    negotiate,
+)
+
+client = TestClient(app)
+
+
+def test_negotiate_respects_q_values():
+    """Highest q wins, q=0 excludes, ties follow server preference"""
+    assert negotiate("gzip, deflate", ["br", "gzip"]) == "gzip"
+    assert negotiate("gzip, br", ["br", "gzip"]) == "br"
+    assert negotiate("br;q=0.5, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate("gzip;q=0", ["gzip"]) is None
+    assert negotiate("*", ["gzip"]) == "gzip"
+    assert negotiate("identity", ["gzip"]) is None
+
+
+def test_large_json_is_compressed():
+    """Message history above the size threshold is gzipped"""
+    session_id = client.post("/api/v1/chat/sessions", json={"title": "Compressed"}).json()["id"]
+    for i in range(20):
+        client.post("/api/v1/chat/", json={"message": f"message number {i}", "session_id": session_id})
+
+    response = client.get(
+        f"/api/v1/chat/sessions/{session_id}/messages",
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()) == 40
+
+
+def test_small_responses_are_not_compressed():
+    """Responses under the threshold are sent as-is"""
+    response = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"status": "healthy"}
+    # Uncompressed either way, but negotiable: caches must still key on the encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert "Accept-Encoding" in client.get("/health", headers={"Accept-Encoding": ""}).headers["vary"]
+
+
+def test_streaming_response_is_flushed_per_chunk():
+    """Each NDJSON chunk can be decoded as soon as it arrives"""
+    stream_app = FastAPI()
+
+    @stream_app.get("/events")
+    async def events():
+        async def lines():
+            for i in range(3):
+                yield f'{{"n": {i}}}\n'
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    wrapped = CompressionMiddleware(stream_app, minimum_size=1024, level=6)
+    scope = {
+        "type": "http", "method": "GET", "path": "/events", "raw_path": b"/events",
+        "root_path": "", "query_string": b"", "scheme": "http",
+        "headers": [(b"accept-encoding", b"gzip")],
+        "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+    }
+    messages = []
+
+    async def receive():
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(wrapped(scope, receive, send))
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+
+    decoder = zlib.decompressobj(31)
+    decoded = [decoder.decompress(m["body"]) for m in messages[1:] if m["body"]]
+    assert decoded[:3] == [b'{"n": 0}\n', b'{"n": 1}\n', b'{"n": 2}\n']
+
+
+def test_docs_are_served_precompressed():
+    """OpenAPI schema is rendered once and served from the store"""
+    store = PrecompressedResponses()
+    asyncio.run(store.build(app.router, ["/openapi.json", "/docs"], level=6))
+    assert set(store.responses) == {"/openapi.json", "/docs"}
+
+    docs_app = CompressionMiddleware(app, store=store)
+    docs_client = TestClient(docs_app)
+    response = docs_client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["info"]["title"] == app.title
+
+    response = docs_client.get("/openapi.json", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == app.openapi()
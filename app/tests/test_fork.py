@@ -0,0 +1,131 @@
+"""Test cases for session forks and shared message threads"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schemas.chat import ChatMessage, MessageRole
+from app.services.archive import SessionArchive
+from app.services.chat_service import ChatService
+from app.services.message_store import MAX_FORK_DEPTH, MessageThread
+
+client = TestClient(app)
+
+
+def message(i: int) -> ChatMessage:
+    return ChatMessage(id=f"m{i}", role=MessageRole.USER, content=f"turn {i}")
+
+
+def test_fork_shares_prefix_and_keeps_tails_apart():
+    """Appends after a fork are visible only on their own branch"""
+    parent = MessageThread(message(i) for i in range(5))
+    fork = parent.fork(3)
+    fork.append(message(10))
+    parent.append(message(5))
+
+    assert [m.id for m in fork] == ["m0", "m1", "m2", "m10"]
+    assert [m.id for m in parent] == [f"m{i}" for i in range(6)]
+    assert fork[1] is parent[1]
+    assert fork.own == [fork[-1]]
+    assert fork[-2:] == [parent[2], fork[3]]
+    assert fork.position("m2") == 2
+    assert fork.position("m4") is None
+    assert parent.position("m10") is None
+
+
+def test_nested_forks_stay_shallow():
+    """Forking inside a shared prefix points at the owner; deep chains are flattened"""
+    root = MessageThread(message(i) for i in range(3))
+    child = root.fork(3)
+    child.append(message(3))
+    assert child.fork(2).depth == 1
+
+    thread = root
+    for i in range(MAX_FORK_DEPTH + 5):
+        thread = thread.fork(len(thread))
+        thread.append(message(100 + i))
+    assert thread.depth <= MAX_FORK_DEPTH
+    assert len(thread) == 3 + MAX_FORK_DEPTH + 5
+
+
+def test_fork_endpoint():
+    """Forking at a message branches the conversation from there"""
+    session_id = client.post("/api/v1/chat/sessions", json={"title": "Trunk"}).json()["id"]
+    first = client.post("/api/v1/chat/", json={"message": "one", "session_id": session_id}).json()
+    client.post("/api/v1/chat/", json={"message": "two", "session_id": session_id})
+
+    response = client.post(f"/api/v1/chat/sessions/{session_id}/fork", params={"at": first["message_id"]})
+    assert response.status_code == 200
+    fork = response.json()
+    assert fork["forked_from"] == session_id
+    assert fork["message_count"] == 2
+    assert fork["title"] == "Trunk (fork)"
+
+    client.post("/api/v1/chat/", json={"message": "three", "session_id": fork["id"]})
+    forked = client.get(f"/api/v1/chat/sessions/{fork['id']}/messages").json()
+    trunk = client.get(f"/api/v1/chat/sessions/{session_id}/messages").json()
+    assert [m["content"] for m in forked[::2]] == ["one", "three"]
+    assert forked[:2] == trunk[:2]
+    assert len(trunk) == 4
+
+    assert client.post(f"/api/v1/chat/sessions/{session_id}/fork", params={"at": "nope"}).status_code == 404
+    assert client.post("/api/v1/chat/sessions/missing/fork").status_code == 404
+
+
+def test_shared_messages_outlive_a_deleted_parent():
+    """Inherited messages stay searchable and counted until the last fork is gone"""
+    async def scenario():
+        service = ChatService()
+        parent = await service.create_session(title="parent")
+        await service.process_message("zebra crossing", session_id=parent.id)
+        charged = service.stored_bytes
+        fork = await service.fork_session(parent.id)
+        nested = await service.fork_session(fork.id)
+        await service.process_message("zebra stripes", session_id=fork.id)
+
+        # Each turn stores the message and its echo
+        assert (await service.search_messages("crossing", session_id=nested.id))[0] == 2
+        assert (await service.search_messages("stripes", session_id=nested.id))[0] == 0
+
+        assert await service.delete_session(parent.id)
+        assert len(await service.get_session_messages(fork.id)) == 4
+        assert (await service.search_messages("zebra"))[0] == 4
+        total, matches = await service.search_messages("crossing", session_id=fork.id)
+        assert total == 2 and {match.session_id for match in matches} == {fork.id}
+        assert service.stored_bytes > charged
+
+        assert await service.delete_session(fork.id)
+        assert (await service.search_messages("crossing", session_id=nested.id))[0] == 2
+        assert service.stored_bytes == charged
+
+        assert await service.delete_session(nested.id)
+        assert service.stored_bytes == 0
+        assert len(service.search_index) == 0
+        assert not service.retired and not service.search_index.forks
+
+    asyncio.run(scenario())
+
+
+def test_deleting_an_archived_parent_keeps_shared_messages(tmp_path):
+    """An archived parent's shared messages are read back before its archive copy goes"""
+    async def scenario():
+        service = ChatService(archive=SessionArchive(str(tmp_path / "archive")))
+        parent = await service.create_session(title="parent")
+        await service.process_message("zebra crossing", session_id=parent.id)
+        fork = await service.fork_session(parent.id)
+        parent.updated_at = datetime.utcnow() - timedelta(days=1)
+        assert await service.archive_idle_sessions(idle_seconds=60) == 1
+
+        assert (await service.search_messages("crossing", session_id=fork.id))[0] == 2
+        assert await service.delete_session(parent.id)
+        total, matches = await service.search_messages("crossing", session_id=fork.id)
+        assert total == 2 and "zebra crossing" in [match.message.content for match in matches]
+        assert await service.get_session(parent.id) is None
+
+        assert await service.delete_session(fork.id)
+        assert service.stored_bytes == 0 and len(service.search_index) == 0
+        service.archive.close()
+
+    asyncio.run(scenario())
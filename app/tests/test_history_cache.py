@@ -0,0 +1,63 @@
+"""Test cases for speculative history prefetch"""
+
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.chat_service import ChatService
+
+client = TestClient(app)
+
+
+def test_history_is_served_from_cache_after_prefetch():
+    """Touching a session warms its history; generation then hits the cache"""
+    async def scenario():
+        service = ChatService()
+        session = await service.create_session(title="Warm")
+        await service.process_message("one", session_id=session.id)
+        
+        service.history_cache.clear()  # e.g. evicted, or another worker wrote it
+        service.prefetch_history(session.id)
+        await asyncio.sleep(0)
+        history = await service.get_history(session.id)
+        
+        await service.process_message("two", session_id=session.id)
+        return service, history
+    
+    service, history = asyncio.run(scenario())
+    assert [m.content for m in history][:1] == ["one"]
+    stats = service.history_cache_stats()
+    assert stats["misses"] == 0
+    assert stats["hits"] == 3
+    assert len(service.history_cache.get(next(iter(service.sessions)))) == 4
+
+
+def test_history_window_is_bounded(monkeypatch):
+    """The cached window keeps only the most recent messages"""
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "history_window", 3)
+    
+    async def scenario():
+        service = ChatService()
+        session = await service.create_session()
+        for i in range(3):
+            await service.process_message(f"m{i}", session_id=session.id)
+        return await service.get_history(session.id)
+    
+    history = asyncio.run(scenario())
+    assert len(history) == 3
+    assert history[-1].role == "assistant"
+
+
+def test_metrics_and_debug_endpoint(monkeypatch):
+    """Hit rates are exposed via /metrics and the debug endpoint"""
+    session_id = client.post("/api/v1/chat/sessions", json={}).json()["id"]
+    client.get(f"/api/v1/chat/sessions/{session_id}")
+    client.post("/api/v1/chat/", json={"message": "hi", "session_id": session_id})
+    
+    assert "history_cache_hits_total" in client.get("/metrics").text
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "admin_api_key", "admin-secret")
+    stats = client.get("/api/v1/debug/history-cache", headers={"X-Admin-Key": "admin-secret"}).json()
+    assert stats["hits"] >= 1
@@ -0,0 +1,96 @@
+"""Test cases for Idempotency-Key handling"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services.idempotency import IdempotencyConflictError, IdempotencyStore
+
+client = TestClient(app)
+
+
+def test_retried_message_is_not_processed_twice():
+    """A retry with the same key replays the response without new messages"""
+    session_id = client.post("/api/v1/chat/sessions", json={"title": "Retry"}).json()["id"]
+    body = {"message": "only once", "session_id": session_id}
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post("/api/v1/chat/", json=body, headers=headers)
+    second = client.post("/api/v1/chat/", json=body, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert second.json()["message_id"] == first.json()["message_id"]
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+    messages = client.get(f"/api/v1/chat/sessions/{session_id}/messages").json()
+    assert len(messages) == 2
+
+
+def test_key_reused_with_different_body_is_rejected():
+    """Reusing a key for another request is a client error"""
+    headers = {"Idempotency-Key": "reused-1"}
+    assert client.post("/api/v1/chat/sessions", json={"title": "A"}, headers=headers).status_code == 200
+    response = client.post("/api/v1/chat/sessions", json={"title": "B"}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_session_creation_replays_original_session():
+    """Retried session creation returns the first session as created"""
+    headers = {"Idempotency-Key": "session-1"}
+    first = client.post("/api/v1/chat/sessions", json={"title": "Once"}, headers=headers).json()
+    client.post("/api/v1/chat/", json={"message": "hi", "session_id": first["id"]})
+    second = client.post("/api/v1/chat/sessions", json={"title": "Once"}, headers=headers).json()
+    assert second == first
+
+
+def test_keys_are_scoped_by_tenant(monkeypatch):
+    """The same key from two tenants runs twice"""
+    monkeypatch.setattr(settings, "tenant_api_keys", {"tenant-a": "tenant-a", "tenant-b": "tenant-b"})
+    body = {"title": "Shared key"}
+    a = client.post("/api/v1/chat/sessions", json=body, headers={"Idempotency-Key": "k", "X-API-Key": "tenant-a"})
+    b = client.post("/api/v1/chat/sessions", json=body, headers={"Idempotency-Key": "k", "X-API-Key": "tenant-b"})
+    assert a.json()["id"] != b.json()["id"]
+
+
+def test_concurrent_duplicates_wait_for_the_first():
+    """Duplicates in flight share a single execution"""
+    store = IdempotencyStore()
+    calls = 0
+
+    async def operation():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(store.run("key", "fp", operation) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert calls == 1
+    assert [r for r, _ in results] == ["result"] * 5
+    assert sorted(replayed for _, replayed in results) == [False] + [True] * 4
+
+
+def test_failures_are_not_remembered():
+    """A failed attempt does not poison the key"""
+    store = IdempotencyStore()
+    attempts = []
+
+    async def operation():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("provider timeout")
+        return "ok"
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await store.run("key", "fp", operation)
+        return await store.run("key", "fp", operation)
+
+    assert asyncio.run(scenario()) == ("ok", False)
+    with pytest.raises(IdempotencyConflictError):
+        asyncio.run(store.run("key", "other", operation))
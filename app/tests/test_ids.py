@@ -0,0 +1,18 @@
+"""Test cases for hot-path id generation"""
+
+import uuid
+
+from app.utils.ids import uuid7
+
+
+def test_uuid7_is_version_7_and_time_ordered():
+    """Ids parse as RFC 9562 v7 UUIDs and sort in creation order"""
+    ids = [uuid7() for _ in range(5000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    for value in ids[:50]:
+        parsed = uuid.UUID(value)
+        assert str(parsed) == value
+        assert parsed.version == 7
+        assert parsed.variant == uuid.RFC_4122
+
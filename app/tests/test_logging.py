@@ -0,0 +1,67 @@
+"""Test cases for the structured logging pipeline"""
+
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+from app.core.context import request_id_var, session_id_var
+from app.main import app
+from app.utils.logger import ContextFilter, JSONFormatter, SamplingFilter
+
+client = TestClient(app)
+
+
+def _record(level=logging.INFO, msg="hello", **extra) -> logging.LogRecord:
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, (), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_context_and_extras():
+    """Records carry request/session ids and extra fields as JSON"""
+    request_token = request_id_var.set("req-1")
+    session_token = session_id_var.set("sess-1")
+    try:
+        record = _record(status=200)
+        ContextFilter().filter(record)
+    finally:
+        request_id_var.reset(request_token)
+        session_id_var.reset(session_token)
+
+    payload = json.loads(JSONFormatter().format(record))
+    assert payload["message"] == "hello"
+    assert payload["request_id"] == "req-1"
+    assert payload["session_id"] == "sess-1"
+    assert payload["status"] == 200
+
+
+def test_sampling_filter_only_drops_debug():
+    """Sampling never drops INFO and above, and is stable per request"""
+    sampler = SamplingFilter(rate=0.0)
+    assert sampler.filter(_record(logging.INFO))
+    assert not sampler.filter(_record(logging.DEBUG))
+
+    sampler = SamplingFilter(rate=0.5)
+    decisions = {sampler.filter(_record(logging.DEBUG, request_id="abc")) for _ in range(20)}
+    assert len(decisions) == 1
+
+
+def test_request_id_header_is_echoed():
+    """Responses carry the incoming or generated request id"""
+    response = client.get("/health", headers={"X-Request-ID": "my-request"})
+    assert response.headers["x-request-id"] == "my-request"
+
+    response = client.get("/health")
+    assert response.headers["x-request-id"]
+
+
+def test_logging_is_configured_by_the_lifespan_only():
+    """Shutdown stops the writer thread and leaves no queue handler behind"""
+    from app.utils import logger as logger_module
+
+    logger_module.configure_logging()
+    assert logger_module._listener is not None
+    logger_module.shutdown_logging()
+    assert logger_module._listener is None
+    assert logging.getLogger("app").handlers == []
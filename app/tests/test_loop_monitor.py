@@ -0,0 +1,74 @@
+"""Test cases for the event-loop blocking detector"""
+
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.utils.loop_monitor import LoopMonitor
+
+client = TestClient(app)
+
+
+def blocking_handler():
+    time.sleep(0.15)
+
+
+def test_blocking_call_is_attributed_to_route_and_stack():
+    """A synchronous sleep inside a request task is recorded with its route"""
+    monitor = LoopMonitor(threshold_ms=50, heartbeat_ms=10)
+    scope = {"type": "http", "method": "POST", "path": "/api/v1/chat/"}
+
+    async def request():
+        token = monitor.track(scope)
+        try:
+            blocking_handler()
+        finally:
+            monitor.untrack(token)
+
+    async def scenario():
+        await monitor.start()
+        await asyncio.sleep(0.03)
+        await asyncio.create_task(request())
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+    assert len(monitor.events) == 1
+    event = monitor.events[0].to_dict()
+    assert event["route"] == "POST /api/v1/chat/"
+    assert event["duration_ms"] >= 100
+    assert any("blocking_handler" in frame for frame in event["stack"])
+    assert monitor.max_lag_ms >= 100
+    assert not monitor.requests
+
+
+def test_short_steps_are_not_recorded():
+    """Awaiting does not count as blocking"""
+    monitor = LoopMonitor(threshold_ms=50, heartbeat_ms=10)
+
+    async def scenario():
+        await monitor.start()
+        await asyncio.sleep(0.15)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+    assert not monitor.events
+    assert monitor.lag_ms < 50
+
+
+def test_debug_endpoint_reports_lag(monkeypatch):
+    """Snapshot is exposed under /debug/event-loop, to admins only"""
+    monkeypatch.setattr(settings, "admin_api_key", "admin-secret")
+    assert client.get("/api/v1/debug/event-loop").status_code == 401
+    headers = {"X-Admin-Key": "admin-secret"}
+    response = client.get("/api/v1/debug/event-loop", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert {"enabled", "threshold_ms", "lag_ms", "max_lag_ms", "events"} <= set(body)
+    assert client.delete("/api/v1/debug/event-loop", headers=headers).status_code == 200
+
+    monkeypatch.setattr(settings, "admin_api_key", None)
+    assert client.get("/api/v1/debug/event-loop").status_code == 404
@@ -0,0 +1,181 @@
+"""Test cases for the MCP client against the local stub server"""
+
+import asyncio
+import os
+import sys
+import time
+from typing import List, Optional
+
+import pytest
+
+from app.core.config import MCPServerSettings
+from app.schemas.chat import ChatMessage, MessageRole
+from app.services.chat_service import ChatService
+from app.services.mcp_client import MCPClient, ToolCall
+from app.services.provider_router import Provider, ProviderRouter
+
+STUB_COMMAND = [sys.executable, "-m", "app.tests.mcp_stub_server"]
+
+
+def _client(**kwargs) -> MCPClient:
+    server = MCPServerSettings(name="stub", command=STUB_COMMAND, **kwargs)
+    return MCPClient(servers=[server], pool_size=2, tool_timeout=5.0)
+
+
+def _run(coro_factory):
+    async def scenario():
+        client = _client()
+        try:
+            return await coro_factory(client)
+        finally:
+            await client.close()
+    return asyncio.run(scenario())
+
+
+def test_tool_schemas_are_cached_per_server():
+    """tools/list is sent once, however many calls follow"""
+    async def scenario(client):
+        first = await client.list_tools()
+        await client.call_tools([ToolCall("stub", "echo", {"text": "a"})])
+        second = await client.list_tools()
+        assert {tool["name"] for tool in first["stub"]} >= {"echo", "add", "sleep"}
+        assert first == second
+        return client.pools["stub"].tools
+    
+    assert "echo" in _run(scenario)
+
+
+def test_independent_calls_run_concurrently():
+    """Three 0.3s calls complete in about 0.3s, not 0.9s"""
+    async def scenario(client):
+        await client.list_tools()  # exclude process start-up from the timing
+        start = time.perf_counter()
+        results = await client.call_tools([
+            ToolCall("stub", "sleep", {"seconds": 0.3}) for _ in range(3)
+        ])
+        return time.perf_counter() - start, results
+    
+    elapsed, results = _run(scenario)
+    assert all(not r.is_error for r in results)
+    assert elapsed < 0.75
+
+
+def test_per_tool_timeout_and_errors():
+    """A slow tool times out without failing the other calls"""
+    async def scenario(client):
+        return await client.call_tools([
+            ToolCall("stub", "sleep", {"seconds": 2}, timeout=0.1),
+            ToolCall("stub", "add", {"a": 1, "b": 2}),
+            ToolCall("stub", "fail"),
+            ToolCall("stub", "missing"),
+            ToolCall("nowhere", "echo"),
+        ])
+    
+    timed_out, added, failed, missing, unknown_server = _run(scenario)
+    assert timed_out.error == "timeout"
+    assert added.content[0]["text"] == "3" and not added.is_error
+    assert failed.is_error
+    assert "Unknown tool" in missing.error
+    assert "Unknown MCP server" in unknown_server.error
+
+
+def test_requested_timeout_cannot_exceed_the_configured_one():
+    """A call asking for more time than its tool is configured with still times out"""
+    async def scenario():
+        client = _client(tool_timeouts={"sleep": 0.1})
+        try:
+            return await client.call_tool(ToolCall("stub", "sleep", {"seconds": 1}, timeout=60))
+        finally:
+            await client.close()
+
+    assert asyncio.run(scenario()).error == "timeout"
+
+
+def test_failed_handshake_stops_the_server_process(tmp_path):
+    """A server that never answers initialize is terminated, not leaked"""
+    pid_file = tmp_path / "pid"
+    silent = [
+        sys.executable, "-c",
+        f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); time.sleep(30)",
+    ]
+
+    async def scenario():
+        client = MCPClient(servers=[MCPServerSettings(name="silent", command=silent)], tool_timeout=0.5)
+        try:
+            result = await client.call_tool(ToolCall("silent", "echo"))
+            return result, client.pools["silent"].connections
+        finally:
+            await client.close()
+
+    result, connections = asyncio.run(scenario())
+    assert result.error == "timeout"
+    assert connections == []
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+
+def test_idempotent_results_are_memoized():
+    """Annotated idempotent tools are served from cache; others are not"""
+    async def scenario(client):
+        first = await client.call_tool(ToolCall("stub", "add", {"a": 2, "b": 2}))
+        second = await client.call_tool(ToolCall("stub", "add", {"b": 2, "a": 2}))
+        counter_a = await client.call_tool(ToolCall("stub", "counter"))
+        counter_b = await client.call_tool(ToolCall("stub", "counter"))
+        return first, second, counter_a, counter_b
+    
+    first, second, counter_a, counter_b = _run(scenario)
+    assert not first.cached and second.cached
+    assert second.content == first.content
+    assert not counter_b.cached
+    assert counter_a.content != counter_b.content
+
+
+class RecordingProvider(Provider):
+    """Provider that keeps the conversations it was asked to continue"""
+
+    name = "recording"
+
+    def __init__(self):
+        self.histories: List[List[ChatMessage]] = []
+
+    async def generate(self, message: str, history: List[ChatMessage], api_key: Optional[str] = None) -> str:
+        self.histories.append(history)
+        return "It is 5."
+
+
+def test_memoized_results_are_not_shared_across_tenants():
+    """One tenant's cached tool output is never served to another"""
+    async def scenario(client):
+        call = ToolCall("stub", "echo", {"text": "private"})
+        first = await client.call_tool(call, tenant_id="acme")
+        again = await client.call_tool(call, tenant_id="acme")
+        other = await client.call_tool(call, tenant_id="globex")
+        return first, again, other
+
+    first, again, other = _run(scenario)
+    assert not first.cached and again.cached
+    assert not other.cached
+
+
+def test_chat_turn_runs_requested_tools():
+    """Tool calls in the message context run, and the provider sees their results"""
+    provider = RecordingProvider()
+
+    async def scenario(client):
+        router = ProviderRouter()
+        router.register(provider)
+        service = ChatService(router=router, mcp=client)
+        return await service.process_message(
+            "What is 2 + 3?",
+            context={"tool_calls": [{"server": "stub", "name": "add", "arguments": {"a": 2, "b": 3}}]}
+        )
+    
+    response = _run(scenario)
+    tool_results = response.metadata["tool_results"]
+    assert tool_results[0]["content"][0]["text"] == "5"
+    assert response.message == "It is 5."
+
+    *_, tools, prompt = provider.histories[0]
+    assert tools.role == MessageRole.SYSTEM
+    assert tools.content == "Tool stub/add returned:\n5"
+    assert prompt.role == MessageRole.USER and prompt.content == "What is 2 + 3?"
@@ -0,0 +1,138 @@
+"""Test cases for overload protection"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services.chat_service import ChatService
+from app.services.overload import OverloadController, overload
+from app.utils.loop_monitor import LoopMonitor
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def pressure():
+    """Set the controller's event-loop lag to a fraction of its threshold"""
+    saved = overload.loop_lag_ms
+
+    def set_pressure(value: float) -> None:
+        overload.loop_lag_ms = value * overload.lag_threshold_ms
+
+    yield set_pressure
+    overload.loop_lag_ms = saved
+
+
+def test_readiness_follows_load(pressure):
+    """Readiness fails only while shedding; /health stays a liveness check"""
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["level"] == "normal"
+
+    pressure(0.8)
+    assert client.get("/health/ready").json()["level"] == "degraded"
+
+    pressure(1.5)
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "overloaded"
+    assert client.get("/health").json() == {"status": "healthy"}
+
+
+def test_session_list_is_served_stale_or_shed(pressure, monkeypatch):
+    """Listing falls back to the last result, then to 503"""
+    monkeypatch.setattr(settings, "tenant_api_keys", {"overload-list": "overload-list"})
+    headers = {"X-API-Key": "overload-list"}
+    pressure(1.5)
+    response = client.get("/api/v1/chat/sessions", headers=headers)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+    pressure(0.0)
+    fresh = client.get("/api/v1/chat/sessions", headers=headers)
+    assert fresh.status_code == 200 and "x-degraded" not in fresh.headers
+
+    pressure(1.5)
+    stale = client.get("/api/v1/chat/sessions", headers=headers)
+    assert stale.status_code == 200
+    assert stale.headers["x-degraded"] == "stale"
+    assert stale.json() == fresh.json()
+
+
+def test_message_reads_use_history_cache_when_shedding(pressure):
+    """Cached sessions are still answered; others are shed"""
+    session_id = client.post("/api/v1/chat/sessions", json={"title": "Shed"}).json()["id"]
+    client.post("/api/v1/chat/", json={"message": "hello", "session_id": session_id})
+
+    pressure(1.5)
+    response = client.get(f"/api/v1/chat/sessions/{session_id}/messages")
+    assert response.status_code == 200
+    assert response.headers["x-degraded"] == "cached"
+    assert len(response.json()) == 2
+
+    response = client.get("/api/v1/chat/sessions/not-a-session/messages")
+    assert response.status_code == 503
+
+
+def test_history_window_shrinks_when_degraded(pressure):
+    """Generation uses a shorter history under pressure"""
+    async def scenario():
+        service = ChatService()
+        session = await service.create_session(title="Long")
+        for i in range(20):
+            await service.process_message(f"turn {i}", session_id=session.id)
+        normal = await service.get_history(session.id)
+        pressure(0.8)
+        degraded = await service.get_history(session.id)
+        return normal, degraded
+
+    normal, degraded = asyncio.run(scenario())
+    assert len(normal) == 40
+    assert len(degraded) == 10
+    assert degraded == normal[-10:]
+
+
+def test_lag_comes_from_the_loop_monitor():
+    """The controller follows the monitor's heartbeat instead of sampling itself"""
+    monitor = LoopMonitor(heartbeat_ms=10)
+    controller = OverloadController(lag_threshold_ms=50, alpha=1.0, monitor=monitor)
+
+    async def scenario():
+        await monitor.start(detect_blocking=False)
+        await controller.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.08)  # block the loop
+        await asyncio.sleep(0.005)
+        lag_ms = controller.loop_lag_ms
+        await controller.stop()
+        await monitor.stop()
+        return lag_ms
+
+    assert asyncio.run(scenario()) >= 50
+    assert controller.level() == controller.SHEDDING
+    assert not monitor.enabled and not monitor.events
+
+
+def test_admission_queue_hands_off_and_times_out():
+    """Waiters get freed slots in order; the rest give up after the timeout"""
+    controller = OverloadController(max_in_flight=1, queue_timeout=0.05)
+
+    async def scenario():
+        assert await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0.01)
+        controller.release()
+        handed_off = await waiter
+        timed_out = await controller.acquire()
+        controller.release()
+        return handed_off, timed_out
+
+    handed_off, timed_out = asyncio.run(scenario())
+    assert handed_off is True
+    assert timed_out is False
+    assert controller.in_flight == 0
+    assert controller.queue_wait_ms > 0
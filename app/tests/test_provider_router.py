@@ -0,0 +1,187 @@
+"""Test cases for latency-aware provider routing with local fake providers"""
+
+import asyncio
+import time
+from typing import List, Optional
+
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.context import tenant_id_var
+from app.db import Base
+from app.models.api_key import APIKey
+from app.schemas.api_key import APIKeyCreate
+from app.schemas.chat import ChatMessage
+from app.services.api_key_service import api_key_service
+from app.services.provider_router import (
+    CircuitBreaker,
+    Provider,
+    ProviderError,
+    ProviderRouter,
+    provider_router
+)
+
+
+class FakeProvider(Provider):
+    """Provider with injected latency and failures"""
+    
+    def __init__(self, name: str, latency: float, fail: bool = False):
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+    
+    async def generate(
+        self,
+        message: str,
+        history: List[ChatMessage],
+        api_key: Optional[str] = None
+    ) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return f"{self.name}: {message}"
+
+
+def _router(*providers: Provider, **kwargs) -> ProviderRouter:
+    router = ProviderRouter(hedge_min_delay=0.01, **kwargs)
+    for provider in providers:
+        router.register(provider)
+    return router
+
+
+def test_routes_to_fastest_provider():
+    """After every backend has been sampled, traffic goes to the fastest"""
+    async def scenario():
+        slow, fast = FakeProvider("slow", 0.03), FakeProvider("fast", 0.005)
+        router = _router(slow, fast)
+        for _ in range(2):
+            await router.generate("warm up", [])
+        results = [await router.generate("hi", []) for _ in range(5)]
+        return results
+    
+    results = asyncio.run(scenario())
+    assert all(name == "fast" for _, name in results)
+
+
+def test_slow_request_is_hedged():
+    """A primary stuck beyond its p95 triggers a backup that wins"""
+    async def scenario():
+        primary, backup = FakeProvider("primary", 0.01), FakeProvider("backup", 0.05)
+        router = _router(primary, backup)
+        for _ in range(6):
+            await router.generate("warm up", [])
+        primary.latency = 1.0  # sudden stall
+        start = time.perf_counter()
+        _, name = await router.generate("hi", [])
+        return name, time.perf_counter() - start, router.hedged_requests
+    
+    name, elapsed, hedged = asyncio.run(scenario())
+    assert name == "backup"
+    assert elapsed < 0.5
+    assert hedged == 1
+
+
+def test_failover_and_circuit_breaker():
+    """Failing providers fail over, then are skipped once the breaker opens"""
+    async def scenario():
+        broken, healthy = FakeProvider("broken", 0.0, fail=True), FakeProvider("healthy", 0.02)
+        router = _router(broken, healthy, failure_threshold=2, reset_timeout=60)
+        names = [(await router.generate("hi", []))[1] for _ in range(4)]
+        return names, broken.calls, router.backends["broken"].breaker.state
+    
+    names, broken_calls, state = asyncio.run(scenario())
+    assert names == ["healthy"] * 4
+    assert broken_calls == 2
+    assert state == CircuitBreaker.OPEN
+
+
+def test_all_providers_failing_raises():
+    """ProviderError is raised when nothing can answer"""
+    async def scenario():
+        router = _router(FakeProvider("a", 0.0, fail=True), FakeProvider("b", 0.0, fail=True))
+        await router.generate("hi", [])
+    
+    with pytest.raises(ProviderError):
+        asyncio.run(scenario())
+
+
+def test_configured_http_providers_are_registered_and_called():
+    """PROVIDERS entries become routable providers speaking each vendor's API"""
+    import json
+
+    import httpx
+
+    from app.core.config import ProviderSettings
+    from app.schemas.chat import MessageRole
+    from app.services.providers import register_providers
+
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path.endswith("/chat/completions"):
+            return httpx.Response(200, json={"choices": [{"message": {"content": "from openai"}}]})
+        return httpx.Response(200, json={"content": [{"type": "text", "text": "from anthropic"}]})
+
+    async def scenario():
+        router = ProviderRouter()
+        names = register_providers(router, [
+            ProviderSettings(name="openai", model="m1", api_key="k1"),
+            ProviderSettings(name="anthropic", kind="anthropic", model="m2"),
+        ])
+        assert names == ["openai", "anthropic"] and router.has_providers()
+        for backend in router.backends.values():
+            backend.provider.client = httpx.AsyncClient(
+                transport=httpx.MockTransport(handler), base_url=str(backend.provider.client.base_url)
+            )
+        history = [
+            ChatMessage(role=MessageRole.SYSTEM, content="Summary"),
+            ChatMessage(role=MessageRole.USER, content="Hi"),
+        ]
+        openai, anthropic = router.backends["openai"].provider, router.backends["anthropic"].provider
+        assert await openai.generate("Hi", history) == "from openai"
+        assert await anthropic.generate("Hi", history, api_key="stored") == "from anthropic"
+        with pytest.raises(ProviderError):
+            await anthropic.generate("Hi", history)  # no stored key and no fallback
+        await router.close()
+        assert not router.has_providers()
+
+    asyncio.run(scenario())
+    openai_request, anthropic_request = requests
+    assert openai_request.headers["authorization"] == "Bearer k1"
+    assert [m["role"] for m in json.loads(openai_request.content)["messages"]] == ["system", "user"]
+    body = json.loads(anthropic_request.content)
+    assert anthropic_request.headers["x-api-key"] == "stored"
+    assert body["system"] == "Summary" and body["messages"] == [{"role": "user", "content": "Hi"}]
+
+
+def test_cached_keys_are_invalidated_by_key_writes(monkeypatch):
+    """A deactivated, replaced or deleted key is not served from the resolver cache"""
+    # The resolver loads keys in a worker thread
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[APIKey.__table__])
+    db = sessionmaker(bind=engine)()
+    resolver = provider_router.key_resolver
+    monkeypatch.setattr(resolver, "_load", lambda tenant_id, name: api_key_service.get_decrypted_key(db, name, tenant_id))
+
+    async def resolve() -> Optional[str]:
+        tenant_id_var.set("rotating")
+        return await resolver("openai")
+
+    assert asyncio.run(resolve()) is None
+    api_key_service.create_or_update_key(db, APIKeyCreate(name="openai", key="sk-first-123456"), "rotating")
+    assert asyncio.run(resolve()) == "sk-first-123456"
+
+    api_key_service.create_or_update_key(db, APIKeyCreate(name="openai", key="sk-second-12345"), "rotating")
+    assert asyncio.run(resolve()) == "sk-second-12345"
+    api_key_service.update_key_status(db, "openai", False, "rotating")
+    assert asyncio.run(resolve()) is None
+    api_key_service.update_key_status(db, "openai", True, "rotating")
+    assert asyncio.run(resolve()) == "sk-second-12345"
+    api_key_service.delete_key(db, "openai", "rotating")
+    assert asyncio.run(resolve()) is None
@@ -0,0 +1,117 @@
+"""Test cases for real-time session updates"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.main import app
+from app.services.pubsub import EventBus, RedisBackend, SlowConsumerError
+
+client = TestClient(app)
+
+
+def test_websocket_receives_new_messages():
+    """Subscribers get the session snapshot, then each new message"""
+    session_id = client.post("/api/v1/chat/sessions", json={"title": "Live"}).json()["id"]
+    
+    with client.websocket_connect(f"/api/v1/chat/sessions/{session_id}/ws") as websocket:
+        snapshot = websocket.receive_json()
+        assert snapshot["type"] == "session"
+        assert snapshot["session"]["id"] == session_id
+        
+        client.post("/api/v1/chat/", json={"message": "Ping", "session_id": session_id})
+        
+        user_event = websocket.receive_json()
+        assert user_event["type"] == "message"
+        assert user_event["message"]["role"] == "user"
+        assert user_event["message"]["content"] == "Ping"
+        assert websocket.receive_json()["message"]["role"] == "assistant"
+        
+        update = websocket.receive_json()
+        assert update["type"] == "session"
+        assert update["session"]["message_count"] == 2
+        
+        client.delete(f"/api/v1/chat/sessions/{session_id}")
+        assert websocket.receive_json()["type"] == "session_deleted"
+
+
+def test_websocket_unknown_session_is_rejected():
+    """Connecting to a missing session is refused"""
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/v1/chat/sessions/missing/ws") as websocket:
+            websocket.receive_json()
+
+
+def test_slow_consumer_is_dropped():
+    """A subscriber whose buffer overflows is dropped without blocking publishers"""
+    async def scenario():
+        bus = EventBus(buffer_size=2)
+        slow = bus.subscribe("topic")
+        fast = bus.subscribe("topic", maxsize=10)
+        for i in range(3):
+            bus.publish("topic", {"n": i})
+        
+        assert slow.dropped
+        assert bus._subscribers["topic"] == {fast}
+        with pytest.raises(SlowConsumerError):
+            await slow.__anext__()
+        assert [(await fast.__anext__())["n"] for _ in range(3)] == [0, 1, 2]
+    
+    asyncio.run(scenario())
+
+
+class FakePubSub:
+    """Redis pub/sub stand-in: replays scripted messages, then fails or idles"""
+
+    def __init__(self, messages, fail):
+        self.messages = messages
+        self.fail = fail
+        self.patterns = []
+        self.closed = False
+
+    async def psubscribe(self, pattern):
+        self.patterns.append(pattern)
+
+    async def listen(self):
+        for message in self.messages:
+            yield message
+        if self.fail:
+            raise ConnectionError("Connection reset by peer")
+        await asyncio.Event().wait()
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeRedis:
+    def __init__(self, *pubsubs):
+        self.pubsubs = list(pubsubs)
+
+    def pubsub(self):
+        return self.pubsubs.pop(0)
+
+
+def test_redis_reader_resubscribes_after_a_disconnect():
+    """A dropped broker connection is retried instead of silently ending delivery"""
+    def message(n):
+        return {"type": "pmessage", "channel": b"chat-events:topic", "data": f'{{"n": {n}}}'}
+
+    async def scenario():
+        first = FakePubSub([message(1)], fail=True)
+        second = FakePubSub([{"type": "psubscribe"}, message(2)], fail=False)
+        backend = RedisBackend("redis://test", retry_initial=0.01)
+        backend._client = FakeRedis(second)
+        backend._pubsub = first
+        received = []
+        reader = asyncio.create_task(backend._read(lambda topic, event: received.append((topic, event["n"]))))
+        while len(received) < 2:
+            await asyncio.sleep(0.005)
+        reader.cancel()
+
+        assert received == [("topic", 1), ("topic", 2)]
+        assert first.closed
+        assert second.patterns == ["chat-events:*"]
+
+    asyncio.run(scenario())
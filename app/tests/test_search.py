@@ -0,0 +1,79 @@
+"""Test cases for full-text message search"""
+
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schemas.chat import ChatMessage, MessageRole
+from app.services.search_index import SearchIndex
+
+client = TestClient(app)
+
+
+def _message(content: str, minutes_ago: int = 0) -> ChatMessage:
+    return ChatMessage(
+        id=content,
+        role=MessageRole.USER,
+        content=content,
+        timestamp=datetime.utcnow() - timedelta(minutes=minutes_ago)
+    )
+
+
+def test_index_ranks_and_filters():
+    """All terms must match; results are ranked, filtered and paginated"""
+    index = SearchIndex()
+    index.add("a", _message("deploy the fastapi service", minutes_ago=60))
+    index.add("a", _message("fastapi fastapi routing and deploy"))
+    index.add("b", _message("deploy with docker"))
+    
+    total, matches = index.search("deploy fastapi")
+    assert total == 2
+    assert matches[0].message.content == "fastapi fastapi routing and deploy"
+    
+    total, matches = index.search("deploy", session_id="b")
+    assert total == 1 and matches[0].session_id == "b"
+    
+    total, _ = index.search("deploy", since=datetime.utcnow() - timedelta(minutes=5))
+    assert total == 2
+    
+    total, matches = index.search("deploy", limit=1, offset=2)
+    assert total == 3 and len(matches) == 1
+    
+    index.remove_session("a")
+    assert index.search("fastapi") == (0, [])
+    assert len(index) == 1
+
+
+def test_removing_an_archived_session_only_touches_its_postings():
+    """Detached documents are unposted by their own terms, not by a full sweep"""
+    index = SearchIndex()
+    index.add("archived", _message("zebra crossing ahead"))
+    index.add("archived", _message("zebra stripes"))
+    index.add("hot", _message("crossing the river"))
+    index.detach_session("archived")
+    assert index.attached == 1
+
+    swept = []
+    unpost = index._unpost
+    index._unpost = lambda token, doc: swept.append(token) or unpost(token, doc)
+    index.remove_session("archived")
+
+    assert sorted(swept) == ["ahead", "crossing", "stripes", "zebra", "zebra"]
+    assert set(index.postings) == {"crossing", "the", "river"}
+    assert index.attached == 1 and len(index) == 1
+
+
+def test_search_endpoint():
+    """Messages sent through the API are searchable"""
+    session_id = client.post("/api/v1/chat/sessions", json={"title": "Search"}).json()["id"]
+    client.post("/api/v1/chat/", json={"message": "Where is the zebracorn manual?", "session_id": session_id})
+    
+    response = client.get("/api/v1/chat/search", params={"q": "zebracorn manual"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] >= 2  # user message and echoed reply
+    assert {hit["session_id"] for hit in data["hits"]} == {session_id}
+    
+    response = client.get("/api/v1/chat/search", params={"q": "zebracorn", "session_id": "other"})
+    assert response.json()["total"] == 0
@@ -0,0 +1,152 @@
+"""Test cases for the semantic response cache"""
+
+import asyncio
+from typing import List, Optional
+
+from app.schemas.chat import ChatMessage
+from app.services.chat_service import ChatService
+from app.services.embeddings import HashingEmbedder
+from app.services.provider_router import Provider, ProviderRouter
+from app.services.semantic_cache import SemanticCache
+from app.services.vector_index import VectorIndex
+
+
+class CountingProvider(Provider):
+    """Provider whose replies say how many times it was called"""
+
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, message: str, history: List[ChatMessage], api_key: Optional[str] = None) -> str:
+        self.calls += 1
+        return f"reply {self.calls} to {message}"
+
+
+def _service(provider: Provider, tenant_id: str = "semantic") -> ChatService:
+    router = ProviderRouter()
+    router.register(provider)
+    return ChatService(router=router, tenant_id=tenant_id)
+
+
+def test_index_switches_to_lsh_and_still_finds_neighbours():
+    """Past the threshold, lookups go through LSH buckets"""
+    embedder = HashingEmbedder(dimensions=128)
+    index = VectorIndex(128, ann_threshold=50)
+    for i in range(300):
+        index.add(i, embedder.embed(f"question number {i} about topic {i * 7}"))
+    assert index.approximate
+
+    key, score = index.search(embedder.embed("question number 42 about topic 294?"))[0]
+    assert key == 42 and score > 0.9
+
+    index.remove(42)
+    assert 42 not in index
+    assert all(key != 42 for key, _ in index.search(embedder.embed("question number 42 about topic 294"), k=5))
+
+
+def test_index_keeps_buckets_current_and_draws_planes_lazily():
+    """An unused index has no hyperplanes; crossing the threshold does not rebuild"""
+    embedder = HashingEmbedder(dimensions=128)
+    index = VectorIndex(128, ann_threshold=10)
+    assert index._planes is None
+
+    for i in range(10):
+        index.add(i, embedder.embed(f"entry {i}"))
+    assert not index.approximate
+    assert sum(len(members) for members in index._buckets[0].values()) == 10
+
+    index.add(10, embedder.embed("entry 10"))
+    assert index.approximate
+    assert index.search(embedder.embed("entry 10"))[0][0] == 10
+
+
+def test_cache_evicts_least_recently_used():
+    embedder = HashingEmbedder()
+    cache = SemanticCache(embedder, maxsize=2)
+    vectors = {text: embedder.embed(text) for text in ("alpha beta", "gamma delta", "epsilon zeta")}
+    cache.add("alpha beta", "1", vectors["alpha beta"])
+    cache.add("gamma delta", "2", vectors["gamma delta"])
+    assert cache.lookup(vectors["alpha beta"]) is not None
+    cache.add("epsilon zeta", "3", vectors["epsilon zeta"])
+
+    assert cache.lookup(vectors["gamma delta"]) is None
+    assert cache.lookup(vectors["alpha beta"]).entry.reply == "1"
+    assert len(cache.index) == 2
+
+
+def test_similar_opening_prompts_are_served_from_cache():
+    """A reworded question in another session reuses the reply; follow-ups do not"""
+    provider = CountingProvider()
+    service = _service(provider)
+    service.semantic_cache.verify_rate = 0.0
+
+    async def scenario():
+        first = await service.process_message("How do I reset my password?")
+        second = await service.process_message("how do I reset my password")
+        follow_up = await service.process_message("and then what", session_id=second.session_id)
+        return first, second, follow_up
+
+    first, second, follow_up = asyncio.run(scenario())
+    assert second.message == first.message
+    assert follow_up.message == "reply 2 to and then what"
+    assert provider.calls == 2
+    assert service.semantic_cache.stats()["hits"] == 1
+
+    other_tenant = _service(provider, tenant_id="semantic-other")
+    asyncio.run(other_tenant.process_message("How do I reset my password?"))
+    assert provider.calls == 3
+
+
+def test_false_hits_are_counted_and_evicted():
+    """Re-asking right after a hit counts a false hit and drops the entry"""
+    provider = CountingProvider()
+    service = _service(provider)
+    cache = service.semantic_cache
+    cache.verify_rate = 0.0
+
+    async def reask():
+        await service.process_message("What are your opening hours?")
+        served = await service.process_message("What are your opening hours")
+        await service.process_message("what are your opening hours??", session_id=served.session_id)
+
+    asyncio.run(reask())
+    assert cache.false_hits == 1
+    assert len(cache) == 0
+
+
+class ScriptedProvider(Provider):
+    """Provider returning canned replies in order"""
+
+    name = "scripted"
+
+    def __init__(self, replies: List[str]):
+        self.replies = list(replies)
+
+    async def generate(self, message: str, history: List[ChatMessage], api_key: Optional[str] = None) -> str:
+        return self.replies.pop(0)
+
+
+def test_verification_tolerates_rewording():
+    """A reworded fresh reply confirms the hit; an unrelated one is a false hit"""
+    service = _service(ScriptedProvider([
+        "To reset your password, click 'Forgot password' on the login page, "
+        "enter your email address and follow the link we send you.",
+        "Go to the login page and choose 'Forgot password'. Enter your email "
+        "and we'll send a link you can use to set a new password.",
+        "Our office is open Monday to Friday from 9am to 5pm, and closed on public holidays.",
+    ]))
+    cache = service.semantic_cache
+    cache.verify_rate = 1.0
+
+    async def scenario():
+        await service.process_message("How do I reset my password?")
+        await service.process_message("How do I reset my password")
+        assert cache.verified == 1 and cache.false_hits == 0
+        return await service.process_message("how do I reset my password??")
+
+    verified = asyncio.run(scenario())
+    assert cache.verified == 2
+    assert cache.false_hits == 1
+    assert [entry.reply for entry in cache.entries.values()] == [verified.message]
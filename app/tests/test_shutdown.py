@@ -0,0 +1,174 @@
+"""Test cases for graceful shutdown"""
+
+import asyncio
+import signal
+import socket
+
+import httpx
+import pytest
+import uvicorn
+from fastapi.testclient import TestClient
+from starlette.responses import PlainTextResponse
+from starlette.websockets import WebSocketDisconnect
+
+from app.main import app
+from app.middleware.drain import DrainMiddleware
+from app.services.shutdown import ShutdownCoordinator, shutdown
+
+client = TestClient(app)
+
+
+def test_drain_finishes_in_flight_requests_and_refuses_new_ones():
+    """A request running when draining starts completes; later ones get 503"""
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            if scope["path"] == "/slow":
+                await release.wait()
+            await PlainTextResponse("done")(scope, receive, send)
+
+        coordinator = ShutdownCoordinator()
+        transport = httpx.ASGITransport(app=DrainMiddleware(slow_app, coordinator=coordinator))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            in_flight = asyncio.create_task(http.get("/slow"))
+            while coordinator.in_flight == 0:
+                await asyncio.sleep(0.001)
+            drain = asyncio.create_task(coordinator.drain(timeout=5))
+            await asyncio.sleep(0.01)
+
+            refused = await http.get("/other")
+            assert refused.status_code == 503
+            assert refused.headers["connection"] == "close"
+            assert (await http.get("/health")).status_code == 200
+            assert not drain.done()
+
+            release.set()
+            assert (await in_flight).text == "done"
+            assert await drain == 0
+
+    asyncio.run(scenario())
+
+
+def test_drain_gives_up_at_the_deadline():
+    """Work that outlives the deadline is reported, not waited for"""
+    async def scenario():
+        coordinator = ShutdownCoordinator()
+        stuck = asyncio.get_running_loop().create_future()
+        coordinator.track(stuck)
+        closed = []
+        coordinator.add_stream(lambda: closed.append(True))
+
+        assert await coordinator.drain(timeout=0.05) == 1
+        assert closed == [True]
+        stuck.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_readiness_and_websockets_while_draining():
+    """Readiness fails during a drain and session streams end with 1012"""
+    session_id = client.post("/api/v1/chat/sessions", json={"title": "Draining"}).json()["id"]
+    try:
+        with client.websocket_connect(f"/api/v1/chat/sessions/{session_id}/ws") as websocket:
+            assert websocket.receive_json()["type"] == "session"
+            shutdown.begin()
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                websocket.receive_json()
+            assert exc_info.value.code == 1012
+
+        ready = client.get("/health/ready")
+        assert ready.status_code == 503
+        assert ready.json()["status"] == "draining"
+        assert client.post("/api/v1/chat/sessions", json={}).status_code == 503
+    finally:
+        shutdown.reset()
+    assert client.get("/health/ready").status_code == 200
+
+
+def test_signal_drains_before_the_server_handler_runs():
+    """SIGTERM starts the drain; the replaced handler sees it once work is done"""
+    received = []
+    original = signal.signal(signal.SIGTERM, lambda sig, frame: received.append(sig))
+
+    async def scenario():
+        coordinator = ShutdownCoordinator()
+        assert coordinator.install_signal_handlers(timeout=5)
+        coordinator.enter()
+        signal.raise_signal(signal.SIGTERM)
+        await asyncio.sleep(0.01)
+        assert coordinator.draining
+        assert received == []
+
+        coordinator.exit()
+        await asyncio.sleep(0.01)
+        assert received == [signal.SIGTERM]
+
+        # A second signal is passed on without waiting
+        coordinator.enter()
+        signal.raise_signal(signal.SIGTERM)
+        await asyncio.sleep(0.01)
+        assert received == [signal.SIGTERM, signal.SIGTERM]
+        coordinator.uninstall_signal_handlers()
+
+    try:
+        asyncio.run(scenario())
+        signal.raise_signal(signal.SIGTERM)
+        assert len(received) == 3
+    finally:
+        signal.signal(signal.SIGTERM, original)
+
+
+def test_uvicorn_serves_the_drain_before_closing_its_listener():
+    """Under uvicorn, requests made after SIGTERM get the 503 over the network"""
+    received = []
+    original = signal.signal(signal.SIGTERM, lambda sig, frame: received.append(sig))
+
+    async def scenario():
+        coordinator = ShutdownCoordinator()
+        release = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            if scope["type"] == "lifespan":
+                await receive()
+                coordinator.install_signal_handlers(timeout=5)
+                await send({"type": "lifespan.startup.complete"})
+                await receive()
+                coordinator.uninstall_signal_handlers()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+            if scope["path"] == "/slow":
+                await release.wait()
+            await PlainTextResponse("done")(scope, receive, send)
+
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(
+            DrainMiddleware(slow_app, coordinator=coordinator), log_level="warning"
+        ))
+        serving = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as http:
+            in_flight = asyncio.create_task(http.get("/slow"))
+            while coordinator.in_flight == 0:
+                await asyncio.sleep(0.001)
+            signal.raise_signal(signal.SIGTERM)
+            await asyncio.sleep(0.05)
+
+            refused = await http.get("/other")
+            assert refused.status_code == 503
+            assert not server.should_exit
+
+            release.set()
+            assert (await in_flight).text == "done"
+        await asyncio.wait_for(serving, 5)
+
+    try:
+        asyncio.run(scenario())
+        # uvicorn re-raises the signal to the original handler once it stopped
+        assert received == [signal.SIGTERM]
+    finally:
+        signal.signal(signal.SIGTERM, original)
@@ -0,0 +1,58 @@
+"""Test cases for lazy startup and startup profiling"""
+
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def _run(code: str, **env) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, **env},
+        cwd=ROOT,
+    )
+
+
+def test_import_does_not_initialize_engine_or_encryption():
+    """Importing the app must not create the engine or the encryption service"""
+    result = _run(
+        "import app.main, app.db, app.utils.encryption as enc\n"
+        "assert app.db._engine is None\n"
+        "assert enc.get_encryption_service.cache_info().currsize == 0\n"
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_startup_profile_records_imports():
+    """STARTUP_PROFILE installs the import hook before the app is imported"""
+    result = _run(
+        "import app.main\n"
+        "from app.utils.startup import profiler\n"
+        "assert 'fastapi' in profiler.imports\n"
+        "with profiler.phase('init'):\n"
+        "    pass\n"
+        "print(profiler.report())\n",
+        STARTUP_PROFILE="1",
+    )
+    assert result.returncode == 0, result.stderr
+    assert "fastapi" in result.stdout
+    assert "init" in result.stdout
+
+
+def test_startup_profile_is_read_from_dotenv(tmp_path):
+    """Like every other setting, STARTUP_PROFILE can be set in .env"""
+    (tmp_path / ".env").write_text("DEBUG=false\nSTARTUP_PROFILE=true  # time imports\n")
+    env = {key: value for key, value in os.environ.items() if key != "STARTUP_PROFILE"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import app\nfrom app.utils.startup import profiler\nassert profiler.enabled\n"],
+        capture_output=True,
+        text=True,
+        env={**env, "PYTHONPATH": ROOT},
+        cwd=str(tmp_path),
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,244 @@
+"""Test cases for tenant isolation and quotas"""
+
+import asyncio
+from typing import List, Optional
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db import Base, shard_for_tenant, upgrade_api_keys
+from app.main import app
+from app.models.api_key import APIKey
+from app.schemas.api_key import APIKeyCreate
+from app.schemas.chat import ChatMessage
+from app.services.api_key_service import api_key_service
+from app.services.archive import SessionArchive
+from app.services.chat_service import ChatService, stored_size
+from app.services.provider_router import Provider, ProviderRouter
+from app.services.quotas import QuotaExceededError, TenantQuotas
+from app.services.tenants import Tenant, tenant_registry
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def tenant_keys(monkeypatch):
+    keys = {"alice-key": "alice", "bob-key": "bob", "limited-key": "limited", "small-key": "small"}
+    monkeypatch.setattr(settings, "tenant_api_keys", keys)
+
+
+def test_sessions_are_isolated_between_tenants():
+    """A tenant cannot see or read another tenant's sessions"""
+    alice = {"X-API-Key": "alice-key"}
+    bob = {"X-API-Key": "bob-key"}
+    session_id = client.post("/api/v1/chat/sessions", json={"title": "Alice"}, headers=alice).json()["id"]
+    client.post("/api/v1/chat/", json={"message": "secret plans", "session_id": session_id}, headers=alice)
+
+    assert client.get(f"/api/v1/chat/sessions/{session_id}", headers=alice).status_code == 200
+    assert client.get(f"/api/v1/chat/sessions/{session_id}", headers=bob).status_code == 404
+    assert session_id not in [s["id"] for s in client.get("/api/v1/chat/sessions", headers=bob).json()]
+    assert client.get("/api/v1/chat/search", params={"q": "secret"}, headers=bob).json()["total"] == 0
+    assert client.get("/api/v1/chat/search", params={"q": "secret"}, headers=alice).json()["total"] == 2  # message and its echo
+
+
+def test_unknown_keys_are_rejected():
+    """Only configured keys select a tenant; others cannot mint new ones"""
+    tenants = len(tenant_registry.tenants)
+    response = client.get("/api/v1/chat/sessions", headers={"X-API-Key": "made-up-key"})
+    assert response.status_code == 401
+    assert tenant_registry.resolve("made-up-key") is None
+    assert len(tenant_registry.tenants) == tenants
+    assert tenant_registry.resolve(None) == settings.default_tenant
+
+
+def test_idle_tenants_without_state_are_dropped():
+    """Idle tenants are dropped unless they still hold sessions or requests"""
+    quotas = TenantQuotas.for_tenant("idle")
+    tenant = tenant_registry.tenants["idle"] = Tenant("idle", quotas, ChatService(tenant_id="idle", quotas=quotas))
+    tenant.last_used -= settings.idempotency_ttl_s + 1
+    busy = tenant_registry.get("bob")
+    busy.last_used -= settings.idempotency_ttl_s + 1
+    tenant_registry.get(settings.default_tenant).last_used -= settings.idempotency_ttl_s + 1
+    busy.in_flight += 1
+    try:
+        assert tenant_registry.evict_idle(0) >= 1
+        assert "idle" not in tenant_registry.tenants
+        assert "bob" in tenant_registry.tenants
+        assert settings.default_tenant in tenant_registry.tenants
+    finally:
+        busy.in_flight -= 1
+
+
+def test_tenants_holding_only_archived_sessions_are_dropped(tmp_path):
+    """Postings kept for archived sessions do not pin an idle tenant in memory"""
+    service = ChatService(tenant_id="archived", archive=SessionArchive(str(tmp_path / "archive")))
+    tenant = tenant_registry.tenants["archived"] = Tenant("archived", TenantQuotas.for_tenant("archived"), service)
+
+    async def scenario():
+        session = await service.create_session(title="old")
+        await service.process_message("remember the zebra", session_id=session.id)
+        assert await service.archive_idle_sessions(0) == 1
+
+    asyncio.run(scenario())
+    assert len(service.search_index) == 2 and service.search_index.attached == 0
+    tenant.last_used -= settings.idempotency_ttl_s + 1
+    assert tenant_registry.evict_idle(0) >= 1
+    assert "archived" not in tenant_registry.tenants
+
+
+def test_rate_quota_rejects_with_retry_after():
+    """Requests beyond the tenant's burst get 429 with Retry-After"""
+    tenant_id = tenant_registry.resolve("limited-key")
+    quotas = TenantQuotas(max_sessions=0, max_message_bytes=0, max_concurrency=0, rate_per_s=0.5, burst=2)
+    tenant_registry.tenants[tenant_id] = Tenant(tenant_id, quotas, tenant_registry.get(tenant_id).service)
+
+    headers = {"X-API-Key": "limited-key"}
+    statuses = [client.get("/api/v1/chat/sessions", headers=headers).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+    response = client.get("/api/v1/chat/sessions", headers=headers)
+    assert response.json()["quota"] == "rate"
+    assert int(response.headers["retry-after"]) >= 1
+    # Other tenants are unaffected
+    assert client.get("/api/v1/chat/sessions").status_code == 200
+
+
+def test_concurrency_quota():
+    """A tenant holds at most max_concurrency request slots"""
+    quotas = TenantQuotas(max_sessions=0, max_message_bytes=0, max_concurrency=1, rate_per_s=0, burst=0)
+    tenant = Tenant("busy", quotas, tenant_registry.get(settings.default_tenant).service)
+    with tenant.admit():
+        with pytest.raises(QuotaExceededError):
+            with tenant.admit():
+                pass
+    with tenant.admit():
+        assert tenant.in_flight == 1
+
+
+def test_memory_quota_rejects_writes():
+    """Stored message bytes are capped per tenant"""
+    tenant = tenant_registry.get(tenant_registry.resolve("small-key"))
+    tenant.service.quotas = TenantQuotas(
+        max_sessions=1, max_message_bytes=10, max_concurrency=0, rate_per_s=0, burst=0
+    )
+    headers = {"X-API-Key": "small-key"}
+
+    response = client.post("/api/v1/chat/", json={"message": "this is far too long"}, headers=headers)
+    assert response.status_code == 429
+    assert response.json()["quota"] == "memory"
+
+    assert client.post("/api/v1/chat/sessions", json={"title": "one"}, headers=headers).status_code == 200
+    response = client.post("/api/v1/chat/sessions", json={"title": "two"}, headers=headers)
+    assert response.status_code == 429
+    assert response.json()["quota"] == "sessions"
+
+
+def test_memory_quota_counts_metadata():
+    """Message context and tool metadata count against the memory quota"""
+    service = ChatService(
+        tenant_id="meta",
+        quotas=TenantQuotas(max_sessions=0, max_message_bytes=100, max_concurrency=0, rate_per_s=0, burst=0)
+    )
+
+    async def scenario():
+        with pytest.raises(QuotaExceededError):
+            await service.process_message("hi", context={"note": "x" * 200})
+        response = await service.process_message("hi", context={"note": "x"})
+        messages = service.messages[response.session_id]
+        assert service.stored_bytes == sum(stored_size(m.content, m.metadata) for m in messages)
+        assert service.stored_bytes > sum(len(m.content.encode()) for m in messages)
+
+    asyncio.run(scenario())
+
+
+class GatedProvider(Provider):
+    """Provider that answers once released"""
+
+    name = "gated"
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def generate(self, message: str, history: List[ChatMessage], api_key: Optional[str] = None) -> str:
+        await self.release.wait()
+        return "late reply"
+
+
+def test_reply_for_a_session_deleted_meanwhile_is_not_charged():
+    """A reply whose session was deleted during generation is dropped, not stored as an orphan"""
+    provider = GatedProvider()
+    router = ProviderRouter()
+    router.register(provider)
+    service = ChatService(router=router, tenant_id="orphans")
+
+    async def scenario():
+        session = await service.create_session(title="short-lived")
+        turn = asyncio.create_task(service.process_message("hello there", session_id=session.id))
+        while provider.release.is_set() or not service.messages.get(session.id):
+            await asyncio.sleep(0.001)
+        assert await service.delete_session(session.id)
+        provider.release.set()
+
+        response = await turn
+        assert response.message == "late reply"
+        assert session.id not in service.messages
+        assert service.stored_bytes == 0 and not service.session_bytes
+        assert service.search_index.search("late reply")[0] == 0
+
+    asyncio.run(scenario())
+
+
+def test_api_keys_are_scoped_by_tenant():
+    """The same key name can exist once per tenant"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine, tables=[APIKey.__table__])
+    db = sessionmaker(bind=engine)()
+
+    api_key_service.create_or_update_key(db, APIKeyCreate(name="openai", key="sk-alice-123456"), "alice")
+    api_key_service.create_or_update_key(db, APIKeyCreate(name="openai", key="sk-bob-1234567"), "bob")
+
+    assert api_key_service.get_decrypted_key(db, "openai", "alice") == "sk-alice-123456"
+    assert api_key_service.get_decrypted_key(db, "openai", "bob") == "sk-bob-1234567"
+    assert api_key_service.get_key(db, "openai") is None
+    assert [key.tenant_id for key in api_key_service.list_keys(db, "bob")] == ["bob"]
+
+
+def test_api_keys_table_is_upgraded_in_place():
+    """A table from before tenants gains tenant_id and a per-tenant unique name"""
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE api_keys (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+            "encrypted_key VARCHAR NOT NULL, is_active BOOLEAN NOT NULL, "
+            "created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)"
+        ))
+        conn.execute(text("CREATE UNIQUE INDEX ix_api_keys_name ON api_keys (name)"))
+        conn.execute(text(
+            "INSERT INTO api_keys (name, encrypted_key, is_active, created_at, updated_at) "
+            "VALUES ('openai', 'x', 1, '2024-01-01', '2024-01-01')"
+        ))
+
+    assert upgrade_api_keys(engine) is True
+    assert upgrade_api_keys(engine) is False
+    db = sessionmaker(bind=engine)()
+    assert [key.tenant_id for key in api_key_service.list_keys(db, settings.default_tenant)] == [settings.default_tenant]
+    api_key_service.create_or_update_key(db, APIKeyCreate(name="openai", key="sk-alice-123456"), "alice")
+    assert api_key_service.get_decrypted_key(db, "openai", "alice") == "sk-alice-123456"
+    with pytest.raises(Exception):
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO api_keys (tenant_id, name, encrypted_key, is_active, created_at, updated_at) "
+                "VALUES ('alice', 'openai', 'x', 1, '2024-01-01', '2024-01-01')"
+            ))
+
+
+def test_tenants_are_spread_over_shards(monkeypatch):
+    """Shards are chosen by tenant hash; the default tenant stays on shard 0"""
+    monkeypatch.setattr(settings, "database_shards", ["sqlite:///./a.db", "sqlite:///./b.db"])
+    shards = {shard_for_tenant(f"tenant-{i}") for i in range(50)}
+    assert shards == {0, 1, 2}
+    assert shard_for_tenant(settings.default_tenant) == 0
+    assert shard_for_tenant("tenant-7") == shard_for_tenant("tenant-7")
@@ -0,0 +1,87 @@
+"""Test cases for request tracing"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import settings
+from app.main import app
+from app.utils.tracing import InMemoryExporter, TailSampler, instrument_engine, tracer
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def tracing():
+    """Enable tracing and keep every trace for the duration of a test"""
+    exporter = InMemoryExporter()
+    saved = (tracer.enabled, tracer.exporters, tracer.sampler)
+    tracer.enabled = True
+    tracer.exporters = [exporter]
+    tracer.sampler = TailSampler(slow_threshold_ms=0.0, sample_rate=0.0)
+    yield exporter
+    tracer.enabled, tracer.exporters, tracer.sampler = saved
+
+
+def test_chat_request_records_service_spans(tracing):
+    """A chat turn produces route, service and history spans"""
+    response = client.post(
+        "/api/v1/chat/",
+        json={"message": "trace me"},
+        headers={"X-Request-ID": "trace-1"},
+    )
+    assert response.status_code == 200
+
+    trace = tracing.traces[-1]
+    assert trace["trace_id"] == "trace-1"
+    assert trace["name"] == "POST /api/v1/chat/"
+    names = [span["name"] for span in trace["spans"]]
+    assert "chat.process_message" in names
+    assert "chat.generate" in names
+    assert "chat.history" in names
+
+    spans = {span["name"]: span for span in trace["spans"]}
+    assert spans["chat.history"]["parent_id"] == spans["chat.generate"]["span_id"]
+
+
+def test_fast_traces_are_dropped_by_tail_sampler(tracing):
+    """Traces under the slow threshold are not exported unless sampled"""
+    tracer.sampler = TailSampler(slow_threshold_ms=60_000, sample_rate=0.0)
+    client.get("/health")
+    assert len(tracing.traces) == 0
+
+
+def test_no_spans_without_active_trace():
+    """Spans outside of a traced request are no-ops"""
+    with tracer.span("orphan") as span:
+        assert span is None
+
+
+def test_failed_statement_ends_its_span_with_the_error(tracing):
+    """A statement that raises is recorded as an errored span and leaves nothing behind"""
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    trace = tracer.start_trace("db")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            assert not conn.info.get("trace_query_start")
+    finally:
+        tracer.finish_trace(trace)
+
+    ok, failed = [span for span in trace.spans if span.name == "db.query"]
+    assert ok.error is None
+    assert "missing_table" in failed.error and failed.end is not None
+    assert failed.attributes["statement"] == "SELECT * FROM missing_table"
+
+
+def test_debug_traces_endpoint(tracing, monkeypatch):
+    """Sampled traces are exposed through the debug endpoint"""
+    monkeypatch.setattr(settings, "debug", True)
+    client.get("/health")
+    response = client.get("/api/v1/debug/traces")
+    assert response.status_code == 200
+    assert response.json()["traces"][0]["name"] == "GET /health"
@@ -1,9 +1,12 @@
 """Encryption utilities for API keys"""
 
 from cryptography.fernet import Fernet
+from functools import lru_cache
 import base64
 import os
 from app.core.config import settings
+from app.utils.logger import logger
+from app.utils.tracing import traced
 
 
 class EncryptionService:
@@ -17,15 +20,18 @@ class EncryptionService:
         if not encryption_key:
             # Generate a key for development (WARNING: not for production!)
             # In production, set ENCRYPTION_KEY environment variable
+            # The key itself is never logged: logs are shipped off the host
             encryption_key = Fernet.generate_key().decode()
-            print(f"⚠️  Generated encryption key (for development only): {encryption_key}")
-            print("⚠️  Set ENCRYPTION_KEY environment variable in production!")
+            logger.warning("Generated an ephemeral encryption key (development only); "
+                           "stored API keys will not decrypt after a restart")
+            logger.warning("Set ENCRYPTION_KEY environment variable in production!")
         
         if isinstance(encryption_key, str):
             encryption_key = encryption_key.encode()
             
         self.cipher = Fernet(encryption_key)
     
+    @traced("crypto.encrypt")
     def encrypt(self, plaintext: str) -> str:
         """
         Encrypt a plaintext string
@@ -39,6 +45,7 @@ class EncryptionService:
         encrypted_bytes = self.cipher.encrypt(plaintext.encode())
         return encrypted_bytes.decode()
     
+    @traced("crypto.decrypt")
     def decrypt(self, encrypted_text: str) -> str:
         """
         Decrypt an encrypted string
@@ -53,6 +60,8 @@ class EncryptionService:
         return decrypted_bytes.decode()
 
 
-# Singleton instance
-encryption_service = EncryptionService()
+@lru_cache(maxsize=None)
+def get_encryption_service() -> EncryptionService:
+    """Get the encryption service singleton, creating it on first use"""
+    return EncryptionService()
 
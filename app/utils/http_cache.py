@@ -0,0 +1,85 @@
+"""HTTP conditional request helpers (ETag / Last-Modified)"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Build a weak ETag from validator parts (versions, counts, timestamps)"""
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def http_date(value: datetime) -> str:
+    """Format a (naive UTC or aware) datetime as an HTTP-date"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: Optional[str], last_modified: datetime) -> bool:
+    """
+    Evaluate If-None-Match / If-Modified-Since against the current validators
+
+    If-None-Match takes precedence when both are present (RFC 9110 13.2.2).
+    If-Modified-Since is only used for resources without an ETag: HTTP dates
+    have one-second resolution, so a write in the same second as an earlier
+    read would otherwise be answered with a stale 304.
+
+    Args:
+        request: Incoming request
+        etag: Current ETag of the resource, if it has one
+        last_modified: Current modification time of the resource
+
+    Returns:
+        True if a 304 Not Modified response can be sent
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag is not None:
+        if if_none_match.strip() == "*":
+            return True
+        current = _strip_weak(etag)
+        return any(_strip_weak(tag) == current for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and etag is None:
+        since = _parse_http_date(if_modified_since)
+        if since is None:
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
+def cache_headers(etag: str, last_modified: datetime) -> Dict[str, str]:
+    """Validator headers to attach to a response"""
+    return {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Cache-Control": "no-cache",
+    }
+
+
+def not_modified(etag: str, last_modified: datetime) -> Response:
+    """Build an empty 304 response carrying the validators"""
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
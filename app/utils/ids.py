@@ -0,0 +1,62 @@
+"""Cheap, time-ordered identifiers
+
+`uuid7()` returns RFC 9562 version 7 UUIDs in the usual 36-character form:
+48 bits of Unix milliseconds, a 12-bit counter that keeps ids from the same
+millisecond in order, and 62 random bits. Ids sort by creation time, so
+they make append-friendly index keys.
+
+Unlike `str(uuid.uuid4())` no UUID object, 128-bit integer or syscall is
+needed per id: the timestamp prefix is formatted once per millisecond, the
+counter comes from a lookup table and the random part is sliced from a
+pooled, hex-encoded urandom buffer.
+"""
+
+import os
+import threading
+import time
+
+# Hex characters per refill of the random pool (8 KiB of urandom)
+_POOL_CHARS = 16384
+_COUNTER_HEX = tuple(f"{i:03x}" for i in range(0x1000))
+# First character of the fourth group: variant bits 0b10 plus two random bits
+_VARIANT_HEX = {f"{i:x}": f"{0x8 | (i & 0x3):x}" for i in range(16)}
+
+
+class _UUID7Generator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._counter = 0
+        self._prefix = ""
+        self._pool = ""
+        self._offset = _POOL_CHARS
+
+    def __call__(self) -> str:
+        ms = time.time_ns() // 1_000_000
+        with self._lock:
+            if ms > self._last_ms:
+                self._last_ms = ms
+                self._counter = counter = 0
+                self._prefix = prefix = f"{ms >> 16:08x}-{ms & 0xFFFF:04x}-7"
+            else:
+                # Same millisecond (or the clock stepped back): keep counting
+                counter = self._counter = self._counter + 1
+                if counter > 0xFFF:
+                    self._last_ms += 1
+                    self._counter = counter = 0
+                    self._prefix = f"{self._last_ms >> 16:08x}-{self._last_ms & 0xFFFF:04x}-7"
+                prefix = self._prefix
+            offset = self._offset
+            if offset >= _POOL_CHARS:
+                self._pool = os.urandom(_POOL_CHARS // 2).hex()
+                offset = 0
+            self._offset = offset + 16
+            pool = self._pool
+        return (
+            prefix + _COUNTER_HEX[counter] + "-" + _VARIANT_HEX[pool[offset]]
+            + pool[offset + 1:offset + 4] + "-" + pool[offset + 4:offset + 16]
+        )
+
+
+# Singleton instance
+uuid7 = _UUID7Generator()
@@ -1,44 +1,182 @@
-"""Logging configuration"""
+"""Logging configuration
 
+Records are handed to a background thread through a queue, so logging from
+the event loop never blocks on stdout. Output is one JSON object per line
+carrying the request, session and tenant ids of the request that logged it.
+
+Importing this module has no side effects: the queue and the writer thread
+are set up by `configure_logging()` in the application lifespan and torn down
+by `shutdown_logging()`. Outside that window "app" records fall back to
+Python's last-resort handler (warnings and errors to stderr).
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import zlib
+from datetime import datetime, timezone
+from typing import Optional
+
 from app.core.config import settings
+from app.core.context import request_id_var, session_id_var, tenant_id_var
 
-def setup_logger(name: str = __name__) -> logging.Logger:
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "session_id", "tenant_id",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """Attach request, session and tenant ids while still on the logging thread/task"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.session_id = session_id_var.get()
+        record.tenant_id = tenant_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
     """
-    Set up and configure logger
-    
-    Args:
-        name: Logger name
-        
+    Sample DEBUG records, always pass INFO and above
+
+    Records belonging to a request are sampled by request id, so a sampled
+    request keeps all of its debug lines.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        if self.rate <= 0.0:
+            return False
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            return (zlib.crc32(request_id.encode()) % 10000) < self.rate * 10000
+        return random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as single-line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            payload["request_id"] = record.request_id
+        if getattr(record, "session_id", None):
+            payload["session_id"] = record.session_id
+        if getattr(record, "tenant_id", None):
+            payload["tenant_id"] = record.tenant_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Freeze the message so mutable args can't change before it is written
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _build_formatter() -> logging.Formatter:
+    if settings.log_json:
+        return JSONFormatter()
+    return logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+
+def configure_logging() -> logging.Logger:
+    """
+    Configure the "app" logger with a queue handler and start the writer thread
+
+    Safe to call more than once.
+
     Returns:
-        Configured logger instance
+        The configured "app" logger
     """
-    logger = logging.getLogger(name)
-    
-    # Set level based on debug mode
+    global _listener
+    root = logging.getLogger("app")
+    if _listener is not None:
+        return root
+
     level = logging.DEBUG if settings.debug else logging.INFO
-    logger.setLevel(level)
-    
-    # Create console handler
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(level)
-    
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+    root.setLevel(level)
+    root.propagate = False
+
+    # The stream handler only runs on the listener thread
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setLevel(level)
+    stream_handler.setFormatter(_build_formatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(SamplingFilter(settings.log_debug_sample_rate))
+    root.handlers = [queue_handler]
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, stream_handler, respect_handler_level=True
     )
-    handler.setFormatter(formatter)
-    
-    # Add handler to logger
-    if not logger.handlers:
-        logger.addHandler(handler)
-    
-    return logger
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging() -> None:
+    """Flush queued records, stop the writer thread and detach the queue handler"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        # Nothing consumes the queue any more; don't keep filling it
+        root = logging.getLogger("app")
+        root.handlers = []
+        root.propagate = True
+
+
+def setup_logger(name: str = __name__) -> logging.Logger:
+    """
+    Get a logger under the "app" hierarchy
+
+    Handlers are attached by `configure_logging()`, not here, so this is
+    safe to call at import time.
+
+    Args:
+        name: Logger name, nested under "app" so records go through the queue
+
+    Returns:
+        Logger instance
+    """
+    if name != "app" and not name.startswith("app."):
+        name = f"app.{name}"
+    return logging.getLogger(name)
 
 
 # Default logger instance
 logger = setup_logger("app")
 
-
+# Per-request access log, emitted by RequestContextMiddleware
+access_logger = setup_logger("app.access")
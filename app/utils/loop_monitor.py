@@ -0,0 +1,222 @@
+"""Event-loop lag measurement and blocking-call detection
+
+A heartbeat task on the event loop wakes every `blocking_heartbeat_ms` and
+records how late it woke up (the loop lag). A watchdog thread checks the
+heartbeat; when it has not advanced for `blocking_threshold_ms`, the loop
+is stuck in one step of some coroutine, and the watchdog captures the loop
+thread's stack together with the route of the request whose task is
+running. The stall's duration is filled in once the loop resumes.
+
+Cost while nothing blocks is one timer wake-up per heartbeat plus a thread
+wake-up per half threshold, which is cheap enough to leave on.
+
+This is the process's only lag sampler: overload protection subscribes to
+the heartbeat (`subscribe`) rather than measuring lag itself. The heartbeat
+also runs with blocking detection off; only the watchdog is skipped then.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from starlette.types import Scope
+
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+logger = setup_logger("loop_monitor")
+
+_blocked = metrics.counter("event_loop_blocked_total", "Event-loop stalls longer than the blocking threshold")
+_blocked_seconds = metrics.counter("event_loop_blocked_seconds_total", "Time the event loop spent stalled")
+
+
+@dataclass
+class BlockingEvent:
+    """One stall of the event loop"""
+    started_at: float  # unix time
+    route: Optional[str]
+    task: Optional[str]
+    stack: List[str] = field(default_factory=list)
+    duration_ms: Optional[float] = None  # None while still blocked
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "route": self.route,
+            "task": self.task,
+            "stack": self.stack,
+        }
+
+
+class LoopMonitor:
+    """Heartbeat on the loop plus a watchdog thread that catches it blocked"""
+
+    def __init__(
+        self,
+        threshold_ms: float = 100.0,
+        heartbeat_ms: float = 25.0,
+        max_events: int = 100,
+        stack_depth: int = 30
+    ):
+        self.threshold_ms = threshold_ms
+        self.heartbeat_ms = heartbeat_ms
+        self.stack_depth = stack_depth
+        self.events: Deque[BlockingEvent] = deque(maxlen=max_events)
+        # Running request tasks -> ASGI scope, to attribute stalls to routes
+        self.requests: Dict[asyncio.Task, Scope] = {}
+        self.lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._beat = 0.0
+        self._current: Optional[BlockingEvent] = None
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        # Called with each heartbeat's lag in ms
+        self._listeners: List[Callable[[float], None]] = []
+
+    @property
+    def enabled(self) -> bool:
+        """Whether blocking calls are being detected"""
+        return self._watchdog is not None
+
+    async def start(self, detect_blocking: bool = True) -> None:
+        """Start sampling the running loop's lag, and detecting blocking calls if asked"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        if detect_blocking:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        if self._watchdog is not None:
+            self._stopping.set()
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+        self.requests.clear()
+
+    def subscribe(self, listener: Callable[[float], None]) -> None:
+        """Call `listener(lag_ms)` on every heartbeat"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[float], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def track(self, scope: Scope) -> Optional[asyncio.Task]:
+        """Associate the current task with a request; returns the token for untrack()"""
+        if self._watchdog is None:
+            return None
+        task = asyncio.current_task()
+        if task is not None:
+            self.requests[task] = scope
+        return task
+
+    def untrack(self, task: Optional[asyncio.Task]) -> None:
+        if task is not None:
+            self.requests.pop(task, None)
+
+    async def _heartbeat(self) -> None:
+        interval = self.heartbeat_ms / 1000
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag_ms = max(0.0, now - expected) * 1000
+            self.lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            for listener in self._listeners:
+                listener(lag_ms)
+            with self._lock:
+                self._beat = now
+                stalled, self._current = self._current, None
+            if stalled is not None:
+                stalled.duration_ms = lag_ms
+                route = stalled.route or "-"
+                _blocked.inc(route=route)
+                _blocked_seconds.inc(lag_ms / 1000, route=route)
+                logger.warning(
+                    "Event loop blocked",
+                    extra={"duration_ms": round(lag_ms, 3), "route": stalled.route, "stack": stalled.stack[-5:]}
+                )
+
+    def _watch(self) -> None:
+        threshold = self.threshold_ms / 1000
+        interval = self.heartbeat_ms / 1000
+        while not self._stopping.wait(threshold / 2):
+            beat = self._beat
+            if self._current is not None or time.monotonic() - beat < threshold + interval:
+                continue
+            event = self._capture()
+            with self._lock:
+                # Only keep it if the loop is still stuck in the same step
+                if self._beat == beat and self._current is None:
+                    self._current = event
+                    self.events.append(event)
+
+    def _capture(self) -> BlockingEvent:
+        frame = sys._current_frames().get(self._thread_id)
+        stack = [
+            f"{entry.filename}:{entry.lineno} in {entry.name}"
+            for entry in traceback.extract_stack(frame, limit=self.stack_depth)
+        ] if frame is not None else []
+
+        task = asyncio.current_task(self._loop)
+        scope = self.requests.get(task) if task is not None else None
+        route = None
+        if scope is not None:
+            matched = scope.get("route")
+            route = f"{scope['method']} {getattr(matched, 'path', scope['path'])}"
+        return BlockingEvent(
+            started_at=time.time() - (time.monotonic() - self._beat),
+            route=route,
+            task=task.get_name() if task is not None else None,
+            stack=stack,
+        )
+
+    def snapshot(self, limit: int = 50) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "lag_ms": round(self.lag_ms, 3),
+            "max_lag_ms": round(self.max_lag_ms, 3),
+            "events": [event.to_dict() for event in list(self.events)[::-1][:limit]],
+        }
+
+    def clear(self) -> None:
+        self.events.clear()
+        self.max_lag_ms = 0.0
+
+
+def _create_monitor() -> LoopMonitor:
+    from app.core.config import settings
+
+    return LoopMonitor(
+        threshold_ms=settings.blocking_threshold_ms,
+        heartbeat_ms=settings.blocking_heartbeat_ms,
+        max_events=settings.blocking_max_events,
+    )
+
+
+# Singleton instance (started in the application lifespan)
+loop_monitor = _create_monitor()
+
+metrics.gauge("event_loop_lag_ms", "Event-loop lag at the last heartbeat", lambda: loop_monitor.lag_ms)
@@ -0,0 +1,97 @@
+"""Minimal in-process metrics registry with Prometheus text exposition"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    body = ",".join(f'{name}="{value}"' for name, value in key)
+    return "{" + body + "}"
+
+
+class Counter:
+    """Monotonically increasing value, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[LabelKey, float]]:
+        return list(self.values.items())
+
+
+class Gauge:
+    """Point-in-time value; either set explicitly or computed on collection"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, func: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.description = description
+        self.func = func
+        self.values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        self.values[_label_key(labels)] = value
+
+    def get(self, **labels) -> float:
+        if self.func is not None and not labels:
+            return float(self.func())
+        return self.values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[LabelKey, float]]:
+        if self.func is not None:
+            return [((), float(self.func()))]
+        return list(self.values.items())
+
+
+class MetricsRegistry:
+    """Holds all metrics of the process"""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, description: str) -> Counter:
+        """Get or create a counter"""
+        if name not in self.metrics:
+            self.metrics[name] = Counter(name, description)
+        return self.metrics[name]
+
+    def gauge(self, name: str, description: str, func: Optional[Callable[[], float]] = None) -> Gauge:
+        """Get or create a gauge; `func` makes it computed at collection time"""
+        if name not in self.metrics:
+            self.metrics[name] = Gauge(name, description, func)
+        elif func is not None:
+            self.metrics[name].func = func
+        return self.metrics[name]
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in metric.samples():
+                lines.append(f"{metric.name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# Singleton instance
+metrics = MetricsRegistry()
@@ -0,0 +1,85 @@
+"""Startup profiling - import and initialization timings per module
+
+Enabled by STARTUP_PROFILE, in the environment or in `.env` like the other
+settings. The import hook is installed from `app/__init__.py` so it sees
+every module the application pulls in, including third-party packages.
+"""
+
+import builtins
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+class StartupProfiler:
+    """Collects import and init phase timings during application startup"""
+
+    def __init__(self):
+        self.imports: Dict[str, Tuple[float, float]] = {}  # module -> (total, self)
+        self.phases: Dict[str, float] = {}
+        self.enabled = False
+        self._original_import = None
+        self._child_time: List[float] = []
+
+    def install(self) -> None:
+        """Start timing imports of modules that are not loaded yet"""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self) -> None:
+        """Stop timing imports"""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._child_time.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            total = time.perf_counter() - start
+            children = self._child_time.pop()
+            if self._child_time:
+                self._child_time[-1] += total
+            if name not in self.imports:
+                self.imports[name] = (total, total - children)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time an initialization phase, e.g. database setup"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def report(self, top: int = 25) -> str:
+        """
+        Render a report of the slowest imports and all init phases
+
+        Args:
+            top: Number of imports to include, ordered by self time
+
+        Returns:
+            Human readable report
+        """
+        lines = ["Startup profile (ms):", "  imports (self / total):"]
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)
+        for module, (total, own) in slowest[:top]:
+            lines.append(f"    {own * 1000:9.2f} / {total * 1000:9.2f}  {module}")
+        lines.append("  phases:")
+        for name, duration in self.phases.items():
+            lines.append(f"    {duration * 1000:9.2f}  {name}")
+        return "\n".join(lines)
+
+
+# Singleton instance
+profiler = StartupProfiler()
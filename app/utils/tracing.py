@@ -0,0 +1,336 @@
+"""Lightweight request tracing
+
+A trace is started per request by TracingMiddleware and stored in a context
+variable. Services open spans with `tracer.span(...)` or the `traced`
+decorator, and database queries are recorded through SQLAlchemy cursor
+events. When no trace is active (tracing disabled, or code running outside a
+request) every entry point returns after a single context variable lookup.
+
+Finished traces go through tail-based sampling - slow and failed requests are
+always kept, the rest are sampled at `tracing_sample_rate` - and are handed to
+the configured exporters.
+"""
+
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from app.core.config import settings
+
+
+@dataclass
+class Span:
+    """A timed operation within a trace"""
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    end: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+
+@dataclass
+class Trace:
+    """All spans recorded for one request"""
+    trace_id: str
+    root: Span
+    started_at: float = field(default_factory=time.time)
+    spans: List[Span] = field(default_factory=list)
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ms
+
+    @property
+    def failed(self) -> bool:
+        status = self.root.attributes.get("http.status_code", 200)
+        return self.root.error is not None or status >= 500
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the trace with span offsets relative to the request start"""
+        origin = self.root.start
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "spans": [
+                {
+                    "name": span.name,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "offset_ms": round((span.start - origin) * 1000, 3),
+                    "duration_ms": round(span.duration_ms, 3),
+                    "attributes": span.attributes,
+                    "error": span.error,
+                }
+                for span in [self.root, *self.spans]
+            ],
+        }
+
+
+class SpanExporter:
+    """Base class for trace exporters"""
+
+    def export(self, trace: Trace) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        """Flush and release resources"""
+
+
+class InMemoryExporter(SpanExporter):
+    """Keep the most recent traces in memory for local inspection"""
+
+    def __init__(self, max_traces: int = 500):
+        self.traces: Deque[Dict[str, Any]] = deque(maxlen=max_traces)
+
+    def export(self, trace: Trace) -> None:
+        self.traces.append(trace.to_dict())
+
+    def clear(self) -> None:
+        self.traces.clear()
+
+
+class JsonFileExporter(SpanExporter):
+    """Append traces as JSON lines to a file from a background thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        if self._thread is None:
+            self._start()
+        self._queue.put(trace.to_dict())
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="trace-exporter", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                f.write(json.dumps(item, default=str) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+    def shutdown(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class TailSampler:
+    """Decide whether to keep a trace once it has finished"""
+
+    def __init__(self, slow_threshold_ms: float, sample_rate: float):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.sample_rate = sample_rate
+
+    def should_export(self, trace: Trace) -> bool:
+        if trace.failed or trace.duration_ms >= self.slow_threshold_ms:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+class Tracer:
+    """Creates traces and spans and routes finished traces to exporters"""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        exporters: Optional[List[SpanExporter]] = None,
+        sampler: Optional[TailSampler] = None,
+    ):
+        self.enabled = enabled
+        self.exporters: List[SpanExporter] = exporters or []
+        self.sampler = sampler or TailSampler(slow_threshold_ms=500.0, sample_rate=0.0)
+
+    def start_trace(self, name: str, trace_id: Optional[str] = None, **attributes) -> Trace:
+        """Start a trace and make it current for the calling context"""
+        root = Span(
+            name=name,
+            span_id=_new_span_id(),
+            parent_id=None,
+            start=time.perf_counter(),
+            attributes=attributes,
+        )
+        trace = Trace(trace_id=trace_id or os.urandom(16).hex(), root=root)
+        _current_trace.set(trace)
+        _current_span.set(root)
+        return trace
+
+    def finish_trace(self, trace: Trace) -> None:
+        """Close the root span, clear the context and export if sampled"""
+        trace.root.end = time.perf_counter()
+        _current_trace.set(None)
+        _current_span.set(None)
+        if self.sampler.should_export(trace):
+            for exporter in self.exporters:
+                exporter.export(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Record a child span of the current span, if a trace is active"""
+        trace = _current_trace.get()
+        if trace is None:
+            yield None
+            return
+
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            span_id=_new_span_id(),
+            parent_id=parent.span_id if parent else None,
+            start=time.perf_counter(),
+            attributes=attributes,
+        )
+        trace.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+
+    def record_span(
+        self, name: str, start: float, end: float, error: Optional[str] = None, **attributes
+    ) -> None:
+        """Record an already finished span (used by event hooks)"""
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        parent = _current_span.get()
+        trace.spans.append(Span(
+            name=name,
+            span_id=_new_span_id(),
+            parent_id=parent.span_id if parent else None,
+            start=start,
+            end=end,
+            attributes=attributes,
+            error=error,
+        ))
+
+    def shutdown(self) -> None:
+        """Flush all exporters"""
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """
+    Decorator recording a span around a sync or async function
+
+    Args:
+        name: Span name, defaults to the function's qualified name
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_trace.get() is None:
+                    return await func(*args, **kwargs)
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def instrument_engine(engine) -> None:
+    """Record a span for every statement executed through a SQLAlchemy engine"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_trace.get() is not None:
+            conn.info.setdefault("trace_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("trace_query_start")
+        if starts:
+            tracer.record_span(
+                "db.query",
+                starts.pop(),
+                time.perf_counter(),
+                statement=statement[:200],
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        # after_cursor_execute does not run for a failed statement
+        starts = context.connection.info.get("trace_query_start") if context.connection is not None else None
+        if starts:
+            tracer.record_span(
+                "db.query",
+                starts.pop(),
+                time.perf_counter(),
+                error=repr(context.original_exception),
+                statement=(context.statement or "")[:200],
+            )
+
+
+def _build_exporters() -> List[SpanExporter]:
+    if settings.tracing_exporter == "json":
+        return [JsonFileExporter(settings.tracing_export_path)]
+    return [InMemoryExporter()]
+
+
+# Singleton instance
+tracer = Tracer(
+    enabled=settings.tracing_enabled,
+    exporters=_build_exporters(),
+    sampler=TailSampler(
+        slow_threshold_ms=settings.tracing_slow_threshold_ms,
+        sample_rate=settings.tracing_sample_rate,
+    ),
+)
@@ -0,0 +1,84 @@
+"""Session archive throughput benchmark
+
+Archives a population of idle sessions to segment files, then rehydrates a
+random sample through `get_session_messages` (memory-mapped reads).
+
+Usage:
+    python -m benchmarks.bench_archive [--sessions 2000] [--messages 40] [--sample 500]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app.services.archive import SessionArchive
+from app.services.chat_service import ChatService
+
+_WORDS = (
+    "latency cache session message history archive tenant provider stream "
+    "request response token segment index compress memory disk thread"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 40)))
+
+
+async def run(sessions: int, messages: int, sample: int) -> None:
+    directory = tempfile.mkdtemp(prefix="archive-bench-")
+    rng = random.Random(7)
+    try:
+        service = ChatService(archive=SessionArchive(directory))
+        ids = []
+        for i in range(sessions):
+            session = await service.create_session(title=f"bench {i}")
+            for _ in range(messages // 2):
+                await service.process_message(_sentence(rng), session_id=session.id)
+            session.updated_at = datetime.utcnow() - timedelta(days=30)
+            ids.append(session.id)
+        raw_bytes = service.stored_bytes
+
+        start = time.perf_counter()
+        archived = await service.archive_idle_sessions(idle_seconds=3600)
+        archive_time = time.perf_counter() - start
+        on_disk = sum(
+            os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+        )
+
+        print(f"sessions archived      {archived:>10}  ({sessions * messages} messages)")
+        print(f"archive throughput     {archived / archive_time:>10.0f} sessions/s")
+        print(f"content / on-disk      {raw_bytes / 1e6:>8.2f} MB / {on_disk / 1e6:.2f} MB")
+
+        picks = rng.sample(ids, min(sample, len(ids)))
+        timings = []
+        for session_id in picks:
+            start = time.perf_counter()
+            restored = await service.get_session_messages(session_id)
+            timings.append(time.perf_counter() - start)
+            assert len(restored) == messages
+        timings.sort()
+        total = sum(timings)
+        print(f"restore throughput     {len(picks) / total:>10.0f} sessions/s")
+        print(f"restore p50 / p99      {timings[len(timings) // 2] * 1000:>8.3f} ms / "
+              f"{timings[int(len(timings) * 0.99)] * 1000:.3f} ms")
+        service.archive.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=40, help="messages per session")
+    parser.add_argument("--sample", type=int, default=500, help="sessions to rehydrate")
+    args = parser.parse_args()
+    asyncio.run(run(args.sessions, args.messages, args.sample))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""MCP client latency benchmark against the local stub server
+
+Measures connection setup, cached schema lookups, sequential vs concurrent
+tool calls and memoized calls, over stdio or a Unix socket.
+
+Usage:
+    python -m benchmarks.bench_mcp [--transport stdio|socket] [--latency 0.02] [--calls 8]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.core.config import MCPServerSettings
+from app.services.mcp_client import MCPClient, ToolCall
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:8.2f} ms"
+
+
+async def run(transport: str, latency: float, calls: int, rounds: int) -> None:
+    stub = [sys.executable, "-m", "app.tests.mcp_stub_server", "--latency", str(latency)]
+    process = None
+    if transport == "socket":
+        socket_path = os.path.join(tempfile.mkdtemp(), "mcp.sock")
+        process = subprocess.Popen(stub + ["--socket", socket_path])
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.01)
+        server = MCPServerSettings(name="stub", socket_path=socket_path)
+    else:
+        server = MCPServerSettings(name="stub", command=stub)
+
+    client = MCPClient(servers=[server], pool_size=2)
+    try:
+        start = time.perf_counter()
+        await client.list_tools()
+        print(f"connect + initialize + tools/list {_ms(time.perf_counter() - start)}")
+
+        start = time.perf_counter()
+        await client.list_tools()
+        print(f"cached tools/list                 {_ms(time.perf_counter() - start)}")
+
+        sequential, concurrent, memoized = [], [], []
+        for i in range(rounds):
+            batch = [ToolCall("stub", "echo", {"text": f"{i}-{n}"}) for n in range(calls)]
+            start = time.perf_counter()
+            for call in batch:
+                await client.call_tool(call)
+            sequential.append(time.perf_counter() - start)
+
+            batch = [ToolCall("stub", "counter") for _ in range(calls)]
+            start = time.perf_counter()
+            await client.call_tools(batch)
+            concurrent.append(time.perf_counter() - start)
+
+            batch = [ToolCall("stub", "echo", {"text": f"{i}-{n}"}) for n in range(calls)]
+            start = time.perf_counter()
+            await client.call_tools(batch)
+            memoized.append(time.perf_counter() - start)
+
+        print(f"{calls} calls, sequential (median)    {_ms(statistics.median(sequential))}")
+        print(f"{calls} calls, concurrent (median)    {_ms(statistics.median(concurrent))}")
+        print(f"{calls} calls, memoized (median)      {_ms(statistics.median(memoized))}")
+    finally:
+        await client.close()
+        if process is not None:
+            process.terminate()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="MCP client latency benchmark")
+    parser.add_argument("--transport", choices=["stdio", "socket"], default="stdio")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub latency per tool call (s)")
+    parser.add_argument("--calls", type=int, default=8, help="Tool calls per turn")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.transport, args.latency, args.calls, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
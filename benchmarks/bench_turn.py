@@ -0,0 +1,128 @@
+"""Per-request cost of a chat turn, in time and allocations
+
+Sends chat turns through the full ASGI stack (middleware, routing,
+validation, ChatService) with an instant fake provider, then repeats them
+under tracemalloc to report, per request:
+
+- the peak of memory traced while the request ran;
+- the bytes and blocks still held afterwards (stored messages, indexes,
+  caches), with the source lines that retained the most.
+
+The tenant rate limit and the access log are switched off for the run.
+A micro section compares the id generators and model construction paths
+used on the hot path.
+
+Usage:
+    python -m benchmarks.bench_turn [--requests 2000] [--turns-per-session 20] [--top 10]
+"""
+
+import argparse
+import asyncio
+import time
+import timeit
+import tracemalloc
+import uuid
+from datetime import datetime
+
+import httpx
+
+from app.core.config import settings
+from app.main import app
+from app.schemas.chat import ChatMessage, ChatResponse, MessageRole
+from app.services.provider_router import provider_router
+from app.utils.ids import uuid7
+from benchmarks.replay import FakeProvider, filler
+
+_HEADERS = {"X-API-Key": "bench-turn"}
+
+
+async def _turns(client: httpx.AsyncClient, count: int, per_session: int, seed: int, peaks=None) -> None:
+    session_id = None
+    for i in range(count):
+        if i % per_session == 0:
+            session_id = None
+        body = {"message": filler(80, f"{seed}-{i}")}
+        if session_id:
+            body["session_id"] = session_id
+        if peaks is not None:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        response = await client.post(f"{settings.api_v1_prefix}/chat/", json=body, headers=_HEADERS)
+        if peaks is not None:
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        response.raise_for_status()
+        session_id = response.json()["session_id"]
+
+
+async def run(requests: int, per_session: int, top: int) -> None:
+    provider = FakeProvider(0, 0, 600)
+    saved_resolver, provider_router.key_resolver = provider_router.key_resolver, None
+    saved_settings = settings.tenant_rate_per_s, settings.access_log, settings.tenant_api_keys
+    settings.tenant_rate_per_s, settings.access_log = 0, False
+    settings.tenant_api_keys = {**settings.tenant_api_keys, _HEADERS["X-API-Key"]: "bench-turn"}
+    provider_router.register(provider)
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Warm up imports, caches and lazily created tenant state
+            await _turns(client, min(200, requests), per_session, seed=0)
+
+            start = time.perf_counter()
+            await _turns(client, requests, per_session, seed=1)
+            elapsed = time.perf_counter() - start
+            print(f"turn latency (untraced)   {elapsed / requests * 1e6:>10.1f} us/request")
+
+            peaks = []
+            tracemalloc.start(8)
+            before = tracemalloc.take_snapshot()
+            await _turns(client, requests, per_session, seed=2, peaks=peaks)
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+    finally:
+        provider_router.unregister(provider.name)
+        provider_router.key_resolver = saved_resolver
+        settings.tenant_rate_per_s, settings.access_log, settings.tenant_api_keys = saved_settings
+
+    peaks.sort()
+    diff = after.compare_to(before, "lineno")
+    retained = sum(stat.size_diff for stat in diff)
+    blocks = sum(stat.count_diff for stat in diff)
+    print(f"peak traced p50 / p99     {peaks[len(peaks) // 2] / 1024:>10.1f} KiB / "
+          f"{peaks[int(len(peaks) * 0.99)] / 1024:.1f} KiB")
+    print(f"retained per request      {retained / requests:>10.0f} B in {blocks / requests:.1f} blocks")
+    print(f"\ntop {top} retaining lines (per request):")
+    for stat in diff[:top]:
+        frame = stat.traceback[0]
+        print(f"  {stat.size_diff / requests:>8.0f} B {stat.count_diff / requests:>6.1f} blk  "
+              f"{frame.filename.rsplit('/app/', 1)[-1]}:{frame.lineno}")
+
+
+def micro(number: int = 100000) -> None:
+    now = datetime.utcnow()
+    fields = dict(role=MessageRole.ASSISTANT, content="reply", timestamp=now, metadata=None)
+    response = dict(message="reply", session_id="s", message_id="m", timestamp=now, metadata=None)
+    cases = [
+        ("str(uuid.uuid4())", lambda: str(uuid.uuid4())),
+        ("uuid7()", uuid7),
+        ("ChatMessage(...)", lambda: ChatMessage(id="m", **fields)),
+        ("ChatMessage.model_construct", lambda: ChatMessage.model_construct(id="m", **fields)),
+        ("ChatResponse(...)", lambda: ChatResponse(**response)),
+    ]
+    print("\nhot-path primitives:")
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=number, repeat=3)) / number
+        print(f"  {name:<30} {best * 1e9:>8.0f} ns")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--turns-per-session", type=int, default=20)
+    parser.add_argument("--top", type=int, default=10, help="retaining source lines to list")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.turns_per_session, args.top))
+    micro()
+
+
+if __name__ == "__main__":
+    main()
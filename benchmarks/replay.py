@@ -0,0 +1,244 @@
+"""Replay captured chat traffic against the app, in process
+
+Reads capture files written by CaptureMiddleware and re-issues the requests
+through the ASGI app at their original pacing (`--speed 1`), N times faster
+(`--speed N`), or back to back (`--speed 0`). Generation is served by a fake
+provider with log-normal latency, so only the service's own overhead and
+the configured caches, limits and storage settings are measured.
+
+Sessions are recreated on first use and later requests are mapped to them.
+Message texts are filler of the captured length; repeated messages in the
+capture get the same filler, so repeat-sensitive caches see realistic reuse.
+
+Usage:
+    python -m benchmarks.replay captures/*.jsonl.gz [--speed 1] [--gen-latency-ms 800]
+        [--gen-sigma 0.5] [--reply-chars 600] [--limit N]
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.main import app
+from app.middleware.capture import read_capture
+from app.schemas.chat import ChatMessage
+from app.services.provider_router import Provider, provider_router
+
+_WORDS = (
+    "account password reset billing invoice plan upgrade cancel refund order "
+    "delivery address login error install update export import limit team"
+).split()
+
+
+class FakeProvider(Provider):
+    """Provider with log-normal latency and fixed-size replies"""
+
+    name = "replay"
+
+    def __init__(self, median_ms: float, sigma: float, reply_chars: int, seed: int = 0):
+        self.median = median_ms / 1000
+        self.sigma = sigma
+        self.reply = ("lorem ipsum " * (reply_chars // 12 + 1))[:reply_chars]
+        self.rng = random.Random(seed)
+
+    async def generate(self, message: str, history: List[ChatMessage], api_key: Optional[str] = None) -> str:
+        await asyncio.sleep(self.rng.lognormvariate(math.log(self.median), self.sigma) if self.median else 0)
+        return self.reply
+
+
+def filler(length: int, seed: str) -> str:
+    """Deterministic text of the given length; the same seed gives the same text"""
+    rng = random.Random(seed)
+    words: List[str] = []
+    size = 0
+    while size < length:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:max(1, length)]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Replayer:
+    """Maps captured sessions onto live ones and records latencies per route"""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.sessions: Dict[str, asyncio.Future] = {}
+        # route -> (replayed latencies ms, captured durations ms, statuses)
+        self.results: Dict[str, Tuple[List[float], List[float], Dict[int, int]]] = defaultdict(
+            lambda: ([], [], defaultdict(int))
+        )
+        self.elapsed = 0.0
+
+    @staticmethod
+    def headers(record: Dict[str, Any]) -> Dict[str, str]:
+        return {"X-API-Key": f"replay-{record['tn']}"}
+
+    async def session_id(self, pseudonym: str, record: Dict[str, Any]) -> str:
+        """The live session for a captured one, created if it predates the capture"""
+        future = self.sessions.get(pseudonym)
+        if future is None:
+            future = self.sessions[pseudonym] = asyncio.get_running_loop().create_future()
+            future.set_result(await self.create_session(record))
+        return await future
+
+    async def create_session(self, record: Dict[str, Any]) -> str:
+        response = await self.client.post(
+            f"{settings.api_v1_prefix}/chat/sessions", json={"title": "replay"}, headers=self.headers(record)
+        )
+        return response.json()["id"]
+
+    def expect_session(self, record: Dict[str, Any]) -> None:
+        """Reserve a session the record will create, so later records wait for it"""
+        created = record.get("ns")
+        if created and created not in self.sessions:
+            self.sessions[created] = asyncio.get_running_loop().create_future()
+
+    async def send(self, record: Dict[str, Any]) -> None:
+        route = record.get("r")
+        if route is None:
+            return
+        path = route
+        if "{session_id}" in path:
+            path = path.replace("{session_id}", await self.session_id(record["s"], record))
+        params = {
+            name: value if name in ("limit", "offset") else filler(value, name)
+            for name, value in (record.get("q") or {}).items()
+            if name != "at"
+        }
+        body = None
+        if record["m"] == "POST" and route.endswith("/chat/"):
+            body = {"message": filler(record.get("n", 20), record.get("h", ""))}
+            if record.get("s"):
+                body["session_id"] = await self.session_id(record["s"], record)
+        elif record["m"] == "POST" and route.endswith("/sessions"):
+            body = {"title": "replay"}
+
+        start = time.perf_counter()
+        response = await self.client.request(
+            record["m"], path, params=params or None, json=body, headers=self.headers(record)
+        )
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        created = record.get("ns")
+        if created and not self.sessions[created].done():
+            data = response.json() if response.status_code < 400 else {}
+            # Requests waiting for this session get a fresh one if creation failed here
+            self.sessions[created].set_result(
+                data.get("session_id") or data.get("id") or await self.create_session(record)
+            )
+
+        latencies, captured, statuses = self.results[f"{record['m']} {route}"]
+        latencies.append(latency_ms)
+        captured.append(record.get("d", 0.0))
+        statuses[response.status_code] += 1
+
+    async def replay(self, records: List[Dict[str, Any]], speed: float) -> float:
+        """Issue all records at `speed` times their original pace; returns wall time"""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        first = records[0]["t"] if records else 0.0
+        tasks = []
+        for record in records:
+            if speed > 0:
+                delay = (record["t"] - first) / speed - (loop.time() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.expect_session(record)
+            tasks.append(asyncio.create_task(self.send(record)))
+        await asyncio.gather(*tasks)
+        return loop.time() - start
+
+    def report(self) -> str:
+        lines = [
+            f"{'route':<48} {'count':>6} {'errors':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'captured p50/p99':>18}"
+        ]
+        for route, (latencies, captured, statuses) in sorted(self.results.items()):
+            errors = sum(count for status, count in statuses.items() if status >= 500)
+            lines.append(
+                f"{route:<48} {len(latencies):>6} {errors:>6} "
+                f"{percentile(latencies, 0.5):>9.2f} {percentile(latencies, 0.9):>9.2f} "
+                f"{percentile(latencies, 0.99):>9.2f} {max(latencies):>9.2f} "
+                f"{percentile(captured, 0.5):>8.2f} / {percentile(captured, 0.99):.2f}"
+            )
+        return "\n".join(lines)
+
+
+async def run(
+    paths: List[str],
+    speed: float = 1.0,
+    gen_latency_ms: float = 800.0,
+    gen_sigma: float = 0.5,
+    reply_chars: int = 600,
+    limit: Optional[int] = None,
+    lifespan: bool = True
+) -> Replayer:
+    records = read_capture(paths)[:limit]
+    provider = FakeProvider(gen_latency_ms, gen_sigma, reply_chars)
+    saved_resolver, provider_router.key_resolver = provider_router.key_resolver, None
+    # Only the fake provider generates, even if real ones are configured
+    saved_providers, settings.providers = settings.providers, []
+    # Each captured tenant replays under its own key
+    saved_keys = settings.tenant_api_keys
+    settings.tenant_api_keys = {
+        **saved_keys,
+        **{Replayer.headers(record)["X-API-Key"]: f"replay-{record['tn']}" for record in records},
+    }
+    provider_router.register(provider)
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+            replayer = Replayer(client)
+            if lifespan:
+                async with app.router.lifespan_context(app):
+                    elapsed = await replayer.replay(records, speed)
+            else:
+                elapsed = await replayer.replay(records, speed)
+    finally:
+        provider_router.unregister(provider.name)
+        provider_router.key_resolver = saved_resolver
+        settings.providers = saved_providers
+        settings.tenant_api_keys = saved_keys
+    replayer.elapsed = elapsed
+    return replayer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="capture files (*.jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="pace multiplier; 0 sends back to back")
+    parser.add_argument("--gen-latency-ms", type=float, default=800.0, help="median fake generation latency")
+    parser.add_argument("--gen-sigma", type=float, default=0.5, help="log-normal spread of generation latency")
+    parser.add_argument("--reply-chars", type=int, default=600)
+    parser.add_argument("--limit", type=int, default=None, help="replay only the first N requests")
+    args = parser.parse_args()
+
+    replayer = asyncio.run(run(
+        args.paths,
+        speed=args.speed,
+        gen_latency_ms=args.gen_latency_ms,
+        gen_sigma=args.gen_sigma,
+        reply_chars=args.reply_chars,
+        limit=args.limit,
+    ))
+    total = sum(len(latencies) for latencies, _, _ in replayer.results.values())
+    print(f"replayed {total} requests in {replayer.elapsed:.2f} s at {args.speed}x")
+    print(replayer.report())
+
+
+if __name__ == "__main__":
+    main()
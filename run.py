@@ -9,7 +9,9 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=settings.debug,
-        log_level="debug" if settings.debug else "info"
+        log_level="debug" if settings.debug else "info",
+        # The app emits its own structured access log (RequestContextMiddleware)
+        access_log=not settings.access_log
     )
 
 